@@ -0,0 +1,129 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+KCAL_PER_KG = 7700  # energy in 1 kg of body fat, the usual rule of thumb
+NUMERIC = ["weight_kg", "steps", "workout_minutes", "intensity", "sleep_hours", "mood",
+           "calories", "carbs_g", "protein_g", "fat_g"]
+
+
+def daily_frame(logs: pd.DataFrame) -> pd.DataFrame:
+    """One row per calendar day (means of same-day entries), indexed by date.
+
+    Days with no entry are not filled in, so averages are over logged days.
+    """
+    if logs.empty:
+        return pd.DataFrame(columns=NUMERIC, index=pd.DatetimeIndex([], name="date"))
+    dates = pd.to_datetime(logs["date"], errors="coerce", format="ISO8601")
+    values = logs[NUMERIC].apply(pd.to_numeric, errors="coerce")
+    values.index = dates
+    values = values[values.index.notna()]
+    # A weight of 0 is the form's default, not a measurement.
+    values["weight_kg"] = values["weight_kg"].where(values["weight_kg"] > 0)
+    return values.groupby(level=0).mean().sort_index().rename_axis("date")
+
+
+def _slope_per_day(series: pd.Series) -> Optional[float]:
+    """Least-squares slope of ``series`` against days, or None if too sparse."""
+    s = series.dropna()
+    if len(s) < 5:
+        return None
+    x = (s.index - s.index[0]).days.to_numpy(dtype=float)
+    if x[-1] - x[0] < 6:
+        return None
+    x -= x.mean()
+    y = s.to_numpy(dtype=float)
+    return float(np.dot(x, y - y.mean()) / np.dot(x, x))
+
+
+def _round(value, digits=1):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return round(float(value), digits)
+
+
+def summarize_logs(
+    logs: pd.DataFrame,
+    kcal_target: Optional[float] = None,
+    protein_target: Optional[float] = None,
+    weeks: int = 4,
+    today: Optional[pd.Timestamp] = None,
+) -> dict:
+    """Fixed-size summary of the whole log history for the planning prompt.
+
+    Everything is computed with column operations over the daily frame, so
+    the cost is a few passes over the data and the output size does not
+    depend on how many days were logged:
+
+    - weight: latest 7-day mean, trend in kg/week over the last 28 days,
+      change over 12 weeks, and monthly means for the last 6 months
+    - the last ``weeks`` weeks: mean steps, sleep, training minutes, calories
+      and macros per logged day
+    - adherence over the last 28 days: share of logged days within 10% of
+      the calorie target and reaching 90% of the protein target
+    - estimated TDEE: mean intake minus the energy implied by the weight trend
+    - the last three non-empty notes, truncated
+    """
+    daily = daily_frame(logs)
+    if daily.empty:
+        return {"days_logged": 0}
+    today = pd.Timestamp(today or daily.index[-1]).normalize()
+
+    def window(days: int) -> pd.DataFrame:
+        return daily.loc[daily.index > today - pd.Timedelta(days=days)]
+
+    last28 = window(28)
+    weight = daily["weight_kg"]
+    weight7 = weight.rolling("7D").mean()
+    slope28 = _slope_per_day(last28["weight_kg"])
+    then = weight7.loc[: today - pd.Timedelta(days=84)].dropna()
+
+    monthly = weight.loc[weight.index > today - pd.DateOffset(months=6)].resample("MS").mean().dropna()
+
+    weekly = (
+        window(7 * weeks)[["steps", "sleep_hours", "workout_minutes", "calories", "protein_g", "carbs_g", "fat_g"]]
+        .resample("W-MON", label="left", closed="left")
+        .mean()
+    )
+
+    adherence = {}
+    logged_kcal = last28["calories"].where(last28["calories"] > 0).dropna()
+    if kcal_target and len(logged_kcal):
+        within = (logged_kcal - kcal_target).abs() <= 0.1 * kcal_target
+        adherence["kcal_within_10pct"] = _round(within.mean(), 2)
+        adherence["kcal_mean_vs_target"] = _round(logged_kcal.mean() - kcal_target, 0)
+    logged_protein = last28["protein_g"].where(last28["protein_g"] > 0).dropna()
+    if protein_target and len(logged_protein):
+        adherence["protein_hit_90pct"] = _round((logged_protein >= 0.9 * protein_target).mean(), 2)
+
+    tdee = None
+    if slope28 is not None and len(logged_kcal) >= 10:
+        tdee = _round(logged_kcal.mean() - slope28 * KCAL_PER_KG, 0)
+
+    return {
+        "days_logged": int(len(daily)),
+        "first_date": str(daily.index[0].date()),
+        "last_date": str(daily.index[-1].date()),
+        "weight": {
+            "latest_7d_mean": _round(weight7.dropna().iloc[-1]) if weight7.notna().any() else None,
+            "trend_kg_per_week_28d": _round(slope28 * 7, 2) if slope28 is not None else None,
+            "change_12w": _round(weight7.dropna().iloc[-1] - then.iloc[-1]) if len(then) and weight7.notna().any() else None,
+            "monthly_means": {str(k.date())[:7]: _round(v) for k, v in monthly.items()},
+        },
+        "weekly_means": [
+            {"week_of": str(k.date()), **{c: _round(v, 0 if c in ("steps", "calories") else 1) for c, v in row.items() if pd.notna(v)}}
+            for k, row in weekly.iterrows()
+            if row.notna().any()
+        ],
+        "adherence_28d": adherence,
+        "estimated_tdee_kcal": tdee,
+        "recent_notes": _recent_notes(logs),
+    }
+
+
+def _recent_notes(logs: pd.DataFrame, n: int = 3, max_chars: int = 120) -> list:
+    if "notes" not in logs:
+        return []
+    notes = logs["notes"].tail(50).dropna().astype(str).str.strip()
+    return [s[:max_chars] for s in notes[notes != ""].tail(n)]
@@ -2,10 +2,22 @@ import streamlit as st
 import pandas as pd
 import json
 import datetime as dt
+import io
 import logging
-import shutil
+import sys
 from pathlib import Path
 
+from analytics import summarize_logs
+from bulk_io import detect_mapping, export_logs, guess_format, import_logs, iter_chunks
+from jobs import CANDIDATE_SETTINGS, PlanJobRunner
+from plan_cache import PlanCache, plan_cache_key
+from plan_schema import RESPONSE_FORMAT, plan_errors, plan_ok, stream_problem
+from plan_stream import PlanCancelled, PlanRejected, PlanStreamParser
+from storage import LOG_COLUMNS, PLAN_COLUMNS, PREF_COLUMNS, PlannerStore
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+from llm_gateway import get_gateway  # noqa: E402
+
 logger = logging.getLogger(__name__)
 
 # ================== App setup ==================
@@ -15,41 +27,28 @@ st.title("AI Fitness & Nutrition Planner")
 # ================== Constants ==================
 MODEL_NAME = "gpt-4o-mini"
 MAX_INPUT_LENGTH = 200
-WORKOUT_REQUIRED_KEYS = {"day", "session_type", "main"}
-MEAL_REQUIRED_KEYS = {"day", "breakfast", "lunch", "dinner", "kcal"}
 
-# ================== Data files ==================
+# ================== Data store ==================
+# Legacy CSV layout; still used for the one-time migration into SQLite.
 DATA_FILES = {
-    "logs.csv":  ["date","weight_kg","steps","workout_minutes","intensity","sleep_hours","mood","calories","carbs_g","protein_g","fat_g","notes"],
-    "prefs.csv": ["goal","diet","kcal_target","protein_g_target","allergies","dislikes","training_days"],
-    "plan.csv":  ["week_of","workouts","meals","shopping_list"],
+    "logs.csv":  list(LOG_COLUMNS),
+    "prefs.csv": list(PREF_COLUMNS),
+    "plan.csv":  PLAN_COLUMNS,
 }
-for fn, cols in DATA_FILES.items():
-    if not Path(fn).exists():
-        pd.DataFrame(columns=cols).to_csv(fn, index=False)
 
-def read_csv(fn, cols):
-    try:
-        df = pd.read_csv(fn)
-        for c in cols:
-            if c not in df.columns:
-                df[c] = None
-        return df[cols]
-    except (FileNotFoundError, pd.errors.EmptyDataError, pd.errors.ParserError) as e:
-        logger.warning("Failed to read %s: %s", fn, e)
-        return pd.DataFrame(columns=cols)
-
-def backup_csv(fn):
-    """Create a timestamped backup before overwriting."""
-    path = Path(fn)
-    if path.exists() and path.stat().st_size > 0:
-        ts = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup = path.with_suffix(f".backup_{ts}.csv")
-        shutil.copy(path, backup)
-
-logs  = read_csv("logs.csv",  DATA_FILES["logs.csv"])
-prefs = read_csv("prefs.csv", DATA_FILES["prefs.csv"])
-plan  = read_csv("plan.csv",  DATA_FILES["plan.csv"])
+@st.cache_resource
+def get_store():
+    """One SQLite connection per process, shared across reruns and sessions."""
+    store = PlannerStore("planner.db", backup_dir="backups")
+    store.migrate_from_csv(".")
+    return store
+
+store = get_store()
+# Cached in the store across reruns; treat these as read-only.
+logs  = store.logs_frame()
+_prefs_row = store.load_prefs()
+prefs = pd.DataFrame([_prefs_row] if _prefs_row else [], columns=DATA_FILES["prefs.csv"])
+latest_plan = store.latest_plan()
 
 # ================== Utilities ==================
 def sanitize_input(text, max_length=MAX_INPUT_LENGTH):
@@ -64,34 +63,16 @@ def _safe_str(val, default=""):
     return str(val)
 
 def _save_prefs(d):
-    backup_csv("prefs.csv")
-    pd.DataFrame([d]).to_csv("prefs.csv", index=False)
+    store.save_prefs(d)
 
 def _ok(d):
-    """Validate that a generated plan has the required structure and fields."""
-    try:
-        workouts = d.get("workouts")
-        meals = d.get("meals")
-        shopping = d.get("shopping_list")
+    """Validate that a generated plan has the required structure and field types."""
+    return plan_ok(d)
 
-        if not isinstance(workouts, list) or len(workouts) < 7:
-            return False
-        if not isinstance(meals, list) or len(meals) < 7:
-            return False
-        if not isinstance(shopping, list) or len(shopping) < 6:
-            return False
-
-        for w in workouts:
-            if not isinstance(w, dict) or not WORKOUT_REQUIRED_KEYS.issubset(w.keys()):
-                return False
-
-        for m in meals:
-            if not isinstance(m, dict) or not MEAL_REQUIRED_KEYS.issubset(m.keys()):
-                return False
-
-        return True
-    except (TypeError, AttributeError):
-        return False
+def _show_plan_errors(errors, limit=8):
+    st.markdown("\n".join(f"- `{e}`" for e in errors[:limit]))
+    if len(errors) > limit:
+        st.caption(f"...and {len(errors) - limit} more")
 
 # ================== Seed demo logs ==================
 def _secret(key, default=None):
@@ -107,17 +88,15 @@ if _secret("DEVELOPER_MODE", False):
             if st.button("Seed 7 demo logs"):
                 import random
                 base = dt.date.today()
-                for i in range(7):
-                    day = base - dt.timedelta(days=6-i)
-                    logs.loc[len(logs)] = [day, 86.5+i*0.1, 12000+500*i, 35, 3, 7.0, 0, 1900, 25, 160, 90, "demo"]
-                backup_csv("logs.csv")
-                logs.to_csv("logs.csv", index=False)
+                store.append_logs(
+                    dict(zip(DATA_FILES["logs.csv"], [base - dt.timedelta(days=6-i), 86.5+i*0.1, 12000+500*i, 35, 3, 7.0, 0, 1900, 25, 160, 90, "demo"]))
+                    for i in range(7)
+                )
                 st.success("Seeded 7 logs"); st.rerun()
         with c2:
             if st.button("Clear all plans"):
-                backup_csv("plan.csv")
-                pd.DataFrame(columns=DATA_FILES["plan.csv"]).to_csv("plan.csv", index=False)
-                st.warning("Cleared plan.csv"); st.rerun()
+                store.clear_plans()
+                st.warning("Cleared all plans"); st.rerun()
 
 # ================== Quick Log ==================
 st.subheader("Quick daily log")
@@ -136,11 +115,58 @@ with st.form("log_form", clear_on_submit=True):
     fat   = c3.number_input("fat_g", 0, 500, step=5)
     notes = st.text_input("notes")
     if st.form_submit_button("Save log"):
-        logs.loc[len(logs)] = [date, wkg, steps, wmin, inten, sleep, mood, kcal, carbs, prot, fat, notes]
-        backup_csv("logs.csv")
-        logs.to_csv("logs.csv", index=False)
+        row = [date, wkg, steps, wmin, inten, sleep, mood, kcal, carbs, prot, fat, notes]
+        store.append_log(dict(zip(DATA_FILES["logs.csv"], row)))
+        logs = store.logs_frame()
         st.success("Log saved")
 
+with st.expander("Bulk import / export"):
+    st.caption("CSV, JSON or JSON Lines exports from a tracker or wearable. Rows are matched on date; "
+               "days you already logged are kept unless you choose to fill their empty fields.")
+    upload = st.file_uploader("Logs file", type=["csv", "json", "jsonl", "ndjson"])
+    if upload is not None:
+        fmt = guess_format(upload.name)
+        text = io.TextIOWrapper(upload, encoding="utf-8-sig")
+        try:
+            head = next(iter_chunks(text, fmt, chunksize=20))
+            mapping = detect_mapping(head.columns)
+        except (StopIteration, ValueError, UnicodeDecodeError) as e:
+            head, mapping = None, {}
+            st.error(f"Could not read {upload.name}: {e}")
+        text.detach()  # leave the upload open for the import below
+        if head is not None:
+            st.caption("Columns: " + ", ".join(
+                f"{src} → {dst}" + (f" (×{factor:.4g})" if factor != 1.0 else "")
+                for dst, (src, factor) in mapping.items()
+            ))
+            if "date" not in mapping:
+                st.error("No date column found in this file.")
+            else:
+                fill = st.checkbox("Fill empty fields of days already logged", value=False)
+                if st.button("Import logs"):
+                    upload.seek(0)
+                    status = st.empty()
+                    try:
+                        stats = import_logs(
+                            store, io.TextIOWrapper(upload, encoding="utf-8-sig", newline=""), fmt, mapping, fill,
+                            progress=lambda s: status.caption(f"{s['rows_read']:,} rows read..."),
+                        )
+                    except ValueError as e:
+                        st.error(f"Import stopped: {e}")
+                    else:
+                        logs = store.logs_frame()
+                        status.success(
+                            f"Read {stats['rows_read']:,} rows: {stats['inserted']:,} new days, "
+                            f"{stats['updated']:,} filled in, {stats['skipped']:,} already logged or repeated, "
+                            f"{stats['no_date']:,} without a date."
+                        )
+    export_fmt = st.radio("Export format", ["csv", "jsonl", "json"], horizontal=True)
+    if st.button("Prepare export"):
+        buf = io.StringIO()
+        count = export_logs(store, buf, export_fmt)
+        st.download_button(f"Download {count:,} logs", buf.getvalue(), file_name=f"logs.{export_fmt}",
+                           mime="text/csv" if export_fmt == "csv" else "application/json")
+
 # ================== Preferences (create/edit) ==================
 st.subheader("Preferences")
 if prefs.empty:
@@ -187,15 +213,26 @@ else:
         })
         st.success("Preferences updated"); st.rerun()
     if cols[1].button("Reset prefs (clear)"):
-        backup_csv("prefs.csv")
-        pd.DataFrame(columns=DATA_FILES["prefs.csv"]).to_csv("prefs.csv", index=False)
+        store.clear_prefs()
         st.warning("Preferences cleared"); st.rerun()
 
 # ================== Manual prompt (optional) ==================
 week_of = (dt.date.today() + dt.timedelta(days=(7 - dt.date.today().weekday())))  # next Monday
-last14 = logs.tail(14).to_dict(orient="records")
 pref = prefs.iloc[0].to_dict() if not prefs.empty else {}
 
+@st.cache_resource(max_entries=8)
+def _log_summary(logs_version, kcal_target, protein_target, _logs):
+    """Recomputed only when the logs or targets change."""
+    return summarize_logs(_logs, kcal_target, protein_target)
+
+def _num(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+log_summary = _log_summary(store.logs_version, _num(pref.get("kcal_target")), _num(pref.get("protein_g_target")), logs)
+
 safe_pref = {k: sanitize_input(v) if isinstance(v, str) else v for k, v in pref.items()}
 
 with st.expander("Manual copy-paste prompt (optional)"):
@@ -211,8 +248,8 @@ Constraints:
 - Dislikes: {safe_pref.get('dislikes')}
 - Training days: {safe_pref.get('training_days')}
 
-Input logs (last 14 days JSON):
-{json.dumps(last14, default=str)}
+Log summary (whole history: weight trend, weekly averages, target adherence, estimated TDEE):
+{json.dumps(log_summary, default=str)}
 
 Return strict JSON with keys:
 - workouts: [{{day, session_type, warmup, main, accessories, RPE_target, notes}}]  # exactly 7 items (Mon-Sun)
@@ -227,13 +264,21 @@ Rules: For keto keep carbs <= 30-50 g/day. Weekday sessions <= 45 min. Use UK-av
 st.subheader("Generate next-week plan (automatic)")
 st.caption("Requires OPENAI_API_KEY in .streamlit/secrets.toml")
 
+# Process-wide pooled client: reruns, sessions and candidate threads reuse
+# its keep-alive connections, and every call is counted in llm.usage.
+# LLM_BACKEND=fake answers in-process with a schema-shaped plan.
+llm = get_gateway(api_key=_secret("OPENAI_API_KEY"))
+
 if len(logs) > 0 and len(logs) < 7:
     st.warning(f"Only {len(logs)} log(s) recorded. The AI produces better plans with 7+ days of data.")
 
-def generate_plan_with_openai(pref_dict, logs_list, week_date, max_tokens=2400, temperature=0.4):
-    from openai import OpenAI
-    client = OpenAI(api_key=_secret("OPENAI_API_KEY"))
-
+def generate_plan_with_openai(pref_dict, log_summary, week_date, max_tokens=2400, temperature=0.4, usage=None,
+                              stream=False, on_item=None, cancel=None):
+    """Generate a plan. With ``stream=True`` the reply is parsed as it arrives,
+    ``on_item(key, value)`` is called for each finished workout, meal or
+    shopping item, and the call is cut short with PlanRejected as soon as
+    the partial plan cannot pass _ok(), or with PlanCancelled once the
+    ``cancel`` event is set."""
     safe = {k: sanitize_input(v) if isinstance(v, str) else v for k, v in pref_dict.items()}
 
     system_msg = (
@@ -243,13 +288,14 @@ def generate_plan_with_openai(pref_dict, logs_list, week_date, max_tokens=2400,
         "- Exactly 7 workout objects (Mon-Sun). Each has: day, session_type, warmup, main (sets x reps or intervals with loads or paces), accessories, RPE_target, notes.\n"
         "- Exactly 7 meal objects (Mon-Sun). Each has: day, breakfast, lunch, dinner, snacks, kcal, protein_g, carbs_g, fat_g. Hit daily protein target; weekdays prep <= 20 min.\n"
         "- shopping_list is 20-40 items with quantities and units (e.g., 'chicken breast 1.2 kg'), grouped by category in the string (e.g., 'Meat: ...').\n"
-        "If diet is keto, keep carbs <= 30-50 g/day. Keep weekday sessions <= 45 min. UK-available foods only."
+        "If diet is keto, keep carbs <= 30-50 g/day. Keep weekday sessions <= 45 min. UK-available foods only.\n"
+        "log_summary describes the user's whole history: use the weight trend, estimated TDEE and target adherence to set calories, and recent weekly activity to set training load."
     )
-    user_payload = {"prefs": safe, "logs_last14": logs_list}
+    user_payload = {"prefs": safe, "log_summary": log_summary}
 
-    resp = client.chat.completions.create(
+    request = dict(
         model=MODEL_NAME,
-        response_format={"type": "json_object"},
+        response_format=RESPONSE_FORMAT,
         temperature=temperature,
         max_tokens=max_tokens,
         messages=[
@@ -257,57 +303,159 @@ def generate_plan_with_openai(pref_dict, logs_list, week_date, max_tokens=2400,
             {"role":"user","content": json.dumps(user_payload, default=str)},
         ],
     )
+    if stream:
+        parser = PlanStreamParser()
+        response = llm.stream("fitness", **request)
+        try:
+            for chunk in response:
+                if usage is not None and chunk.usage is not None:
+                    usage["total_tokens"] = chunk.usage.total_tokens
+                if cancel is not None and cancel.is_set():
+                    raise PlanCancelled()
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                for kind, key, value in parser.feed(delta):
+                    reason = stream_problem(kind, key, value, len(parser.items.get(key, ())) - 1)
+                    if reason:
+                        raise PlanRejected(reason, parser.items)
+                    if kind == "item" and on_item is not None:
+                        on_item(key, value)
+        except (PlanRejected, PlanCancelled):
+            if usage is not None:
+                # Usage only arrives in the last chunk; estimate what was paid for.
+                usage["total_tokens"] = len(parser.text) // 4
+            raise
+        finally:
+            response.close()  # drops the connection, which stops generation
+        return json.loads(parser.text)
+
+    resp = llm.create("fitness", **request)
+    if usage is not None and resp.usage is not None:
+        usage["total_tokens"] = resp.usage.total_tokens
     content = resp.choices[0].message.content
     return json.loads(content)
 
+def _show_generation_error(e):
+    if isinstance(e, KeyError):
+        st.error("Missing OPENAI_API_KEY. Check your `.streamlit/secrets.toml` file.")
+    elif isinstance(e, json.JSONDecodeError):
+        st.error("The AI returned invalid JSON. Try again or use the manual paste option below.")
+    else:
+        error_type = type(e).__name__
+        if "RateLimit" in error_type:
+            st.error("Rate limited by OpenAI. Wait a minute and try again.")
+        elif "Authentication" in error_type:
+            st.error("Invalid API key. Check your `.streamlit/secrets.toml` file.")
+        else:
+            st.error(f"Generation failed ({error_type}): {e}")
+
+@st.cache_resource
+def get_plan_runner():
+    """Shared by all sessions so identical in-flight requests are deduplicated."""
+    return PlanJobRunner(generate_plan_with_openai, _ok)
+
+@st.cache_resource
+def get_plan_cache():
+    return PlanCache("plan_cache.db")
+
+plan_runner = get_plan_runner()
+plan_cache = get_plan_cache()
+n_candidates = st.slider(
+    "Parallel candidates", 1, len(CANDIDATE_SETTINGS), 1,
+    help="Generate several plans at once at different temperatures and keep the first valid one. Faster when plans often fail checks, but costs more tokens.",
+)
+stream_plan = st.checkbox(
+    "Stream and check the plan as it is written", value=True,
+    help="Shows workouts and meals as they arrive and stops early (then retries) if the plan is going to fail checks.",
+)
+force_regen = st.checkbox(
+    "Force regenerate", value=False,
+    help="Ignore the cached plan for these exact preferences and logs and call OpenAI again.",
+)
+
+def _save_generated(job, week, key):
+    store.add_plan(week, job.result)
+    plan_cache.put(key, job.result, tokens=job.tokens, seconds=job.elapsed)
+
 colA, colB = st.columns(2)
 with colA:
     if st.button("Generate plan with OpenAI"):
-        if not _secret("OPENAI_API_KEY"):
+        if not _secret("OPENAI_API_KEY") and not llm.fake:
             st.error("Missing OPENAI_API_KEY. Add it to `.streamlit/secrets.toml` like:\n\n`OPENAI_API_KEY = \"sk-...\"`")
         elif prefs.empty:
             st.error("Save your preferences first (see section above).")
         elif logs.empty:
             st.error("Add at least one daily log before generating a plan.")
         else:
-            with st.spinner("Generating plan... (this may take 10-20 seconds)"):
-                try:
-                    data = generate_plan_with_openai(pref, last14, week_of, max_tokens=2400, temperature=0.4)
-                    if not _ok(data):
-                        data = generate_plan_with_openai(pref, last14, week_of, max_tokens=2800, temperature=0.35)
-
-                    if not _ok(data):
-                        st.error("Plan incomplete after retry. Add more logs or adjust targets, then try again.")
-                        st.warning("Model returned JSON below; review why it failed checks:")
-                        try:
-                            st.code(json.dumps(data, indent=2, ensure_ascii=False) if isinstance(data, dict) else str(data))
-                        except (TypeError, ValueError):
-                            st.code(str(data))
-                    else:
-                        backup_csv("plan.csv")
-                        plan.loc[len(plan)] = [
-                            str(week_of),
-                            json.dumps(data.get("workouts", []), ensure_ascii=False),
-                            json.dumps(data.get("meals", []), ensure_ascii=False),
-                            json.dumps(data.get("shopping_list", []), ensure_ascii=False),
-                        ]
-                        plan.to_csv("plan.csv", index=False)
-                        st.success("Plan generated and saved")
-                except KeyError:
-                    st.error("Missing OPENAI_API_KEY. Check your `.streamlit/secrets.toml` file.")
-                except json.JSONDecodeError:
-                    st.error("The AI returned invalid JSON. Try again or use the manual paste option below.")
-                except Exception as e:
-                    error_type = type(e).__name__
-                    if "RateLimit" in error_type:
-                        st.error("Rate limited by OpenAI. Wait a minute and try again.")
-                    elif "Authentication" in error_type:
-                        st.error("Invalid API key. Check your `.streamlit/secrets.toml` file.")
-                    else:
-                        st.error(f"Generation failed ({error_type}): {e}")
+            key = plan_cache_key(safe_pref, log_summary, week_of, MODEL_NAME, CANDIDATE_SETTINGS[:n_candidates])
+            cached = None if force_regen else plan_cache.get(key)
+            if cached is not None:
+                current = {k: v for k, v in (latest_plan or {}).items() if k != "week_of"}
+                if current != cached or (latest_plan or {}).get("week_of") != str(week_of):
+                    store.add_plan(week_of, cached)
+                    latest_plan = store.latest_plan()
+                st.success("Reused the cached plan for these preferences and logs (no API call).")
+            else:
+                plan_runner.submit(
+                    key, (pref, log_summary, week_of), n_candidates,
+                    on_success=lambda job, week=week_of, key=key: _save_generated(job, week, key),
+                    stream=stream_plan,
+                )
+                st.session_state["plan_job"] = key
 
 with colB:
     st.caption("Or use the manual prompt above and paste JSON below.")
+    cache_stats = plan_cache.stats()
+    if cache_stats["hits"]:
+        st.caption(
+            f"Plan cache: {cache_stats['hits']} hit(s), saved ~{cache_stats['tokens_saved']:,} tokens "
+            f"and {cache_stats['seconds_saved']:.0f}s of generation."
+        )
+    spend = llm.usage.totals("fitness")
+    if spend.requests:
+        st.caption(
+            f"OpenAI since start: {spend.requests} call(s), "
+            f"{spend.input_tokens + spend.output_tokens:,} tokens, {spend.errors} failed."
+        )
+
+@st.fragment(run_every=0.5)
+def _plan_job_progress(job):
+    if job.status != "running":
+        st.rerun()
+    st.info(f"Generating plan... {job.elapsed:.0f}s, {job.attempts} call(s) started. You can keep using the app.")
+    partial = job.partial
+    if partial.get("workouts"):
+        st.markdown(f"**Workouts so far ({len(partial['workouts'])}/7)**")
+        st.dataframe(pd.DataFrame(partial["workouts"]), use_container_width=True)
+    if partial.get("meals"):
+        st.markdown(f"**Meals so far ({len(partial['meals'])}/7)**")
+        st.dataframe(pd.DataFrame(partial["meals"]), use_container_width=True)
+    if partial.get("shopping_list"):
+        st.caption(f"{len(partial['shopping_list'])} shopping list items so far")
+
+job = plan_runner.get(st.session_state.get("plan_job"))
+if job is not None and job.status == "running":
+    _plan_job_progress(job)
+elif job is not None:
+    del st.session_state["plan_job"]
+    if job.status == "done":
+        latest_plan = store.latest_plan()
+        st.success(f"Plan generated and saved in {job.elapsed:.0f}s ({job.attempts} call(s))")
+    elif job.error is not None:
+        _show_generation_error(job.error)
+    else:
+        data = job.rejected
+        st.error("Plan incomplete after retry. Add more logs or adjust targets, then try again.")
+        if job.reject_reason:
+            st.warning(f"Generation was stopped early: {job.reject_reason}. Partial JSON below:")
+        else:
+            st.warning("Model returned JSON below; review why it failed checks:")
+            _show_plan_errors(plan_errors(data))
+        try:
+            st.code(json.dumps(data, indent=2, ensure_ascii=False) if isinstance(data, dict) else str(data))
+        except (TypeError, ValueError):
+            st.code(str(data))
 
 # ================== Paste JSON (manual fallback) ==================
 json_in = st.text_area("Paste plan JSON (manual mode)", height=160, placeholder='{"workouts":[...],"meals":[...],"shopping_list":[...]}')
@@ -317,17 +465,13 @@ if st.button("Save pasted plan JSON"):
     else:
         try:
             data = json.loads(json_in)
-            if not _ok(data):
-                st.warning("JSON parsed but missing required fields. Each workout needs: day, session_type, main. Each meal needs: day, breakfast, lunch, dinner, kcal.")
+            errors = plan_errors(data)
+            if errors:
+                st.warning("JSON parsed but does not match the plan format. Each workout needs: day, session_type, main. Each meal needs: day, breakfast, lunch, dinner, kcal (a number).")
+                _show_plan_errors(errors)
             else:
-                backup_csv("plan.csv")
-                plan.loc[len(plan)] = [
-                    str(week_of),
-                    json.dumps(data.get("workouts", []), ensure_ascii=False),
-                    json.dumps(data.get("meals", []), ensure_ascii=False),
-                    json.dumps(data.get("shopping_list", []), ensure_ascii=False),
-                ]
-                plan.to_csv("plan.csv", index=False)
+                store.add_plan(week_of, data)
+                latest_plan = store.latest_plan()
                 st.success("Plan saved")
         except json.JSONDecodeError as e:
             st.error(f"Invalid JSON (check for missing commas or brackets): {e}")
@@ -336,41 +480,41 @@ if st.button("Save pasted plan JSON"):
 
 # ================== Current Plan Preview ==================
 st.subheader("Current plan preview (raw)")
-if len(plan):
-    st.dataframe(plan.tail(1), use_container_width=True)
+if latest_plan:
+    st.json(latest_plan, expanded=False)
 else:
     st.info("No plan saved yet.")
 
 # ================== Readable Plan Tables ==================
 st.subheader("Readable plan")
-try:
-    last = plan.tail(1).iloc[0]
-    workouts = pd.DataFrame(json.loads(last["workouts"])) if last["workouts"] else pd.DataFrame()
-    meals    = pd.DataFrame(json.loads(last["meals"]))    if last["meals"] else pd.DataFrame()
-    shopping = json.loads(last["shopping_list"])          if last["shopping_list"] else []
-
-    if not workouts.empty:
-        st.markdown("**Workouts (Mon-Sun)**")
-        st.dataframe(workouts, use_container_width=True)
-    else:
-        st.info("No workouts to display.")
+if latest_plan is None:
+    st.info("No plan to display yet.")
+else:
+    try:
+        workouts = pd.DataFrame(latest_plan["workouts"])
+        meals    = pd.DataFrame(latest_plan["meals"])
+        shopping = latest_plan["shopping_list"]
 
-    if not meals.empty:
-        st.markdown("**Meals (Mon-Sun)**")
-        cols = ["day","breakfast","lunch","dinner","snacks","kcal","protein_g","carbs_g","fat_g"]
-        show = [c for c in cols if c in meals.columns]
-        st.dataframe(meals[show], use_container_width=True)
-    else:
-        st.info("No meals to display.")
+        if not workouts.empty:
+            st.markdown("**Workouts (Mon-Sun)**")
+            st.dataframe(workouts, use_container_width=True)
+        else:
+            st.info("No workouts to display.")
 
-    if shopping:
-        st.markdown("**Shopping list**")
-        for item in shopping:
-            st.write("\u2022", item)
-    else:
-        st.info("No shopping list items.")
-except (IndexError, json.JSONDecodeError, KeyError):
-    st.info("No plan to display yet.")
-except Exception as e:
-    logger.warning("Failed to render plan tables: %s", e)
-    st.info("Plan saved, but could not render tables.")
+        if not meals.empty:
+            st.markdown("**Meals (Mon-Sun)**")
+            cols = ["day","breakfast","lunch","dinner","snacks","kcal","protein_g","carbs_g","fat_g"]
+            show = [c for c in cols if c in meals.columns]
+            st.dataframe(meals[show], use_container_width=True)
+        else:
+            st.info("No meals to display.")
+
+        if shopping:
+            st.markdown("**Shopping list**")
+            for item in shopping:
+                st.write("\u2022", item)
+        else:
+            st.info("No shopping list items.")
+    except Exception as e:
+        logger.warning("Failed to render plan tables: %s", e)
+        st.info("Plan saved, but could not render tables.")
@@ -0,0 +1,158 @@
+"""Compare the old hand-written _ok() with the compiled plan schema.
+
+Offline (default): times both validators on valid and broken sample plans
+and lists the plans the old check let through. The schema check looks at
+every field's type, so expect it to be a few times slower than the old
+key-presence check on a valid plan.
+
+    python bench/validation_bench.py
+
+Live: also generates ``N`` plans with the old ``json_object`` response format
+and ``N`` with the strict JSON schema, and reports how many would have
+needed a retry. Needs OPENAI_API_KEY and spends real tokens.
+
+    OPENAI_API_KEY=sk-... python bench/validation_bench.py --live 5
+"""
+import argparse
+import copy
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from plan_schema import RESPONSE_FORMAT, plan_errors, plan_ok  # noqa: E402
+
+WORKOUT_REQUIRED_KEYS = {"day", "session_type", "main"}
+MEAL_REQUIRED_KEYS = {"day", "breakfast", "lunch", "dinner", "kcal"}
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def legacy_ok(d):
+    """_ok() as it was before the schema."""
+    try:
+        workouts = d.get("workouts")
+        meals = d.get("meals")
+        shopping = d.get("shopping_list")
+        if not isinstance(workouts, list) or len(workouts) < 7:
+            return False
+        if not isinstance(meals, list) or len(meals) < 7:
+            return False
+        if not isinstance(shopping, list) or len(shopping) < 6:
+            return False
+        for w in workouts:
+            if not isinstance(w, dict) or not WORKOUT_REQUIRED_KEYS.issubset(w.keys()):
+                return False
+        for m in meals:
+            if not isinstance(m, dict) or not MEAL_REQUIRED_KEYS.issubset(m.keys()):
+                return False
+        return True
+    except (TypeError, AttributeError):
+        return False
+
+
+def valid_plan() -> dict:
+    return {
+        "workouts": [
+            {"day": d, "session_type": "Strength", "warmup": "5 min bike", "main": "Squat 5x5 @ 80 kg",
+             "accessories": "Plank 3x45s", "RPE_target": "7", "notes": ""}
+            for d in DAYS
+        ],
+        "meals": [
+            {"day": d, "breakfast": "Eggs", "lunch": "Chicken salad", "dinner": "Salmon, greens",
+             "snacks": "Greek yoghurt", "kcal": 1950, "protein_g": 160, "carbs_g": 40, "fat_g": 120}
+            for d in DAYS
+        ],
+        "shopping_list": [f"Item {i} 1 kg" for i in range(24)],
+    }
+
+
+def samples() -> dict:
+    out = {"valid": valid_plan()}
+
+    p = valid_plan(); del p["meals"][3]["kcal"]
+    out["missing kcal"] = p
+
+    p = valid_plan(); p["meals"][2]["kcal"] = "about 1900"
+    out["kcal as text"] = p
+
+    p = valid_plan(); p["workouts"][5]["main"] = None
+    out["main is null"] = p
+
+    p = valid_plan(); p["workouts"][0] = "rest day"
+    out["workout is a string"] = p
+
+    p = valid_plan(); p["shopping_list"] = "eggs, chicken, salmon, greens, yoghurt, oil"
+    out["shopping list as text"] = p
+
+    p = valid_plan(); p["workouts"] = p["workouts"][:5]
+    out["5 workouts"] = p
+    return out
+
+
+def timeit(fn, arg, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        fn(arg)
+    return (time.perf_counter() - start) / number * 1e6
+
+
+def offline(number: int) -> None:
+    print(f"{'sample':<24}{'legacy ok':>10}{'schema ok':>10}{'legacy us':>11}{'plan_ok us':>12}{'errors us':>11}")
+    for name, plan in samples().items():
+        errors = plan_errors(plan)
+        print(
+            f"{name:<24}{str(legacy_ok(plan)):>10}{str(not errors):>10}"
+            f"{timeit(legacy_ok, plan, number):>11.1f}{timeit(plan_ok, plan, number):>12.1f}"
+            f"{timeit(plan_errors, plan, number):>11.1f}"
+        )
+        if errors and legacy_ok(plan):
+            print(f"{'':<4}legacy accepted; schema says: {errors[0]}")
+
+
+def live(n: int) -> None:
+    from openai import OpenAI
+
+    client = OpenAI()
+    system = (
+        "You are a certified coach and nutritionist. Create a realistic one-week plan. "
+        "Output JSON ONLY with keys workouts, meals, shopping_list: exactly 7 workouts (day, session_type, "
+        "warmup, main, accessories, RPE_target, notes), exactly 7 meals (day, breakfast, lunch, dinner, "
+        "snacks, kcal, protein_g, carbs_g, fat_g) and 20-40 shopping list strings."
+    )
+    user = json.dumps({"prefs": {"goal": "fat_loss", "diet": "keto", "kcal_target": 2000, "protein_g_target": 150}})
+    formats = {"json_object": {"type": "json_object"}, "json_schema": copy.deepcopy(RESPONSE_FORMAT)}
+
+    print(f"\n{'format':<14}{'runs':>6}{'legacy fail':>13}{'schema fail':>13}{'mean s':>8}")
+    for label, fmt in formats.items():
+        legacy_fail = schema_fail = 0
+        elapsed = 0.0
+        for _ in range(n):
+            start = time.perf_counter()
+            resp = client.chat.completions.create(
+                model="gpt-4o-mini", temperature=0.4, max_tokens=2800, response_format=fmt,
+                messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
+            )
+            elapsed += time.perf_counter() - start
+            try:
+                plan = json.loads(resp.choices[0].message.content)
+            except (TypeError, ValueError):
+                plan = None
+            legacy_fail += not legacy_ok(plan) if isinstance(plan, dict) else 1
+            schema_fail += bool(plan_errors(plan))
+        print(f"{label:<14}{n:>6}{legacy_fail:>13}{schema_fail:>13}{elapsed / n:>8.1f}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="timing iterations per sample")
+    parser.add_argument("--live", type=int, default=0, help="API generations per response format")
+    args = parser.parse_args(argv)
+    offline(args.number)
+    if args.live:
+        live(args.live)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Chunked import and export of daily logs.
+
+Imports CSV, JSON (a top-level array of records) or JSON Lines exports from
+wearables and other apps. Each chunk of rows is mapped onto the logs
+schema, collapsed to one row per date and written in one transaction, so
+memory stays flat however large the file is.
+
+    python bulk_io.py import fitbit_steps.json
+    python bulk_io.py import sleep.csv --fill
+    python bulk_io.py export logs_backup.csv
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from storage import LOG_COLUMNS, PlannerStore
+
+CHUNK_ROWS = 5000
+_READ_BYTES = 1 << 16
+
+# Source column names seen in common exports, per logs column. Matching is
+# case-insensitive and ignores spaces, dashes and underscores.
+ALIASES: Dict[str, List[str]] = {
+    "date": ["date", "day", "datetime", "timestamp", "startdate", "calendardate", "summarydate"],
+    "weight_kg": ["weightkg", "weight", "bodyweight", "bodymass"],
+    "steps": ["steps", "stepcount", "totalsteps", "step"],
+    "workout_minutes": ["workoutminutes", "activeminutes", "exerciseminutes", "veryactiveminutes"],
+    "intensity": ["intensity", "rpe"],
+    "sleep_hours": ["sleephours", "hoursasleep", "sleepduration", "sleep"],
+    "mood": ["mood"],
+    "calories": ["calories", "caloriesin", "energyconsumed", "kcal", "dietarycalories"],
+    "carbs_g": ["carbsg", "carbs", "carbohydrates", "carbohydratesg"],
+    "protein_g": ["proteing", "protein"],
+    "fat_g": ["fatg", "fat", "totalfat"],
+    "notes": ["notes", "note", "comment"],
+}
+# Columns in other units, converted on the way in: target -> (aliases, factor).
+CONVERTED: Dict[str, tuple] = {
+    "weight_kg": (["weightlb", "weightlbs", "weightpounds"], 0.45359237),
+    "sleep_hours": (["minutesasleep", "sleepminutes", "totalsleepminutes"], 1 / 60),
+}
+
+
+def _norm(name: str) -> str:
+    return "".join(ch for ch in str(name).lower() if ch.isalnum())
+
+
+def detect_mapping(columns) -> Dict[str, tuple]:
+    """Map logs columns to ``(source column, factor)`` for the given header."""
+    by_norm = {_norm(c): c for c in columns}
+    mapping = {}
+    for target, names in ALIASES.items():
+        for name in names:
+            if name in by_norm:
+                mapping[target] = (by_norm[name], 1.0)
+                break
+    for target, (names, factor) in CONVERTED.items():
+        if target in mapping:
+            continue
+        for name in names:
+            if name in by_norm:
+                mapping[target] = (by_norm[name], factor)
+                break
+    return mapping
+
+
+def _to_dates(col: pd.Series) -> pd.Series:
+    """Calendar dates as ``YYYY-MM-DD``; unparseable values become NaN.
+
+    ISO timestamps keep their local date (no conversion to UTC, which would
+    move late-evening entries to the next day); other formats are parsed.
+    """
+    text = col.astype("string").str.strip()
+    dates = text.str.extract(r"^(\d{4}-\d{2}-\d{2})", expand=False)
+    other = dates.isna() & text.notna()
+    if other.any():
+        parsed = pd.to_datetime(text[other], errors="coerce", format="mixed")
+        dates[other] = parsed.dt.strftime("%Y-%m-%d")
+    valid = pd.to_datetime(dates, errors="coerce", format="%Y-%m-%d").notna()
+    return dates.where(valid).astype(object)
+
+
+def to_log_rows(chunk: pd.DataFrame, mapping: Dict[str, tuple]) -> pd.DataFrame:
+    """Map a chunk onto the logs schema, dropping rows without a usable date."""
+    out = pd.DataFrame(index=chunk.index)
+    for target in LOG_COLUMNS:
+        if target not in mapping:
+            out[target] = None
+            continue
+        source, factor = mapping[target]
+        col = chunk[source]
+        if target == "date":
+            out[target] = _to_dates(col)
+        elif target == "notes":
+            out[target] = col.where(col.notna(), None).astype(object)
+        else:
+            values = pd.to_numeric(col, errors="coerce")
+            out[target] = values if factor == 1.0 else (values * factor).round(2)
+    return out[out["date"].notna()]
+
+
+def iter_json_records(fp: IO[str]) -> Iterator[dict]:
+    """Yield the records of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    started = False
+    while True:
+        while True:
+            # Skip whitespace, the opening bracket and separators.
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == "," or (not started and buf[pos] == "[")):
+                started = started or buf[pos] == "["
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            if pos >= len(buf):
+                break
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # record continues in the next block
+            pos = end
+            yield record
+        block = fp.read(_READ_BYTES)
+        if not block:
+            if buf[pos:].strip():
+                raise ValueError("Truncated JSON: the file ended inside a record")
+            return
+        buf = buf[pos:] + block
+        pos = 0
+
+
+def iter_chunks(fp: IO[str], fmt: str, chunksize: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Raw source rows as DataFrames of at most ``chunksize`` rows."""
+    if fmt == "csv":
+        yield from pd.read_csv(fp, chunksize=chunksize)
+        return
+    if fmt == "jsonl":
+        yield from pd.read_json(fp, lines=True, chunksize=chunksize)
+        return
+    batch = []
+    for record in iter_json_records(fp):
+        batch.append(record)
+        if len(batch) >= chunksize:
+            yield pd.json_normalize(batch)
+            batch = []
+    if batch:
+        yield pd.json_normalize(batch)
+
+
+def guess_format(name: str) -> str:
+    suffix = Path(name).suffix.lower()
+    return {".json": "json", ".jsonl": "jsonl", ".ndjson": "jsonl"}.get(suffix, "csv")
+
+
+def import_logs(
+    store: PlannerStore,
+    fp: IO[str],
+    fmt: str = "csv",
+    mapping: Optional[Dict[str, tuple]] = None,
+    fill_existing: bool = False,
+    chunksize: int = CHUNK_ROWS,
+    progress=None,
+) -> dict:
+    """Stream ``fp`` into the logs table. Returns counts for reporting.
+
+    ``mapping`` defaults to ``detect_mapping`` on the first chunk's columns.
+    ``progress(stats)`` is called after each chunk is committed.
+    """
+    stats = {"rows_read": 0, "inserted": 0, "updated": 0, "skipped": 0, "no_date": 0}
+    dated = 0
+    for chunk in iter_chunks(fp, fmt, chunksize):
+        if mapping is None:
+            mapping = detect_mapping(chunk.columns)
+            if "date" not in mapping:
+                raise ValueError(f"No date column found in: {', '.join(map(str, chunk.columns))}")
+        rows = to_log_rows(chunk, mapping)
+        dated += len(rows)
+        # Later rows win within a chunk; across chunks the first one stored wins.
+        rows = rows.drop_duplicates("date", keep="last")
+        inserted, updated = store.merge_logs(rows.to_dict(orient="records"), fill_existing)
+        stats["rows_read"] += len(chunk)
+        stats["no_date"] = stats["rows_read"] - dated
+        stats["inserted"] += inserted
+        stats["updated"] += updated
+        stats["skipped"] = dated - stats["inserted"] - stats["updated"]
+        if progress is not None:
+            progress(stats)
+    return stats
+
+
+def export_logs(store: PlannerStore, fp: IO[str], fmt: str = "csv", chunksize: int = CHUNK_ROWS) -> int:
+    """Write all logs to ``fp`` in date order, one chunk at a time."""
+    count = 0
+    first = True
+    if fmt == "json":
+        fp.write("[")
+    for chunk in store.iter_log_chunks(chunksize):
+        if fmt == "csv":
+            chunk.to_csv(fp, index=False, header=first)
+        else:
+            body = chunk.to_json(orient="records", lines=True)
+            if fmt == "json":
+                body = ("" if first else ",\n") + ",\n".join(body.splitlines())
+            fp.write(body if fmt == "json" or body.endswith("\n") else body + "\n")
+        count += len(chunk)
+        first = False
+    if fmt == "json":
+        fp.write("]\n")
+    return count
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk import/export of fitness logs")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("path")
+    parser.add_argument("--db", default="planner.db")
+    parser.add_argument("--format", choices=["csv", "json", "jsonl"], help="default: from the file extension")
+    parser.add_argument("--fill", action="store_true", help="fill empty fields of days already logged")
+    args = parser.parse_args(argv)
+
+    store = PlannerStore(args.db)
+    fmt = args.format or guess_format(args.path)
+    if args.action == "import":
+        with open(args.path, encoding="utf-8", newline="") as fp:
+            stats = import_logs(
+                store, fp, fmt, fill_existing=args.fill,
+                progress=lambda s: print(f"\r{s['rows_read']:,} rows read", end="", file=sys.stderr),
+            )
+        print(file=sys.stderr)
+        print(json.dumps(stats))
+    else:
+        with open(args.path, "w", encoding="utf-8", newline="") as fp:
+            print(f"{export_logs(store, fp, fmt):,} logs written to {args.path}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
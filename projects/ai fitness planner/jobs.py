@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from plan_stream import PlanCancelled, PlanRejected
+
+logger = logging.getLogger(__name__)
+
+# (temperature, max_tokens) per candidate. The first matches the old single
+# call; the rest trade a little determinism for a better chance of passing.
+CANDIDATE_SETTINGS: List[Tuple[float, int]] = [(0.4, 2400), (0.3, 2800), (0.55, 2800), (0.7, 2800)]
+# The old serial retry after a plan failed validation.
+RETRY_SETTINGS: Tuple[float, int] = (0.35, 2800)
+
+
+class PlanJob:
+    def __init__(self, key: str, candidates: List[Tuple[float, int]], stream: bool = False):
+        self.key = key
+        self.candidates = candidates
+        self.stream = stream
+        self.status = "running"  # running | done | failed
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.attempts = 0
+        self.result: Optional[dict] = None
+        self.rejected: Optional[dict] = None  # last parsed plan that failed validation
+        self.reject_reason: Optional[str] = None
+        self.partial: Dict[str, list] = {}  # streamed items of the leading attempt
+        self.error: Optional[BaseException] = None
+        self.tokens = 0  # total tokens across every completed call
+        self.cancelled = threading.Event()  # set once a candidate wins; losers stop
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+
+class PlanJobRunner:
+    """Runs plan generation off the Streamlit script thread.
+
+    Each job fires its candidates concurrently and keeps the first result
+    that passes ``validate``. The others are cancelled if not yet started;
+    running ones see ``job.cancelled`` and cut their stream short, which is
+    why jobs with several candidates always stream. A single candidate whose
+    plan fails validation gets one serial retry with RETRY_SETTINGS, matching
+    the old behaviour.
+    Submitting a key that is already running returns the running job.
+
+    ``generate`` receives a ``usage`` dict to fill with the call's token
+    counts; they are summed into ``job.tokens``. Streamed attempts also pass
+    ``stream=True``, the ``cancel`` event to check between chunks and an
+    ``on_item`` callback; for streaming jobs, items from whichever attempt
+    is furthest along are exposed as ``job.partial`` for display. An
+    attempt that raises PlanRejected counts as a failed check, and one that
+    raises PlanCancelled as no result.
+    """
+
+    def __init__(self, generate: Callable[..., dict], validate: Callable[[dict], bool],
+                 max_workers: int = 6, keep_seconds: float = 3600):
+        self.generate = generate
+        self.validate = validate
+        self.keep_seconds = keep_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plan")
+        self._jobs: Dict[str, PlanJob] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Optional[str]) -> Optional[PlanJob]:
+        with self._lock:
+            return self._jobs.get(key) if key else None
+
+    def submit(self, key: str, args: tuple, n_candidates: int = 1,
+               on_success: Optional[Callable[[PlanJob], None]] = None, stream: bool = False) -> PlanJob:
+        with self._lock:
+            existing = self._jobs.get(key)
+            if existing is not None and existing.status == "running":
+                return existing
+            cutoff = time.time() - self.keep_seconds
+            for k in [k for k, j in self._jobs.items() if j.finished and j.finished < cutoff]:
+                del self._jobs[k]
+            job = PlanJob(key, CANDIDATE_SETTINGS[:max(1, n_candidates)], stream)
+            self._jobs[key] = job
+        threading.Thread(target=self._run, args=(job, args, on_success), daemon=True).start()
+        return job
+
+    def _attempt(self, job: PlanJob, args: tuple, settings: Tuple[float, int]) -> Optional[dict]:
+        if job.cancelled.is_set():
+            return None
+        with self._lock:
+            job.attempts += 1
+        usage: dict = {}
+        kwargs = {}
+        if job.stream or len(job.candidates) > 1:
+            partial: Dict[str, list] = {}
+
+            def on_item(key, value):
+                if job.cancelled.is_set():
+                    raise PlanCancelled()
+                if not job.stream:
+                    return
+                partial.setdefault(key, []).append(value)
+                if sum(map(len, partial.values())) >= sum(map(len, job.partial.values())):
+                    job.partial = partial
+
+            kwargs = {"stream": True, "on_item": on_item, "cancel": job.cancelled}
+        try:
+            data = self.generate(*args, max_tokens=settings[1], temperature=settings[0], usage=usage, **kwargs)
+        except PlanCancelled:
+            return None
+        except PlanRejected as e:
+            job.rejected, job.reject_reason = e.partial, e.reason
+            return None
+        finally:
+            with self._lock:
+                job.tokens += usage.get("total_tokens", 0)
+        if self.validate(data):
+            return data
+        job.rejected = data
+        return None
+
+    def _run(self, job: PlanJob, args: tuple, on_success) -> None:
+        try:
+            futures = {self._pool.submit(self._attempt, job, args, s) for s in job.candidates}
+            result = None
+            while futures and result is None:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for f in done:
+                    try:
+                        result = result or f.result()
+                    except Exception as e:
+                        job.error = e
+            job.cancelled.set()
+            for f in futures:
+                f.cancel()
+
+            if result is None and len(job.candidates) == 1 and job.error is None:
+                job.cancelled.clear()
+                result = self._attempt(job, args, RETRY_SETTINGS)
+
+            if result is not None:
+                job.result, job.error = result, None
+                if on_success is not None:
+                    on_success(job)
+                job.status = "done"
+            else:
+                job.status = "failed"
+        except Exception as e:
+            logger.warning("Plan job %s failed: %s", job.key, e)
+            job.error = e
+            job.status = "failed"
+        finally:
+            job.finished = time.time()
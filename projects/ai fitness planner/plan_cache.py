@@ -0,0 +1,112 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+def plan_cache_key(*parts) -> str:
+    """Canonical hash of everything that shapes a generated plan."""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """Generated plans on disk, keyed by ``plan_cache_key``.
+
+    Kept in its own SQLite file so cached plans stay out of the planner
+    backups. Entries are evicted least-recently-used first once their total
+    size passes ``max_bytes``. Each entry remembers what generating it cost,
+    so hits can report the tokens and seconds they saved.
+    """
+
+    def __init__(self, path: str = "plan_cache.db", max_bytes: int = 20 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db_lock = threading.Lock()
+        with self._db_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS plans ("
+                " key TEXT PRIMARY KEY,"
+                " plan TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " tokens INTEGER NOT NULL,"
+                " seconds REAL NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS plans_last_used ON plans(last_used)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT plan, tokens, seconds FROM plans WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._bump(misses=1)
+                return None
+            plan, tokens, seconds = row
+            self._conn.execute("UPDATE plans SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._bump(hits=1, tokens_saved=tokens, seconds_saved=seconds)
+        return json.loads(plan)
+
+    def put(self, key: str, plan: dict, tokens: int = 0, seconds: float = 0.0) -> None:
+        blob = json.dumps(plan, ensure_ascii=False, separators=(",", ":"))
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO plans (key, plan, size, tokens, seconds, created, last_used)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, blob, len(blob.encode("utf-8")), tokens, seconds, now, now),
+                )
+                self._evict()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self) -> None:
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM plans").fetchone()
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM plans ORDER BY last_used"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._bump(evictions=evicted)
+
+    def _bump(self, **deltas) -> None:
+        self._conn.executemany(
+            "INSERT INTO stats (name, value) VALUES (?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            list(deltas.items()),
+        )
+
+    def stats(self) -> dict:
+        with self._db_lock:
+            out = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM plans"
+            ).fetchone()
+        return {
+            "hits": int(out.get("hits", 0)),
+            "misses": int(out.get("misses", 0)),
+            "evictions": int(out.get("evictions", 0)),
+            "tokens_saved": int(out.get("tokens_saved", 0)),
+            "seconds_saved": out.get("seconds_saved", 0.0),
+            "entries": entries,
+            "bytes": size,
+        }
@@ -0,0 +1,247 @@
+import copy
+from typing import Callable, List, Optional, Tuple
+
+_TEXT = {"type": "string"}
+_NUMBER = {"type": "number"}
+
+WORKOUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "day": _TEXT,
+        "session_type": _TEXT,
+        "warmup": _TEXT,
+        "main": _TEXT,
+        "accessories": _TEXT,
+        "RPE_target": {"type": ["string", "number"]},
+        "notes": _TEXT,
+    },
+    "required": ["day", "session_type", "main"],
+    "additionalProperties": False,
+}
+
+MEAL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "day": _TEXT,
+        "breakfast": _TEXT,
+        "lunch": _TEXT,
+        "dinner": _TEXT,
+        "snacks": _TEXT,
+        "kcal": _NUMBER,
+        "protein_g": _NUMBER,
+        "carbs_g": _NUMBER,
+        "fat_g": _NUMBER,
+    },
+    "required": ["day", "breakfast", "lunch", "dinner", "kcal"],
+    "additionalProperties": False,
+}
+
+# What a saved plan must satisfy. ``required`` lists only the fields the app
+# relies on, so hand-pasted plans may leave the rest out; extra fields are
+# ignored by the local check.
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "workouts": {"type": "array", "items": WORKOUT_SCHEMA, "minItems": 7},
+        "meals": {"type": "array", "items": MEAL_SCHEMA, "minItems": 7},
+        "shopping_list": {"type": "array", "items": _TEXT, "minItems": 6},
+    },
+    "required": ["workouts", "meals", "shopping_list"],
+    "additionalProperties": False,
+}
+
+
+def _strict(schema: dict) -> dict:
+    """The API's strict mode wants every property required and no extras.
+    Array lengths are left to the prompt and the local check."""
+    schema = copy.deepcopy(schema)
+    schema.pop("minItems", None)
+    if schema.get("type") == "object":
+        schema["properties"] = {k: _strict(v) for k, v in schema["properties"].items()}
+        schema["required"] = list(schema["properties"])
+        schema["additionalProperties"] = False
+    elif schema.get("type") == "array":
+        schema["items"] = _strict(schema["items"])
+    return schema
+
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "weekly_plan", "strict": True, "schema": _strict(PLAN_SCHEMA)},
+}
+
+# ---------- compiled validator ----------
+# Each schema node is compiled once at import into an ``ok`` check and an
+# ``explain`` walk that share the same rules. ``ok`` is the fast yes/no and
+# is what runs on every generated plan; ``explain`` only runs when it says
+# no, to build "path: problem" messages. Scalars are checked by exact type,
+# which is what ``json.loads`` produces, and objects check their scalar
+# fields inline instead of through one call per field. ``ok`` still checks
+# the type of every field, where the old _ok() only checked required keys,
+# so on a valid plan it is about 2-3x slower than that (~20 us against
+# ~7 us, see bench/validation_bench.py): negligible next to a generation.
+
+Ok = Callable[[object], bool]
+Explain = Callable[[object, str, List[str]], None]
+
+# Exact types per JSON type; bool is its own type, so True is not a number.
+_TYPES = {
+    "null": (type(None),),
+    "object": (dict,),
+    "array": (list,),
+    "string": (str,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+}
+
+
+class _Absent:
+    """Stands in for a missing optional field; its type passes every check."""
+
+
+_ABSENT = _Absent()
+
+
+def _scalar_types(schema: dict) -> Optional[frozenset]:
+    """The allowed types of a scalar schema node, or None for objects and arrays."""
+    kind = schema.get("type")
+    kinds = kind if isinstance(kind, list) else [kind]
+    if "object" in kinds or "array" in kinds:
+        return None
+    return frozenset(t for k in kinds for t in _TYPES[k])
+
+
+def _compile(schema: dict) -> Tuple[Ok, Explain]:
+    kind = schema.get("type")
+
+    if kind == "object":
+        properties = schema.get("properties", {})
+        props = tuple((k, *_compile(v)) for k, v in properties.items())
+        required = frozenset(schema.get("required", ()))
+        scalars = tuple((k, _scalar_types(v) | {_Absent}) for k, v in properties.items() if _scalar_types(v))
+        nested = tuple((k, sub_ok) for k, sub_ok, _ in props if not _scalar_types(properties[k]))
+
+        def ok(value):
+            if not isinstance(value, dict) or not required <= value.keys():
+                return False
+            get = value.get
+            for key, types in scalars:
+                if type(get(key, _ABSENT)) not in types:
+                    return False
+            for key, sub_ok in nested:
+                if key in value and not sub_ok(value[key]):
+                    return False
+            return True
+
+        def explain(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append(f"{path or 'plan'}: expected object, got {type(value).__name__}")
+                return
+            prefix = f"{path}." if path else ""
+            for key in schema.get("required", ()):
+                if key not in value:
+                    errors.append(f"{prefix}{key}: missing")
+            for key, sub_ok, sub_explain in props:
+                if key in value and not sub_ok(value[key]):
+                    sub_explain(value[key], prefix + key, errors)
+        return ok, explain
+
+    if kind == "array":
+        item_ok, item_explain = _compile(schema["items"])
+        item_types = _scalar_types(schema["items"])
+        lo = schema.get("minItems", 0)
+
+        if item_types is not None:
+            def ok(value):
+                if not isinstance(value, list) or len(value) < lo:
+                    return False
+                for item in value:
+                    if type(item) not in item_types:
+                        return False
+                return True
+        else:
+            def ok(value):
+                if not isinstance(value, list) or len(value) < lo:
+                    return False
+                for item in value:
+                    if not item_ok(item):
+                        return False
+                return True
+
+        def explain(value, path, errors):
+            if not isinstance(value, list):
+                errors.append(f"{path}: expected list, got {type(value).__name__}")
+                return
+            if len(value) < lo:
+                errors.append(f"{path}: {len(value)} items, need at least {lo}")
+            for i, item in enumerate(value):
+                if not item_ok(item):
+                    item_explain(item, f"{path}[{i}]", errors)
+        return ok, explain
+
+    types = _scalar_types(schema)
+    expected = " or ".join(kind if isinstance(kind, list) else [kind])
+
+    def ok(value):
+        return type(value) in types
+
+    def explain(value, path, errors):
+        if not ok(value):
+            errors.append(f"{path}: expected {expected}, got {type(value).__name__}")
+    return ok, explain
+
+
+_plan_ok, _plan_explain = _compile(PLAN_SCHEMA)
+_items = {
+    "workouts": _compile(WORKOUT_SCHEMA),
+    "meals": _compile(MEAL_SCHEMA),
+    "shopping_list": _compile(_TEXT),
+}
+
+
+def _explain(explain: Explain, value, path: str) -> List[str]:
+    errors: List[str] = []
+    explain(value, path, errors)
+    # ``ok`` already said no; never report an invalid value as clean.
+    return errors or [f"{path or 'plan'}: does not match the schema"]
+
+
+def plan_ok(plan) -> bool:
+    return _plan_ok(plan)
+
+
+def plan_errors(plan) -> List[str]:
+    """Field-level problems with ``plan``; empty if it is valid."""
+    if _plan_ok(plan):
+        return []
+    return _explain(_plan_explain, plan, "")
+
+
+def item_errors(section: str, item, index: int = 0) -> List[str]:
+    """Problems with one element of ``section``; for checking streamed rows."""
+    compiled = _items.get(section)
+    if compiled is None or compiled[0](item):
+        return []
+    return _explain(compiled[1], item, f"{section}[{index}]")
+
+
+_MIN_ITEMS = {k: v.get("minItems", 0) for k, v in PLAN_SCHEMA["properties"].items()}
+
+
+def stream_problem(kind: str, key: str, value, index: int) -> Optional[str]:
+    """Why a partially streamed plan can no longer pass, or None.
+
+    Takes one ``PlanStreamParser`` event; ``index`` is the item's position
+    in its section.
+    """
+    if key not in _MIN_ITEMS:
+        return None
+    if kind == "not_list":
+        return f"{key} is not a list"
+    if kind == "item":
+        errors = item_errors(key, value, index)
+        return "; ".join(errors) if errors else None
+    if kind == "end" and value < _MIN_ITEMS[key]:
+        return f"only {value} {key} (need {_MIN_ITEMS[key]})"
+    return None
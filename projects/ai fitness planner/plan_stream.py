@@ -0,0 +1,124 @@
+import json
+from typing import List, Optional, Tuple
+
+
+class PlanRejected(ValueError):
+    """A streamed plan was abandoned because it can no longer pass validation."""
+
+    def __init__(self, reason: str, partial: Optional[dict] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.partial = partial or {}
+
+
+class PlanCancelled(Exception):
+    """A streamed attempt was stopped because another candidate already won."""
+
+
+class PlanStreamParser:
+    """Incremental parser for ``{"key": [item, item, ...], ...}`` JSON.
+
+    ``feed`` takes raw text as it arrives and returns the events it
+    completed, in order:
+
+    - ``("item", key, value)`` - one element of a top-level array, parsed
+    - ``("end", key, count)`` - that array closed after ``count`` elements
+    - ``("not_list", key, None)`` - a top-level value that is not an array
+
+    Each character is scanned once. Only completed elements are passed to
+    ``json.loads``, so a half-received row is never guessed at. Text
+    outside the top-level object is ignored.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.items = {}  # key -> list of parsed elements so far
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._await_value = False
+        self._key: Optional[str] = None
+        self._section: Optional[str] = None  # key of the top-level array we are in
+        self._elem_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, object]]:
+        self.text += chunk
+        text = self.text
+        events: List[Tuple[str, str, object]] = []
+        i = self._pos
+        n = len(text)
+        while i < n:
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect_key:
+                        self._key = json.loads(text[self._string_start:i + 1])
+                    elif self._depth == 2 and self._elem_start == self._string_start:
+                        self._emit(events, text[self._elem_start:i + 1])
+                i += 1
+                continue
+
+            if c in " \t\r\n":
+                i += 1
+                continue
+            if self._await_value and self._depth == 1:
+                self._await_value = False
+                if c != "[":
+                    events.append(("not_list", self._key, None))
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                if self._in_array() and self._elem_start is None:
+                    self._elem_start = i
+            elif c in "{[":
+                if self._in_array() and self._elem_start is None:
+                    self._elem_start = i
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect_key = True
+                elif self._depth == 2 and c == "[":
+                    self._section = self._key
+                    self.items.setdefault(self._section, [])
+            elif c in "}]":
+                if self._in_array() and self._elem_start is not None and c == "]":
+                    self._emit(events, text[self._elem_start:i])  # trailing scalar
+                self._depth -= 1
+                if self._in_array() and self._elem_start is not None:
+                    self._emit(events, text[self._elem_start:i + 1])
+                elif self._depth == 1 and c == "]" and self._section is not None:
+                    events.append(("end", self._section, len(self.items[self._section])))
+                    self._section = None
+            elif c == ":" and self._depth == 1:
+                self._expect_key = False
+                self._await_value = True
+            elif c == "," and self._depth == 1:
+                self._expect_key = True
+            elif c == "," and self._in_array():
+                if self._elem_start is not None:
+                    self._emit(events, text[self._elem_start:i])  # number/true/false/null
+            elif self._in_array() and self._elem_start is None:
+                self._elem_start = i
+            i += 1
+        self._pos = i
+        return events
+
+    def _in_array(self) -> bool:
+        return self._depth == 2 and self._section is not None
+
+    def _emit(self, events: list, raw: str) -> None:
+        self._elem_start = None
+        raw = raw.strip()
+        if not raw:
+            return
+        value = json.loads(raw)
+        self.items[self._section].append(value)
+        events.append(("item", self._section, value))
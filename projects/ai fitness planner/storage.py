@@ -0,0 +1,474 @@
+import datetime as dt
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+LOG_COLUMNS = {
+    "date": "TEXT NOT NULL",
+    "weight_kg": "REAL",
+    "steps": "INTEGER",
+    "workout_minutes": "INTEGER",
+    "intensity": "INTEGER",
+    "sleep_hours": "REAL",
+    "mood": "INTEGER",
+    "calories": "INTEGER",
+    "carbs_g": "REAL",
+    "protein_g": "REAL",
+    "fat_g": "REAL",
+    "notes": "TEXT",
+}
+PREF_COLUMNS = {
+    "goal": "TEXT",
+    "diet": "TEXT",
+    "kcal_target": "INTEGER",
+    "protein_g_target": "INTEGER",
+    "allergies": "TEXT",
+    "dislikes": "TEXT",
+    "training_days": "TEXT",
+}
+# Fixed dtypes so an all-empty column in a batch of new rows concatenates cleanly.
+_LOG_DTYPES = {c: "object" if t.startswith("TEXT") else "float64" for c, t in LOG_COLUMNS.items()}
+# workouts, meals and shopping_list are JSON documents, not strings.
+PLAN_COLUMNS = ["week_of", "workouts", "meals", "shopping_list"]
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY, "
+    + ", ".join(f"{c} {t}" for c, t in LOG_COLUMNS.items()) + ")",
+    "CREATE INDEX IF NOT EXISTS logs_date ON logs(date)",
+    "CREATE TABLE IF NOT EXISTS prefs (id INTEGER PRIMARY KEY CHECK (id = 1), "
+    + ", ".join(f"{c} {t}" for c, t in PREF_COLUMNS.items()) + ")",
+    "CREATE TABLE IF NOT EXISTS plans ("
+    " id INTEGER PRIMARY KEY,"
+    " week_of TEXT NOT NULL,"
+    " created_at REAL NOT NULL,"
+    " workouts TEXT NOT NULL CHECK (json_valid(workouts)),"
+    " meals TEXT NOT NULL CHECK (json_valid(meals)),"
+    " shopping_list TEXT NOT NULL CHECK (json_valid(shopping_list)))",
+    "CREATE INDEX IF NOT EXISTS plans_week_of ON plans(week_of)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+)
+
+
+def _clean(value):
+    """pandas NaN/NaT and numpy scalars -> plain Python values for sqlite3."""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (dt.date, pd.Timestamp)):
+        return value.isoformat()[:10]
+    if hasattr(value, "item"):
+        value = value.item()
+        return None if isinstance(value, float) and math.isnan(value) else value
+    return value
+
+
+class _LogBuffer:
+    """Log columns in over-allocated arrays.
+
+    Rows added in date order are copied into spare capacity, so an append
+    costs the rows added (amortised), not the history. ``frame()`` is a
+    view over the filled part; later appends write past its end and never
+    change a frame already handed out.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self._n = 0
+        self._cols = {c: np.empty(0, dtype=d) for c, d in _LOG_DTYPES.items()}
+        self._frame: Optional[pd.DataFrame] = None
+        self.extend(frame)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def last_date(self) -> Optional[str]:
+        return self._cols["date"][self._n - 1] if self._n else None
+
+    def extend(self, frame: pd.DataFrame) -> None:
+        need = self._n + len(frame)
+        capacity = len(self._cols["date"])
+        if need > capacity:
+            capacity = max(need, 2 * capacity, 64)
+            for c, old in self._cols.items():
+                grown = np.empty(capacity, dtype=old.dtype)
+                grown[:self._n] = old[:self._n]
+                self._cols[c] = grown
+        for c, arr in self._cols.items():
+            arr[self._n:need] = frame[c].to_numpy(dtype=arr.dtype)
+        self._n = need
+        self._frame = None
+
+    def frame(self) -> pd.DataFrame:
+        if self._frame is None:
+            self._frame = pd.DataFrame({c: a[:self._n] for c, a in self._cols.items()}, copy=False)
+        return self._frame
+
+
+class PlannerStore:
+    """Logs, preferences and plans in one SQLite file.
+
+    Saving a log is a single-row INSERT, so its cost no longer grows with the
+    history. Instead of copying a CSV before every write, the whole database
+    is snapshotted with ``VACUUM INTO`` at most every ``backup_interval``
+    seconds into ``backup_dir``, keeping the newest ``keep_backups``.
+
+    Reads are cached in memory, since Streamlit rereads everything on every
+    widget click. Writes through this store fetch only the new rows and add
+    them to the cached logs without copying the history (a backfilled day
+    still re-sorts it once); a commit from another connection
+    bumps SQLite's ``data_version`` and drops the caches. Returned frames
+    and dicts are shared between reruns and must not be mutated.
+    """
+
+    def __init__(
+        self,
+        path: str = "planner.db",
+        backup_dir: str = "backups",
+        backup_interval: float = 24 * 3600,
+        keep_backups: int = 7,
+    ):
+        self.path = Path(path)
+        self.backup_dir = Path(backup_dir)
+        self.backup_interval = backup_interval
+        self.keep_backups = keep_backups
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db_lock = threading.Lock()
+        with self._db_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+        self._data_version = None
+        self._logs: Optional[_LogBuffer] = None
+        self._logs_max_id = 0
+        self.logs_version = 0  # bumped whenever logs_frame() would return a different frame
+        self._prefs: Optional[tuple] = None  # (prefs or None,)
+        self._plan: Optional[tuple] = None  # (latest plan or None,)
+
+    def _check_external_writes(self) -> None:
+        """Drop caches if another connection committed. Call with the lock held."""
+        (version,) = self._conn.execute("PRAGMA data_version").fetchone()
+        if version != self._data_version:
+            self._data_version = version
+            self._logs = self._prefs = self._plan = None
+
+    # ---------- logs ----------
+    def append_log(self, row: dict) -> None:
+        self.append_logs([row])
+
+    def _insert_logs(self, rows: Iterable[dict]) -> int:
+        """INSERT without locking or committing; the caller does both."""
+        cols = list(LOG_COLUMNS)
+        values = [tuple(_clean(r.get(c)) for c in cols) for r in rows]
+        self._conn.executemany(
+            f"INSERT INTO logs ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+            values,
+        )
+        return len(values)
+
+    def append_logs(self, rows: Iterable[dict]) -> int:
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                count = self._insert_logs(rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            if self._logs is not None:
+                self._append_new_logs()
+        self.maybe_backup()
+        return count
+
+    def _fetch_logs(self, after_id: int) -> pd.DataFrame:
+        # New rows are a rowid range scan; ORDER BY date would walk the whole
+        # date index, so they are put in (date, id) order here instead.
+        order = "date, id" if after_id == 0 else "id"
+        frame = pd.read_sql_query(
+            f"SELECT id, {', '.join(LOG_COLUMNS)} FROM logs WHERE id > ? ORDER BY {order}",
+            self._conn,
+            params=(after_id,),
+            dtype=_LOG_DTYPES,
+        )
+        if len(frame):
+            self._logs_max_id = max(self._logs_max_id, int(frame["id"].max()))
+            if after_id:
+                frame = frame.sort_values("date", kind="stable", ignore_index=True)
+        return frame.drop(columns="id")
+
+    def _append_new_logs(self) -> None:
+        """Add rows written since the cache was filled. Call with the lock held."""
+        new = self._fetch_logs(self._logs_max_id)
+        if new.empty:
+            return
+        last = self._logs.last_date()
+        if last is None or new["date"].iloc[0] >= last:
+            self._logs.extend(new)
+        else:
+            # A backfilled day: restore date order (stable, so ties keep insert order).
+            merged = pd.concat([self._logs.frame(), new], ignore_index=True)
+            self._logs = _LogBuffer(merged.sort_values("date", kind="stable", ignore_index=True))
+        self.logs_version += 1
+
+    def logs_frame(self) -> pd.DataFrame:
+        """All logs in date order. Cached; do not mutate the result."""
+        with self._db_lock:
+            self._check_external_writes()
+            if self._logs is None:
+                self._logs_max_id = 0
+                self._logs = _LogBuffer(self._fetch_logs(0))
+                self.logs_version += 1
+            return self._logs.frame()
+
+    def merge_logs(self, rows: Iterable[dict], fill_existing: bool = False) -> Tuple[int, int]:
+        """Bulk-write one batch of logs in a single transaction, one row per date.
+
+        Rows for dates that already have a log are skipped, or with
+        ``fill_existing`` used to fill that day's empty fields. The caller
+        is expected to have deduplicated dates within the batch. Returns
+        ``(inserted, updated)``, where ``updated`` counts dates that had at
+        least one empty field filled.
+        """
+        cols = list(LOG_COLUMNS)
+        values = [tuple(_clean(r.get(c)) for c in cols) for r in rows]
+        fields = cols[1:]  # everything but date
+        filled = set()
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if fill_existing:
+                    for v in values:
+                        supplied = [(c, x) for c, x in zip(fields, v[1:]) if x is not None]
+                        if not supplied:
+                            continue
+                        # Only rows with an empty field this row can fill count as updated.
+                        cur = self._conn.execute(
+                            f"UPDATE logs SET {', '.join(f'{c} = COALESCE({c}, ?)' for c, _ in supplied)}"
+                            f" WHERE date = ? AND ({' OR '.join(f'{c} IS NULL' for c, _ in supplied)})",
+                            [x for _, x in supplied] + [v[0]],
+                        )
+                        if cur.rowcount > 0:
+                            filled.add(v[0])
+                updated = len(filled)
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    f"INSERT INTO logs ({', '.join(cols)}) SELECT {', '.join('?' * len(cols))}"
+                    " WHERE NOT EXISTS (SELECT 1 FROM logs WHERE date = ?)",
+                    [v + (v[0],) for v in values],
+                )
+                inserted = self._conn.total_changes - before
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            if updated:
+                self._logs = None  # rows changed in place; reload on next read
+            elif inserted and self._logs is not None:
+                self._append_new_logs()
+        self.maybe_backup()
+        return inserted, updated
+
+    def iter_log_chunks(self, chunksize: int = 5000) -> Iterator[pd.DataFrame]:
+        """All logs in date order, ``chunksize`` rows at a time.
+
+        Pages by (date, id) so each chunk is an index range scan and the
+        lock is only held while one chunk is read.
+        """
+        cols = ", ".join(LOG_COLUMNS)
+        last = ("", 0)
+        while True:
+            with self._db_lock:
+                frame = pd.read_sql_query(
+                    f"SELECT id, {cols} FROM logs WHERE (date, id) > (?, ?) ORDER BY date, id LIMIT ?",
+                    self._conn,
+                    params=(*last, chunksize),
+                    dtype=_LOG_DTYPES,
+                )
+            if frame.empty:
+                return
+            last = (frame["date"].iloc[-1], int(frame["id"].iloc[-1]))
+            yield frame.drop(columns="id")
+
+    # ---------- prefs ----------
+    def load_prefs(self) -> Optional[dict]:
+        with self._db_lock:
+            self._check_external_writes()
+            if self._prefs is None:
+                cur = self._conn.execute(f"SELECT {', '.join(PREF_COLUMNS)} FROM prefs WHERE id = 1")
+                row = cur.fetchone()
+                self._prefs = (dict(zip(PREF_COLUMNS, row)) if row else None,)
+            return self._prefs[0]
+
+    def _insert_prefs(self, prefs: dict) -> None:
+        cols = list(PREF_COLUMNS)
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO prefs (id, {', '.join(cols)})"
+            f" VALUES (1, {', '.join('?' * len(cols))})",
+            tuple(_clean(prefs.get(c)) for c in cols),
+        )
+
+    def save_prefs(self, prefs: dict) -> None:
+        with self._db_lock:
+            self._insert_prefs(prefs)
+            self._prefs = None
+        self.maybe_backup()
+
+    def clear_prefs(self) -> None:
+        with self._db_lock:
+            self._conn.execute("DELETE FROM prefs")
+            self._prefs = (None,)
+
+    # ---------- plans ----------
+    def _insert_plan(self, week_of, data: dict) -> None:
+        self._conn.execute(
+            "INSERT INTO plans (week_of, created_at, workouts, meals, shopping_list)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (
+                str(week_of),
+                time.time(),
+                json.dumps(data.get("workouts", []), ensure_ascii=False),
+                json.dumps(data.get("meals", []), ensure_ascii=False),
+                json.dumps(data.get("shopping_list", []), ensure_ascii=False),
+            ),
+        )
+
+    def add_plan(self, week_of, data: dict) -> None:
+        with self._db_lock:
+            self._plan = None
+            self._insert_plan(week_of, data)
+        self.maybe_backup()
+
+    def latest_plan(self) -> Optional[dict]:
+        """The newest plan with its JSON decoded. Cached; do not mutate the result."""
+        with self._db_lock:
+            self._check_external_writes()
+            if self._plan is None:
+                row = self._conn.execute(
+                    f"SELECT {', '.join(PLAN_COLUMNS)} FROM plans ORDER BY id DESC LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._plan = (None,)
+                else:
+                    week_of, *docs = row
+                    docs = {c: json.loads(d) for c, d in zip(PLAN_COLUMNS[1:], docs)}
+                    self._plan = ({"week_of": week_of, **docs},)
+            return self._plan[0]
+
+    def plan_count(self) -> int:
+        with self._db_lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM plans").fetchone()
+        return count
+
+    def clear_plans(self) -> None:
+        with self._db_lock:
+            self._conn.execute("DELETE FROM plans")
+            self._plan = (None,)
+
+    # ---------- migration ----------
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def migrate_from_csv(self, directory: str = ".") -> bool:
+        """Import logs.csv, prefs.csv and plan.csv once. The CSVs are left in place.
+
+        Everything, including the ``csv_migrated`` flag, is written in one
+        transaction, so a crash part-way leaves nothing to duplicate and a
+        second process starting at the same time waits, then finds the flag.
+        """
+        with self._db_lock:
+            if self._meta("csv_migrated"):
+                return False
+        base = Path(directory)
+        logs = _read_legacy_csv(base / "logs.csv")
+        prefs = _read_legacy_csv(base / "prefs.csv")
+        plans = []
+        frame = _read_legacy_csv(base / "plan.csv")
+        if frame is not None:
+            for row in frame.to_dict(orient="records"):
+                try:
+                    plans.append((row.get("week_of"), {c: json.loads(row.get(c) or "[]") for c in PLAN_COLUMNS[1:]}))
+                except (TypeError, ValueError):
+                    logger.warning("Skipping unreadable plan for week %s", row.get("week_of"))
+
+        imported = {}
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._meta("csv_migrated"):
+                    self._conn.execute("ROLLBACK")
+                    return False
+                if logs is not None:
+                    imported["logs"] = self._insert_logs(logs.to_dict(orient="records"))
+                has_prefs = self._conn.execute("SELECT 1 FROM prefs WHERE id = 1").fetchone()
+                if prefs is not None and len(prefs) and not has_prefs:
+                    self._insert_prefs(prefs.iloc[0].to_dict())
+                    imported["prefs"] = 1
+                if frame is not None:
+                    for week_of, data in plans:
+                        self._insert_plan(week_of, data)
+                    imported["plans"] = len(plans)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    ("csv_migrated", json.dumps({"at": time.time(), **imported})),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._logs = self._prefs = self._plan = None
+        if imported:
+            logger.info("Migrated CSV data into %s: %s", self.path, imported)
+            self.maybe_backup()
+        return True
+
+    # ---------- backups ----------
+    def backups(self) -> List[Path]:
+        return sorted(self.backup_dir.glob(f"{self.path.stem}_*.db"))
+
+    def maybe_backup(self) -> Optional[Path]:
+        """Snapshot the database if the newest backup is older than the interval."""
+        existing = self.backups()
+        if existing and time.time() - existing[-1].stat().st_mtime < self.backup_interval:
+            return None
+        return self.backup()
+
+    def backup(self) -> Optional[Path]:
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        ts = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+        target = self.backup_dir / f"{self.path.stem}_{ts}.db"
+        try:
+            with self._db_lock:
+                # VACUUM INTO writes a defragmented copy in one pass.
+                self._conn.execute("VACUUM INTO ?", (str(target),))
+        except sqlite3.Error as e:
+            logger.warning("Backup to %s failed: %s", target, e)
+            return None
+        for old in self.backups()[: -self.keep_backups]:
+            old.unlink(missing_ok=True)
+        return target
+
+    def close(self) -> None:
+        with self._db_lock:
+            self._conn.close()
+
+
+def _read_legacy_csv(path: Path) -> Optional[pd.DataFrame]:
+    if not path.exists():
+        return None
+    try:
+        return pd.read_csv(path)
+    except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
+        logger.warning("Could not migrate %s: %s", path, e)
+        return None
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# Import the app modules from the project root. app.py itself (Streamlit)
+# is not imported; everything it uses is tested through its modules.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,68 @@
+import pandas as pd
+
+from analytics import summarize_logs
+from storage import LOG_COLUMNS
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=list(LOG_COLUMNS))
+
+
+def history(days, start="2024-01-01", **extra):
+    """``days`` daily entries, losing 0.1 kg a day from 90 kg."""
+    dates = pd.date_range(start, periods=days)
+    return frame([
+        {"date": str(d.date()), "weight_kg": 90 - 0.1 * i, "steps": 8000, "sleep_hours": 7.5,
+         "calories": 2200, "protein_g": 150, **extra}
+        for i, d in enumerate(dates)
+    ])
+
+
+def test_empty_log_has_nothing_to_summarize():
+    assert summarize_logs(frame([])) == {"days_logged": 0}
+
+
+def test_unparseable_dates_count_as_no_entries():
+    assert summarize_logs(frame([{"date": "soon", "steps": 100}])) == {"days_logged": 0}
+
+
+def test_sparse_log_leaves_the_trends_out():
+    logs = frame([
+        {"date": "2024-03-01", "weight_kg": 80, "steps": 5000, "notes": "first day"},
+        {"date": "2024-03-03", "weight_kg": 0, "calories": 2000},  # 0 is the form default
+        {"date": "2024-03-03", "steps": 7000, "notes": "  "},
+    ])
+    summary = summarize_logs(logs, kcal_target=2000)
+
+    assert summary["days_logged"] == 2
+    assert (summary["first_date"], summary["last_date"]) == ("2024-03-01", "2024-03-03")
+    weight = summary["weight"]
+    assert weight["latest_7d_mean"] == 80.0
+    assert weight["trend_kg_per_week_28d"] is None
+    assert weight["change_12w"] is None
+    assert summary["estimated_tdee_kcal"] is None
+    assert summary["adherence_28d"] == {"kcal_within_10pct": 1.0, "kcal_mean_vs_target": 0.0}
+    assert summary["recent_notes"] == ["first day"]
+
+
+def test_long_history_reports_trend_tdee_and_adherence():
+    summary = summarize_logs(history(120), kcal_target=2000, protein_target=180, weeks=2)
+
+    weight = summary["weight"]
+    assert weight["trend_kg_per_week_28d"] == -0.7
+    assert weight["change_12w"] == -8.4
+    assert len(weight["monthly_means"]) == 4
+    # 0.1 kg a day is 770 kcal below maintenance.
+    assert summary["estimated_tdee_kcal"] == 2970
+    assert summary["adherence_28d"] == {
+        "kcal_within_10pct": 1.0, "kcal_mean_vs_target": 200.0, "protein_hit_90pct": 0.0,
+    }
+    assert [w["steps"] for w in summary["weekly_means"]] == [8000.0] * len(summary["weekly_means"])
+    assert 2 <= len(summary["weekly_means"]) <= 3
+
+
+def test_summary_size_does_not_grow_with_history():
+    short = summarize_logs(history(200, notes="ok"))
+    long = summarize_logs(history(2000, start="2019-01-01", notes="ok"))
+    assert len(str(long)) <= len(str(short)) + 20
+    assert long["recent_notes"] == ["ok"] * 3
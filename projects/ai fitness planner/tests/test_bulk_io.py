@@ -0,0 +1,95 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+import bulk_io
+from bulk_io import export_logs, import_logs, iter_json_records
+from storage import PlannerStore
+
+ROWS = [
+    {"date": f"2024-01-{d:02d}", "weight_kg": 80 - d / 10, "steps": 1000 * d, "notes": f"day {d}, \"ok\""}
+    for d in range(1, 8)
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = PlannerStore(str(tmp_path / "planner.db"), backup_dir=str(tmp_path / "backups"))
+    yield s
+    s.close()
+
+
+@pytest.fixture
+def other(tmp_path):
+    s = PlannerStore(str(tmp_path / "other.db"), backup_dir=str(tmp_path / "backups"))
+    yield s
+    s.close()
+
+
+@pytest.mark.parametrize("fmt", ["csv", "json", "jsonl"])
+def test_export_then_import_round_trips(store, other, fmt):
+    store.append_logs(ROWS)
+    out = io.StringIO()
+    assert export_logs(store, out, fmt, chunksize=3) == len(ROWS)
+    if fmt == "json":
+        assert len(json.loads(out.getvalue())) == len(ROWS)
+
+    stats = import_logs(other, io.StringIO(out.getvalue()), fmt, chunksize=2)
+    assert (stats["rows_read"], stats["inserted"], stats["skipped"]) == (7, 7, 0)
+    pd.testing.assert_frame_equal(other.logs_frame(), store.logs_frame())
+
+
+def test_aliases_and_units_are_mapped(store):
+    text = "Day,Total Steps,Weight (lb),Minutes Asleep,Comment\n2024-02-01T22:30:00+02:00,9000,176.37,450,late run\n"
+    import_logs(store, io.StringIO(text))
+    row = store.logs_frame().iloc[0]
+    # The local date is kept; no shift to UTC.
+    assert row["date"] == "2024-02-01"
+    assert (row["steps"], row["weight_kg"], row["sleep_hours"]) == (9000, 80.0, 7.5)
+    assert row["notes"] == "late run"
+
+
+def test_duplicates_and_days_already_logged(store):
+    store.append_log({"date": "2024-01-01", "steps": 100})
+    text = (
+        "date,steps,calories\n"
+        "2024-01-01,5,2000\n"   # already logged: skipped
+        "2024-01-02,1,\n"
+        "2024-01-02,2,1800\n"   # same day in the chunk: the later row wins
+        "not a date,3,\n"
+    )
+    stats = import_logs(store, io.StringIO(text))
+
+    assert stats == {"rows_read": 4, "inserted": 1, "updated": 0, "skipped": 2, "no_date": 1}
+    logs = store.logs_frame().set_index("date")
+    assert logs.loc["2024-01-01", "steps"] == 100 and pd.isna(logs.loc["2024-01-01", "calories"])
+    assert (logs.loc["2024-01-02", "steps"], logs.loc["2024-01-02", "calories"]) == (2, 1800)
+
+
+def test_fill_existing_only_fills_empty_fields(store):
+    store.append_log({"date": "2024-01-01", "steps": 100})
+    stats = import_logs(store, io.StringIO("date,steps,calories\n2024-01-01,5,2000\n"), fill_existing=True)
+
+    assert (stats["inserted"], stats["updated"], stats["skipped"]) == (0, 1, 0)
+    row = store.logs_frame().iloc[0]
+    assert (row["steps"], row["calories"]) == (100, 2000)
+
+
+def test_missing_date_column_is_an_error(store):
+    with pytest.raises(ValueError, match="No date column"):
+        import_logs(store, io.StringIO("steps\n100\n"))
+
+
+def test_json_records_split_across_reads(monkeypatch):
+    monkeypatch.setattr(bulk_io, "_READ_BYTES", 7)
+    records = [{"date": "2024-01-01", "notes": "a ] b, [c"}, {"date": "2024-01-02", "nested": {"x": [1, 2]}}]
+    assert list(iter_json_records(io.StringIO(" [\n" + json.dumps(records)[1:]))) == records
+    assert list(iter_json_records(io.StringIO("[]"))) == []
+
+
+def test_truncated_json_is_reported(monkeypatch):
+    monkeypatch.setattr(bulk_io, "_READ_BYTES", 7)
+    with pytest.raises(ValueError, match="Truncated"):
+        list(iter_json_records(io.StringIO('[{"date": "2024-01-01"}, {"date": ')))
@@ -0,0 +1,125 @@
+import threading
+import time
+
+from jobs import CANDIDATE_SETTINGS, RETRY_SETTINGS, PlanJobRunner
+from plan_stream import PlanCancelled, PlanRejected
+
+GOOD = {"ok": True}
+BAD = {"ok": False}
+
+
+def valid(plan):
+    return plan.get("ok", False)
+
+
+def wait_for(job, timeout=5):
+    deadline = time.time() + timeout
+    while job.status == "running":
+        assert time.time() < deadline, "job did not finish"
+        time.sleep(0.01)
+    return job
+
+
+class Generator:
+    """Records calls; ``script(temperature)`` decides each call's outcome."""
+
+    def __init__(self, script):
+        self.script = script
+        self.calls = []
+        self.cancelled = []
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, max_tokens, temperature, usage, stream=False, on_item=None, cancel=None):
+        with self._lock:
+            self.calls.append((temperature, max_tokens, stream))
+        usage["total_tokens"] = 100
+        return self.script(temperature, on_item, cancel, self)
+
+
+def test_identical_submissions_share_one_running_job():
+    release = threading.Event()
+
+    def script(temperature, on_item, cancel, gen):
+        release.wait(5)
+        return GOOD
+
+    gen = Generator(script)
+    runner = PlanJobRunner(gen, valid)
+    first = runner.submit("key", ("prefs",))
+    second = runner.submit("key", ("prefs",))
+    release.set()
+
+    assert first is second
+    assert wait_for(first).status == "done"
+    assert len(gen.calls) == 1
+    assert runner.get("key") is first
+
+
+def test_single_candidate_that_fails_validation_is_retried_once():
+    gen = Generator(lambda t, on_item, cancel, gen: GOOD if t == RETRY_SETTINGS[0] else BAD)
+    saved = []
+    job = wait_for(PlanJobRunner(gen, valid).submit("key", (), on_success=saved.append))
+
+    assert job.status == "done" and job.result == GOOD
+    assert [c[:2] for c in gen.calls] == [CANDIDATE_SETTINGS[0], RETRY_SETTINGS]
+    assert job.attempts == 2 and job.tokens == 200
+    assert saved == [job]
+
+
+def test_job_fails_when_the_retry_fails_too():
+    gen = Generator(lambda t, on_item, cancel, gen: BAD)
+    job = wait_for(PlanJobRunner(gen, valid).submit("key", ()))
+    assert job.status == "failed"
+    assert job.rejected == BAD
+    assert len(gen.calls) == 2
+
+
+def test_rejected_stream_counts_as_a_failed_check():
+    def script(temperature, on_item, cancel, gen):
+        if len(gen.calls) == 1:
+            raise PlanRejected("only 5 workouts", {"workouts": [1, 2, 3, 4, 5]})
+        return GOOD
+
+    gen = Generator(script)
+    job = wait_for(PlanJobRunner(gen, valid).submit("key", (), stream=True))
+    assert job.status == "done"
+    assert job.reject_reason == "only 5 workouts"
+    assert all(stream for _, _, stream in gen.calls)
+
+
+def test_first_valid_candidate_wins_and_the_others_are_stopped():
+    winner = CANDIDATE_SETTINGS[1][0]
+
+    def script(temperature, on_item, cancel, gen):
+        if temperature == winner:
+            time.sleep(0.05)
+            return GOOD
+        # A slow candidate that streams items until it is told to stop.
+        for i in range(200):
+            if cancel.is_set():
+                with gen._lock:
+                    gen.cancelled.append(temperature)
+                raise PlanCancelled()
+            on_item("workouts", {"day": i})
+            time.sleep(0.01)
+        return BAD
+
+    gen = Generator(script)
+    job = wait_for(PlanJobRunner(gen, valid).submit("key", (), n_candidates=3))
+    time.sleep(0.1)  # let the losers notice
+
+    assert job.status == "done" and job.result == GOOD
+    assert job.attempts == 3
+    # Several candidates always stream, so the losers can be cut short.
+    assert all(stream for _, _, stream in gen.calls)
+    assert sorted(gen.cancelled) == sorted(t for t, _ in CANDIDATE_SETTINGS[:3] if t != winner)
+    assert job.partial == {}  # not a streaming job, so nothing is shown
+
+
+def test_generation_error_fails_the_job():
+    def script(temperature, on_item, cancel, gen):
+        raise RuntimeError("no key")
+
+    job = wait_for(PlanJobRunner(Generator(script), valid).submit("key", ()))
+    assert job.status == "failed"
+    assert isinstance(job.error, RuntimeError)
@@ -0,0 +1,47 @@
+import pytest
+
+from plan_cache import PlanCache, plan_cache_key
+
+PLAN = {"workouts": ["x" * 100], "meals": [], "shopping_list": []}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PlanCache(str(tmp_path / "plan_cache.db"), max_bytes=300)
+
+
+def test_key_is_canonical_and_covers_every_part():
+    assert plan_cache_key({"a": 1, "b": 2}, "2024-01-01") == plan_cache_key({"b": 2, "a": 1}, "2024-01-01")
+    assert plan_cache_key({"a": 1}, "2024-01-01") != plan_cache_key({"a": 1}, "2024-01-08")
+
+
+def test_hit_reports_what_generation_cost(cache):
+    assert cache.get("k") is None
+    cache.put("k", PLAN, tokens=1500, seconds=12.5)
+    assert cache.get("k") == PLAN
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert (stats["tokens_saved"], stats["seconds_saved"]) == (1500, 12.5)
+
+
+def test_least_recently_used_plans_are_evicted_past_max_bytes(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("plan_cache.time.time", lambda: now[0])
+    for key in ("a", "b"):
+        cache.put(key, PLAN)
+        now[0] += 1
+    cache.get("a")  # "b" is now the least recently used
+    now[0] += 1
+    cache.put("c", PLAN)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == PLAN and cache.get("c") == PLAN
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= cache.max_bytes
+
+
+def test_entries_survive_reopening(tmp_path):
+    PlanCache(str(tmp_path / "plan_cache.db")).put("k", PLAN)
+    assert PlanCache(str(tmp_path / "plan_cache.db")).get("k") == PLAN
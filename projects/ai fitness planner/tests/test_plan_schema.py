@@ -0,0 +1,43 @@
+import copy
+
+import pytest
+
+from plan_schema import item_errors, plan_errors, plan_ok
+from tests.test_plan_stream import valid_plan
+
+
+def broken(change):
+    plan = copy.deepcopy(valid_plan())
+    change(plan)
+    return plan
+
+
+CASES = [
+    (lambda p: p.pop("meals"), "meals: missing"),
+    (lambda p: p["meals"][0].update(kcal=True), "meals[0].kcal: expected number, got bool"),
+    (lambda p: p["workouts"][2].pop("day"), "workouts[2].day: missing"),
+    (lambda p: p["shopping_list"].append(3), "shopping_list[20]: expected string, got int"),
+    (lambda p: p.update(workouts=p["workouts"][:6]), "workouts: 6 items, need at least 7"),
+]
+
+
+def test_valid_plan_passes():
+    assert plan_ok(valid_plan())
+    assert plan_errors(valid_plan()) == []
+
+
+@pytest.mark.parametrize("change, message", CASES)
+def test_fast_check_agrees_with_the_explanation(change, message):
+    plan = broken(change)
+    assert not plan_ok(plan)
+    assert message in plan_errors(plan)
+
+
+def test_not_an_object():
+    assert not plan_ok(["workouts"])
+    assert plan_errors(None)
+
+
+def test_item_errors_name_the_position():
+    assert item_errors("meals", {"day": "Mon"}, 4)[0].startswith("meals[4]")
+    assert item_errors("meals", valid_plan()["meals"][0]) == []
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from plan_schema import stream_problem
+from plan_stream import PlanStreamParser
+
+PLAN = {
+    "workouts": [{"day": "Mon", "main": "Squat 5x5 \"heavy\" {top set}"}, {"day": "Tue", "main": "Run [easy]"}],
+    "meals": [{"day": "Mon", "kcal": 1900.5, "notes": None}],
+    "shopping_list": ["eggs, 12", "oats 1 kg", "tahini \\ paste"],
+    "notes": "not a list",
+    "empty": [],
+    "numbers": [1, -2.5e3, True, None],
+}
+TEXT = json.dumps(PLAN, indent=1)
+
+
+def feed_all(chunks):
+    parser = PlanStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return parser, events
+
+
+def expected_events():
+    events = []
+    for key, value in PLAN.items():
+        if not isinstance(value, list):
+            events.append(("not_list", key, None))
+            continue
+        events.extend(("item", key, item) for item in value)
+        events.append(("end", key, len(value)))
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(TEXT)])
+def test_same_events_for_any_chunk_boundaries(size):
+    parser, events = feed_all(TEXT[i:i + size] for i in range(0, len(TEXT), size))
+    assert events == expected_events()
+    assert json.loads(parser.text) == PLAN
+    assert parser.items["workouts"] == PLAN["workouts"]
+
+
+def test_half_received_item_is_not_emitted():
+    parser = PlanStreamParser()
+    cut = TEXT.index('"Tue"')
+    events = parser.feed(TEXT[:cut])
+    assert events == [("item", "workouts", PLAN["workouts"][0])]
+    assert parser.feed(TEXT[cut:])[0] == ("item", "workouts", PLAN["workouts"][1])
+
+
+def test_text_around_the_object_is_ignored():
+    _, events = feed_all(['Here you go:\n{"shopping_list": ["a",', ' "b"]}\nEnjoy!'])
+    assert events == [("item", "shopping_list", "a"), ("item", "shopping_list", "b"), ("end", "shopping_list", 2)]
+
+
+def valid_plan():
+    days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+    return {
+        "workouts": [{"day": d, "session_type": "Strength", "main": "Squat 5x5", "RPE_target": 7} for d in days],
+        "meals": [{"day": d, "breakfast": "Eggs", "lunch": "Salad", "dinner": "Fish", "kcal": 1900} for d in days],
+        "shopping_list": [f"Item {i} 1 kg" for i in range(20)],
+    }
+
+
+def first_problem(text, size=16):
+    """Feed ``text`` the way the app does, which raises PlanRejected on the
+    first problem; return (reason, characters read by then)."""
+    parser = PlanStreamParser()
+    for start in range(0, len(text), size):
+        for kind, key, value in parser.feed(text[start:start + size]):
+            reason = stream_problem(kind, key, value, len(parser.items.get(key, ())) - 1)
+            if reason:
+                return reason, start + size
+    return None, len(text)
+
+
+def test_valid_plan_streams_without_problems():
+    assert first_problem(json.dumps(valid_plan())) == (None, len(json.dumps(valid_plan())))
+
+
+def test_bad_item_rejects_the_plan_as_soon_as_it_arrives():
+    plan = valid_plan()
+    plan["workouts"][1]["main"] = None
+    text = json.dumps(plan)
+
+    reason, read = first_problem(text)
+    assert reason == "workouts[1].main: expected string, got NoneType"
+    assert read < len(text) / 3
+
+
+def test_short_section_rejects_the_plan_when_it_closes():
+    plan = valid_plan()
+    plan["workouts"] = plan["workouts"][:5]
+    text = json.dumps(plan)
+
+    reason, read = first_problem(text)
+    assert reason == "only 5 workouts (need 7)"
+    assert read < len(text) / 2
@@ -0,0 +1,147 @@
+import json
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from storage import PlannerStore
+
+PLAN = {"workouts": [{"day": "Mon"}], "meals": [{"day": "Mon"}], "shopping_list": ["eggs"]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = PlannerStore(str(tmp_path / "planner.db"), backup_dir=str(tmp_path / "backups"))
+    yield s
+    s.close()
+
+
+def write_legacy_csvs(directory):
+    pd.DataFrame([{"date": f"2024-01-0{i}", "steps": 1000 * i} for i in range(1, 4)]).to_csv(
+        directory / "logs.csv", index=False
+    )
+    pd.DataFrame([{"goal": "fat_loss", "diet": "keto", "kcal_target": 2000}]).to_csv(
+        directory / "prefs.csv", index=False
+    )
+    pd.DataFrame([
+        {"week_of": "2024-01-01", **{k: json.dumps(v) for k, v in PLAN.items()}},
+        {"week_of": "2024-01-08", "workouts": "{not json", "meals": "[]", "shopping_list": "[]"},
+    ]).to_csv(directory / "plan.csv", index=False)
+
+
+def test_logs_prefs_and_plans_round_trip(store):
+    store.append_log({"date": "2024-01-02", "steps": 9000, "notes": "run"})
+    store.save_prefs({"goal": "strength", "kcal_target": 2500})
+    store.add_plan("2024-01-01", PLAN)
+
+    logs = store.logs_frame()
+    assert list(logs["date"]) == ["2024-01-02"]
+    assert logs["steps"].iloc[0] == 9000
+    assert store.load_prefs()["goal"] == "strength"
+    assert store.latest_plan() == {"week_of": "2024-01-01", **PLAN}
+
+
+def test_csv_migration_runs_once(store, tmp_path):
+    write_legacy_csvs(tmp_path)
+
+    assert store.migrate_from_csv(str(tmp_path))
+    assert not store.migrate_from_csv(str(tmp_path))
+
+    assert list(store.logs_frame()["date"]) == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert store.load_prefs()["diet"] == "keto"
+    assert store.plan_count() == 1  # the unreadable plan is skipped
+
+
+def test_second_process_does_not_repeat_the_migration(store, tmp_path):
+    write_legacy_csvs(tmp_path)
+    other = PlannerStore(str(tmp_path / "planner.db"), backup_dir=str(tmp_path / "backups"))
+    try:
+        assert store.migrate_from_csv(str(tmp_path))
+        assert not other.migrate_from_csv(str(tmp_path))
+        assert len(other.logs_frame()) == 3
+    finally:
+        other.close()
+
+
+def test_failed_migration_leaves_nothing_behind(store, tmp_path, monkeypatch):
+    write_legacy_csvs(tmp_path)
+
+    def broken(week_of, data):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(store, "_insert_plan", broken)
+    with pytest.raises(sqlite3.OperationalError):
+        store.migrate_from_csv(str(tmp_path))
+    monkeypatch.undo()
+
+    assert store.logs_frame().empty
+    assert store.load_prefs() is None
+    # A retry imports everything exactly once.
+    assert store.migrate_from_csv(str(tmp_path))
+    assert len(store.logs_frame()) == 3
+
+
+def test_appends_extend_the_cached_frame_without_changing_old_ones(store):
+    store.append_logs([{"date": "2024-01-01", "steps": 1}, {"date": "2024-01-02", "steps": 2}])
+    before = store.logs_frame()
+    version = store.logs_version
+
+    store.append_log({"date": "2024-01-03", "steps": 3})
+    after = store.logs_frame()
+
+    assert list(before["date"]) == ["2024-01-01", "2024-01-02"]
+    assert list(after["date"]) == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert store.logs_version == version + 1
+    assert store.logs_frame() is after  # unchanged store, same cached frame
+
+
+def test_backfilled_day_keeps_date_order(store):
+    store.append_logs([{"date": "2024-01-05"}, {"date": "2024-01-07"}])
+    store.logs_frame()
+    store.append_logs([{"date": "2024-01-06", "notes": "late"}, {"date": "2024-01-01"}])
+
+    logs = store.logs_frame()
+    assert list(logs["date"]) == ["2024-01-01", "2024-01-05", "2024-01-06", "2024-01-07"]
+    assert logs.loc[logs["date"] == "2024-01-06", "notes"].item() == "late"
+
+
+def test_cached_logs_match_a_fresh_read_after_many_appends(store, tmp_path):
+    store.logs_frame()
+    for day in range(1, 29):
+        store.append_log({"date": f"2024-02-{day:02d}", "steps": day, "weight_kg": 80 + day / 10})
+    fresh = PlannerStore(str(tmp_path / "planner.db"), backup_dir=str(tmp_path / "backups"))
+    try:
+        pd.testing.assert_frame_equal(store.logs_frame(), fresh.logs_frame())
+    finally:
+        fresh.close()
+
+
+def test_writes_from_another_connection_drop_the_caches(store, tmp_path):
+    store.append_log({"date": "2024-01-01"})
+    store.save_prefs({"goal": "strength"})
+    assert len(store.logs_frame()) == 1
+    assert store.load_prefs()["goal"] == "strength"
+    assert store.latest_plan() is None
+    version = store.logs_version
+
+    other = PlannerStore(str(tmp_path / "planner.db"), backup_dir=str(tmp_path / "backups"))
+    try:
+        other.append_log({"date": "2024-01-02"})
+        other.save_prefs({"goal": "endurance"})
+        other.add_plan("2024-01-01", PLAN)
+    finally:
+        other.close()
+
+    assert list(store.logs_frame()["date"]) == ["2024-01-01", "2024-01-02"]
+    assert store.logs_version > version
+    assert store.load_prefs()["goal"] == "endurance"
+    assert store.latest_plan()["week_of"] == "2024-01-01"
+
+
+def test_fill_import_reloads_changed_rows(store):
+    store.append_log({"date": "2024-01-01", "steps": 100})
+    store.logs_frame()
+    assert store.merge_logs([{"date": "2024-01-01", "steps": 5, "calories": 2000}], fill_existing=True) == (0, 1)
+
+    row = store.logs_frame().iloc[0]
+    assert (row["steps"], row["calories"]) == (100, 2000)
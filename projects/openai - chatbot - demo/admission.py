@@ -0,0 +1,135 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request should get a fast 429 instead of being served."""
+
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class RateLimiter:
+    """Token buckets keyed by client (session ID, IP address, ...).
+
+    Each key refills at ``rate_per_minute`` up to ``burst`` tokens. Buckets
+    live in an LRU capped at ``max_keys`` so a flood of new keys cannot grow
+    memory without bound; an evicted key simply starts again with a full
+    bucket.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = 10000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key: str) -> float:
+        """Take one token for ``key``. Returns 0 if allowed, else seconds to wait."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(self.burst), now]
+                self._buckets[key] = bucket
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                tokens, last = bucket
+                bucket[0] = min(self.burst, tokens + (now - last) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            self.rejected += 1
+            return (1 - bucket[0]) / self.rate
+
+
+class UpstreamSlot:
+    """One unit of upstream concurrency. Release is idempotent.
+
+    ``claim()`` marks the slot as handed to the code making the upstream
+    call, so the admitting handler knows whether it must release it itself.
+    """
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._acquired_at = time.monotonic()
+        self.claimed = False
+        self.released = False
+
+    def claim(self) -> "UpstreamSlot":
+        self.claimed = True
+        return self
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self._controller._release(time.monotonic() - self._acquired_at)
+
+    def __del__(self):
+        # Safety net: a stream body that never started still frees its slot.
+        self.release()
+
+    async def __aenter__(self) -> "UpstreamSlot":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+class AdmissionController:
+    """Global cap on upstream calls with a bounded, deadline-limited queue.
+
+    Up to ``max_concurrent`` calls run at once. Further callers wait in line,
+    but only ``max_queue`` of them and for at most ``queue_timeout`` seconds;
+    past either limit they are rejected immediately with a Retry-After hint
+    based on how long slots are currently being held.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self._sem = asyncio.Semaphore(max_concurrent)
+        self._avg_hold = 1.0  # seconds, exponentially weighted
+
+    def retry_after(self) -> float:
+        return self._avg_hold * (self.waiting + 1) / self.max_concurrent
+
+    async def acquire(self) -> UpstreamSlot:
+        if self._sem.locked() and self.waiting >= self.max_queue:
+            self.rejected_full += 1
+            raise AdmissionRejected("Server busy, try again shortly", self.retry_after())
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            raise AdmissionRejected("Timed out waiting for capacity", self.retry_after()) from None
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        return UpstreamSlot(self)
+
+    def _release(self, held: float) -> None:
+        self.active -= 1
+        self._avg_hold = 0.9 * self._avg_hold + 0.1 * held
+        self._sem.release()
@@ -0,0 +1,115 @@
+"""Local stand-in for the OpenAI Responses API.
+
+Serves ``POST /v1/responses`` in both streaming and non-streaming form, with
+configurable latency and token rate, so the chatbot can be load-tested
+without spending API money. Point the server at it with:
+
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=fake uvicorn server:app
+
+Settings (environment variables):
+    FAKE_FIRST_TOKEN_SECONDS  delay before the first token (default 0.3)
+    FAKE_TOKENS_PER_SECOND    streaming rate after the first token (default 80)
+    FAKE_REPLY_TOKENS         tokens per reply (default 60)
+
+Fault injection, for exercising timeouts, hedging and fallback:
+    FAKE_ERROR_RATE           fraction of calls answered with HTTP 500 (default 0)
+    FAKE_SLOW_RATE            fraction of calls that stall before the first token (default 0)
+    FAKE_SLOW_SECONDS         how long a stalled call waits (default 10)
+    FAKE_FAILING_MODELS       comma-separated models that always return HTTP 503
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FIRST_TOKEN_SECONDS = float(os.getenv("FAKE_FIRST_TOKEN_SECONDS", "0.3"))
+TOKENS_PER_SECOND = float(os.getenv("FAKE_TOKENS_PER_SECOND", "80"))
+REPLY_TOKENS = int(os.getenv("FAKE_REPLY_TOKENS", "60"))
+ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+SLOW_RATE = float(os.getenv("FAKE_SLOW_RATE", "0"))
+SLOW_SECONDS = float(os.getenv("FAKE_SLOW_SECONDS", "10"))
+FAILING_MODELS = {m.strip() for m in os.getenv("FAKE_FAILING_MODELS", "").split(",") if m.strip()}
+
+_WORDS = (
+    "This is a simulated reply from the local benchmark backend. It streams "
+    "words at a fixed rate so throughput numbers reflect the server and not "
+    "the network or the model."
+).split()
+
+app = FastAPI()
+
+
+def _reply_tokens(n: int):
+    return [_WORDS[i % len(_WORDS)] + " " for i in range(n)]
+
+
+def _response_object(model: str, text: str, input_tokens: int, output_tokens: int) -> dict:
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": "completed",
+        "output": [
+            {
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex}",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "usage": {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+@app.post("/v1/responses")
+async def responses(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake-model")
+    input_tokens = sum(len(str(m.get("content", ""))) for m in body.get("input", [])) // 4
+    tokens = _reply_tokens(REPLY_TOKENS)
+
+    if model in FAILING_MODELS:
+        return JSONResponse({"error": {"message": f"{model} unavailable", "type": "server_error"}}, status_code=503)
+    if random.random() < ERROR_RATE:
+        return JSONResponse({"error": {"message": "injected failure", "type": "server_error"}}, status_code=500)
+    first_token = FIRST_TOKEN_SECONDS + (SLOW_SECONDS if random.random() < SLOW_RATE else 0)
+
+    if not body.get("stream"):
+        await asyncio.sleep(first_token + len(tokens) / TOKENS_PER_SECOND)
+        return JSONResponse(_response_object(model, "".join(tokens), input_tokens, len(tokens)))
+
+    async def events():
+        seq = 0
+        yield _sse({"type": "response.created", "sequence_number": seq, "response": {"status": "in_progress"}})
+        await asyncio.sleep(first_token)
+        for token in tokens:
+            seq += 1
+            yield _sse({
+                "type": "response.output_text.delta",
+                "sequence_number": seq,
+                "item_id": "msg_fake",
+                "output_index": 0,
+                "content_index": 0,
+                "delta": token,
+            })
+            await asyncio.sleep(1 / TOKENS_PER_SECOND)
+        seq += 1
+        final = _response_object(model, "".join(tokens), input_tokens, len(tokens))
+        yield _sse({"type": "response.completed", "sequence_number": seq, "response": final})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
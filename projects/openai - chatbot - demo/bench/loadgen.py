@@ -0,0 +1,179 @@
+"""Load generator for the chatbot server.
+
+Drives ``/chat`` and ``/chat-stream`` at a set of concurrency levels and
+reports latency percentiles, requests per second, time to first byte and
+(when given the server PID) resident memory per session.
+
+    python bench/loadgen.py --url http://127.0.0.1:8000 --concurrency 1,10,50 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from typing import List, Optional
+
+import httpx
+
+SAMPLE_FAQ = (
+    "Opening hours: 9am to 5pm, Monday to Friday.\n\n"
+    "Shipping: 3-5 business days within the UK.\n\n"
+    "Returns: accepted within 30 days with a receipt."
+)
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a local process (Linux /proc)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+async def session_count(client: httpx.AsyncClient) -> Optional[int]:
+    try:
+        r = await client.get("/health")
+        return r.json().get("sessions")
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+async def one_request(client: httpx.AsyncClient, endpoint: str, payload: dict) -> dict:
+    start = time.perf_counter()
+    ttfb = None
+    status = 0
+    try:
+        async with client.stream("POST", endpoint, json=payload) as r:
+            status = r.status_code
+            async for chunk in r.aiter_bytes():
+                if chunk and ttfb is None:
+                    ttfb = time.perf_counter() - start
+    except httpx.HTTPError:
+        status = -1
+    total = time.perf_counter() - start
+    return {"status": status, "latency": total, "ttfb": ttfb if ttfb is not None else total}
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    concurrency: int,
+    n_requests: int,
+    mode: str,
+    unique: bool,
+    sse: bool,
+) -> dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(n_requests):
+        queue.put_nowait(i)
+    results: List[dict] = []
+    path = f"{endpoint}?format=sse" if sse and endpoint == "/chat-stream" else endpoint
+
+    async def worker():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            message = f"Question {i} {uuid.uuid4().hex[:8]}" if unique else "What are your opening hours?"
+            payload = {"message": message, "mode": mode, "session_id": str(uuid.uuid4())}
+            if mode == "faq":
+                payload["faq_context"] = SAMPLE_FAQ
+            results.append(await one_request(client, path, payload))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r["status"] == 200]
+    lat = [r["latency"] for r in ok]
+    ttfb = [r["ttfb"] for r in ok]
+    return {
+        "endpoint": path,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "rps": len(ok) / elapsed if elapsed else 0.0,
+        "p50": percentile(lat, 50),
+        "p95": percentile(lat, 95),
+        "p99": percentile(lat, 99),
+        "mean": statistics.fmean(lat) if lat else 0.0,
+        "ttfb_p50": percentile(ttfb, 50),
+        "ttfb_p95": percentile(ttfb, 95),
+    }
+
+
+def print_report(rows: List[dict]) -> None:
+    header = f"{'endpoint':<24}{'conc':>6}{'reqs':>7}{'err':>5}{'rps':>9}{'p50':>8}{'p95':>8}{'p99':>8}{'ttfb50':>8}{'ttfb95':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['endpoint']:<24}{r['concurrency']:>6}{r['requests']:>7}{r['errors']:>5}"
+            f"{r['rps']:>9.1f}{r['p50']:>8.3f}{r['p95']:>8.3f}{r['p99']:>8.3f}"
+            f"{r['ttfb_p50']:>8.3f}{r['ttfb_p95']:>8.3f}"
+        )
+
+
+async def main(args) -> List[dict]:
+    levels = [int(c) for c in args.concurrency.split(",")]
+    endpoints = ["/chat", "/chat-stream"] if args.endpoint == "both" else [f"/{args.endpoint}"]
+    limits = httpx.Limits(max_connections=max(levels) + 10, max_keepalive_connections=max(levels) + 10)
+    rows = []
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        rss_before = rss_bytes(args.server_pid) if args.server_pid else None
+        sessions_before = await session_count(client)
+
+        for endpoint in endpoints:
+            for level in levels:
+                rows.append(
+                    await run_level(client, endpoint, level, args.requests, args.mode, not args.repeat, args.sse)
+                )
+
+        rss_after = rss_bytes(args.server_pid) if args.server_pid else None
+        sessions_after = await session_count(client)
+
+    print_report(rows)
+    if rss_before and rss_after and sessions_before is not None and sessions_after:
+        added = sessions_after - sessions_before
+        if added > 0:
+            per_session = (rss_after - rss_before) / added
+            print(f"\nserver RSS {rss_before / 1e6:.1f} MB -> {rss_after / 1e6:.1f} MB "
+                  f"over {added} new sessions (~{per_session / 1024:.1f} KiB/session)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+    return rows
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("--endpoint", choices=["chat", "chat-stream", "both"], default="both")
+    p.add_argument("--concurrency", default="1,10,50", help="comma-separated levels")
+    p.add_argument("--requests", type=int, default=200, help="requests per level")
+    p.add_argument("--mode", default="assistant", choices=["assistant", "faq", "strict"])
+    p.add_argument("--repeat", action="store_true", help="send the same question every time (exercises cache/coalescing)")
+    p.add_argument("--sse", action="store_true", help="use SSE framing on /chat-stream")
+    p.add_argument("--server-pid", type=int, help="server PID for memory-per-session")
+    p.add_argument("--timeout", type=float, default=120.0)
+    p.add_argument("--json", help="also write results to this file")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
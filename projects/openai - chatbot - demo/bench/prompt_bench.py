@@ -0,0 +1,93 @@
+"""Micro-benchmark: per-request prompt assembly, before and after caching.
+
+Compares the original approach (rebuild the system prompt string and a fresh
+message list of new dicts every turn) with ``prompts.build_messages``, which
+reuses a cached system message and the stored history dicts. Reports time
+and bytes allocated per call.
+
+    python bench/prompt_bench.py
+"""
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from prompts import build_messages  # noqa: E402
+
+FAQ = "\n\n".join(f"Q{i}: question number {i}?\nA: answer number {i}, with some detail." for i in range(40))
+HISTORY = [
+    {"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " * 20}
+    for i in range(10)
+]
+
+
+def legacy_build_system_prompt(mode: str, faq_context: Optional[str]) -> str:
+    if mode == "faq":
+        ctx = (faq_context or "").strip()
+        return (
+            "You are a strict FAQ bot.\n"
+            "You must answer ONLY using the provided FAQ_CONTEXT.\n"
+            "If the answer is not explicitly in FAQ_CONTEXT, reply exactly: \"I don't know.\"\n"
+            "Do not guess. Do not add extra facts.\n"
+            "If the user asks for anything unsafe/illegal, refuse.\n\n"
+            f"FAQ_CONTEXT:\n{ctx}\n"
+        )
+    if mode == "strict":
+        return (
+            "You are a strict assistant.\n"
+            "Goals: be correct, brief, and useful.\n"
+            "Output rules:\n"
+            "- Use bullet points by default.\n"
+            "- Keep answers under ~8 bullets unless the user explicitly asks for more.\n"
+            "- If you need clarification, ask exactly ONE question, then stop.\n"
+            "- Do not include filler or long preambles.\n"
+            "- If you do not know, say: \"I don't know.\"\n"
+            "- Refuse unsafe or illegal requests politely.\n"
+        )
+    return (
+        "You are a helpful assistant.\n"
+        "If you do not know the answer, say \"I don't know.\"\n"
+        "Refuse unsafe or illegal requests politely.\n"
+    )
+
+
+def legacy(mode: str, faq_context: Optional[str]):
+    messages = [{"role": "system", "content": legacy_build_system_prompt(mode, faq_context)}]
+    messages.extend({"role": m["role"], "content": m["content"]} for m in HISTORY[-10:])
+    messages.append({"role": "user", "content": "What are your hours?"})
+    return messages
+
+
+def cached(mode: str, faq_context: Optional[str]):
+    return build_messages(mode, faq_context, HISTORY, "What are your hours?")
+
+
+def allocated(fn, *args, calls: int = 1000) -> float:
+    """Average bytes allocated per call (including garbage freed afterwards)."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = [fn(*args) for _ in range(calls)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return (after - before) / calls
+
+
+def main() -> None:
+    print(f"{'case':<18}{'impl':<8}{'us/call':>10}{'bytes/call':>12}")
+    for mode in ("assistant", "strict", "faq"):
+        # The FAQ context arrives as a new string object on every request.
+        ctx = FAQ if mode == "faq" else None
+        for name, fn in (("legacy", legacy), ("cached", cached)):
+            args = (mode, (ctx + " ")[:-1] if ctx else None)
+            n = 20000
+            seconds = timeit.timeit(lambda: fn(*args), number=n)
+            print(f"{mode:<18}{name:<8}{seconds / n * 1e6:>10.2f}{allocated(fn, *args):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Exercise upstream deadlines, hedging and fallback against the fake backend.
+
+Each scenario starts ``fake_openai.py`` with injected delays or errors and a
+chatbot server configured to cope with them, sends a batch of streaming
+requests, and reports success rate, latency and what the resilience layer
+did (from ``/metrics``).
+
+    python bench/resilience_check.py
+"""
+import asyncio
+import os
+import re
+import sys
+
+import httpx
+
+import loadgen
+from run_local import FAKE_PORT, ROOT, SERVER_PORT, start, wait_until_up
+
+SCENARIOS = [
+    {
+        "name": "baseline",
+        "fake": {},
+        "server": {},
+    },
+    {
+        "name": "slow tail, no hedging",
+        "fake": {"FAKE_SLOW_RATE": "0.2", "FAKE_SLOW_SECONDS": "5"},
+        "server": {},
+    },
+    {
+        "name": "slow tail, hedged",
+        "fake": {"FAKE_SLOW_RATE": "0.2", "FAKE_SLOW_SECONDS": "5"},
+        "server": {"HEDGE_REQUESTS": "1", "HEDGE_DELAY_SECONDS": "0.6"},
+    },
+    {
+        "name": "stalls past first-token deadline",
+        "fake": {"FAKE_SLOW_RATE": "0.3", "FAKE_SLOW_SECONDS": "30"},
+        "server": {"UPSTREAM_FIRST_TOKEN_TIMEOUT_SECONDS": "1.5", "UPSTREAM_RETRIES": "2"},
+    },
+    {
+        "name": "20% errors with retry",
+        "fake": {"FAKE_ERROR_RATE": "0.2"},
+        "server": {"UPSTREAM_RETRIES": "2"},
+    },
+    {
+        "name": "primary down, fallback model",
+        "fake": {"FAKE_FAILING_MODELS": "gpt-4o-mini"},
+        "server": {"UPSTREAM_RETRIES": "0", "FALLBACK_MODELS": "fallback-model"},
+    },
+]
+
+COUNTERS = (
+    "chat_upstream_hedges_fired_total",
+    "chat_upstream_hedges_won_total",
+    "chat_upstream_fallbacks_total",
+)
+
+
+def read_counters(text: str) -> dict:
+    out = {}
+    for name in COUNTERS:
+        m = re.search(rf"^{name} (\S+)$", text, re.M)
+        out[name.replace("chat_upstream_", "").replace("_total", "")] = float(m.group(1)) if m else 0
+    return out
+
+
+async def drive(requests: int, concurrency: int) -> dict:
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{SERVER_PORT}", timeout=120) as client:
+        row = await loadgen.run_level(client, "/chat-stream", concurrency, requests, "assistant", True, True)
+        # SSE streams report upstream failures as an error event, not a status code.
+        failed = 0
+        for i in range(min(requests, 20)):
+            r = await client.post("/chat-stream?format=sse", json={"message": f"probe {i}"})
+            failed += "event: error" in r.text
+        metrics = (await client.get("/metrics")).text
+    row["probe_failures"] = failed
+    row.update(read_counters(metrics))
+    return row
+
+
+def main(requests: int = 60, concurrency: int = 10) -> None:
+    base = dict(os.environ)
+    base.setdefault("OPENAI_API_KEY", "fake")
+    base["OPENAI_BASE_URL"] = f"http://127.0.0.1:{FAKE_PORT}/v1"
+    # Keep admission control out of the way; this is about upstream behaviour.
+    base.update({"RATE_LIMIT_IP_PER_MINUTE": "0", "RATE_LIMIT_SESSION_PER_MINUTE": "0", "SESSION_SNAPSHOT_PATH": ""})
+
+    print(f"{'scenario':<36}{'p50':>7}{'p95':>7}{'p99':>7}{'fail/20':>9}{'hedges':>8}{'won':>5}{'fallbk':>8}")
+    for scenario in SCENARIOS:
+        fake = start("fake_openai:app", FAKE_PORT, {**base, **scenario["fake"]}, ROOT / "bench")
+        server = start("server:app", SERVER_PORT, {**base, **scenario["server"]}, ROOT)
+        try:
+            wait_until_up(f"http://127.0.0.1:{FAKE_PORT}/docs")
+            wait_until_up(f"http://127.0.0.1:{SERVER_PORT}/health")
+            r = asyncio.run(drive(requests, concurrency))
+        finally:
+            for proc in (server, fake):
+                proc.terminate()
+                proc.wait(timeout=10)
+        print(
+            f"{scenario['name']:<36}{r['p50']:>7.2f}{r['p95']:>7.2f}{r['p99']:>7.2f}"
+            f"{r['probe_failures']:>9}{r['hedges_fired']:>8.0f}{r['hedges_won']:>5.0f}{r['fallbacks']:>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:3]])
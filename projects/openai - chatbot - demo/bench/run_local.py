@@ -0,0 +1,74 @@
+"""Run the whole benchmark locally: fake upstream, chatbot server, load.
+
+Starts ``bench/fake_openai.py`` and ``server.py`` as uvicorn subprocesses,
+waits for both to come up, runs the load generator against the server and
+shuts everything down. Extra arguments are passed to ``loadgen.py``:
+
+    python bench/run_local.py --concurrency 1,25,100 --requests 300
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+import loadgen
+
+ROOT = Path(__file__).resolve().parent.parent
+FAKE_PORT = int(os.getenv("BENCH_FAKE_PORT", "9100"))
+SERVER_PORT = int(os.getenv("BENCH_SERVER_PORT", "8100"))
+
+
+def wait_until_up(url: str, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start(app: str, port: int, env: dict, cwd: Path) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=cwd,
+        env=env,
+    )
+
+
+def main(argv=None) -> None:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "fake")
+    env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{FAKE_PORT}/v1"
+    # All load comes from one IP and reuses few sessions, so the default rate
+    # limits would turn most requests into 429s. Export them to measure it.
+    env.setdefault("RATE_LIMIT_IP_PER_MINUTE", "0")
+    env.setdefault("RATE_LIMIT_SESSION_PER_MINUTE", "0")
+
+    fake = start("fake_openai:app", FAKE_PORT, env, ROOT / "bench")
+    server = start("server:app", SERVER_PORT, env, ROOT)
+    try:
+        wait_until_up(f"http://127.0.0.1:{FAKE_PORT}/docs")
+        wait_until_up(f"http://127.0.0.1:{SERVER_PORT}/health")
+        args = loadgen.parse_args(
+            ["--url", f"http://127.0.0.1:{SERVER_PORT}", "--server-pid", str(server.pid)]
+            + list(argv if argv is not None else sys.argv[1:])
+        )
+        asyncio.run(loadgen.main(args))
+    finally:
+        for proc in (server, fake):
+            proc.terminate()
+        for proc in (server, fake):
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+if __name__ == "__main__":
+    main()
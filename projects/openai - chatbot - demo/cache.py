@@ -0,0 +1,86 @@
+import hashlib
+import json
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, List, Optional
+
+_PUNCTUATION = str.maketrans("", "", string.punctuation)
+_WHITESPACE = re.compile(r"\s+")
+_REPLAY_CHUNK = re.compile(r"\S+\s*|\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Fold trivially different phrasings together: case, punctuation, spacing."""
+    text = text.lower().translate(_PUNCTUATION)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def replay_chunks(reply: str) -> Iterator[str]:
+    """Split a cached reply into word-sized chunks for the streaming endpoint."""
+    for match in _REPLAY_CHUNK.finditer(reply):
+        yield match.group(0)
+
+
+def prompt_fingerprint(messages: List[dict], model: str) -> str:
+    """SHA-256 of the exact request sent upstream."""
+    payload = json.dumps(
+        {"model": model, "input": messages},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of model replies keyed on a prompt fingerprint.
+
+    The key is a SHA-256 of the exact message list sent upstream plus the
+    model name. With ``normalize`` on, the final user message is normalized
+    first so "What are your hours?" and "what are your hours" share an entry.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, normalize: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.normalize = normalize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def key_for(self, messages: List[dict], model: str) -> str:
+        if self.normalize and messages and messages[-1]["role"] == "user":
+            last = dict(messages[-1], content=normalize_text(messages[-1]["content"]))
+            messages = messages[:-1] + [last]
+        return prompt_fingerprint(messages, model)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or now - entry[1] > self.ttl_seconds:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, reply: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            else:
+                while len(self._data) >= self.max_entries:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+            self._data[key] = (reply, time.time())
@@ -0,0 +1,114 @@
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+class _Broadcast:
+    """One upstream event stream shared by any number of subscribers.
+
+    The producer appends items to a buffer; subscribers replay what is
+    already buffered and then wait for more, so a late joiner still gets the
+    whole reply. When the last subscriber leaves before the stream is done,
+    the producer is cancelled so nobody pays for tokens no one will read.
+    """
+
+    def __init__(self):
+        self.chunks: List = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.producer: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def run(self, source: AsyncIterator) -> None:
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = ConnectionAbortedError("upstream stream was cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator:
+        self.subscribers += 1
+        i = 0
+        try:
+            while True:
+                changed = self._changed
+                while i < len(self.chunks):
+                    yield self.chunks[i]
+                    i += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done and self.producer is not None:
+                self.producer.cancel()
+
+
+class SingleFlight:
+    """Coalesce identical in-flight upstream calls.
+
+    Callers pass a key (the prompt fingerprint) and a factory for the
+    upstream work. The first caller starts it as a background task; anyone
+    arriving with the same key while it runs shares that task instead of
+    making a new upstream call. The task is independent of every caller, so
+    one client disconnecting does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.followers = 0
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+
+    def _track(self, registry: dict, key: str, task: asyncio.Task) -> None:
+        value = registry[key]
+
+        def done(t: asyncio.Task) -> None:
+            if registry.get(key) is value:
+                del registry[key]
+            if not t.cancelled():
+                t.exception()  # mark retrieved; callers re-raise it themselves
+
+        task.add_done_callback(done)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls or key in self._streams
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        """Run ``fn()`` once per key at a time and share its result."""
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._track(self._calls, key, task)
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def stream(self, key: str, factory: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """Subscribe to the upstream stream for ``key``, starting it if needed."""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.leaders += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            task = asyncio.ensure_future(broadcast.run(factory()))
+            broadcast.producer = task
+            self._track(self._streams, key, task)
+        else:
+            self.followers += 1
+        return broadcast.subscribe()
@@ -0,0 +1,252 @@
+import hashlib
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Corpus names double as file names, so keep them to a safe alphabet.
+NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how i in is it of on or our "
+    "the to we what when where which who why with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def chunk_text(text: str, max_chars: int = 600, min_chars: int = 120) -> List[str]:
+    """Split a corpus into retrieval chunks.
+
+    Paragraphs (blank-line separated) are the natural unit for FAQs. A
+    paragraph shorter than ``min_chars`` (typically a question line) is merged
+    with the next one; paragraphs over ``max_chars`` are split on sentence
+    boundaries.
+    """
+    pieces: List[str] = []
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        if len(para) <= max_chars:
+            pieces.append(para)
+            continue
+        current = ""
+        for sentence in _SENTENCE_END.split(para):
+            if current and len(current) + len(sentence) + 1 > max_chars:
+                pieces.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}".strip()
+        if current:
+            pieces.append(current)
+
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and (len(current) >= min_chars or len(current) + len(piece) + 2 > max_chars):
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class FAQIndex:
+    """BM25 index over one FAQ corpus.
+
+    Chunks are identified by content hash. On update, chunks that did not
+    change keep their cached term counts, so only new or edited text is
+    re-tokenized before the posting arrays are rebuilt.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_chunk_chars: int = 600):
+        self.k1 = k1
+        self.b = b
+        self.max_chunk_chars = max_chunk_chars
+        self.chunks: List[str] = []
+        self._term_counts: Dict[str, Counter] = {}
+        self._postings: Dict[str, tuple] = {}
+        self._idf: Dict[str, float] = {}
+        self._norm = np.zeros(0)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def update(self, text: str) -> dict:
+        """Replace the corpus text, re-indexing only chunks that changed."""
+        chunks = chunk_text(text, self.max_chunk_chars)
+        hashes = [hashlib.sha1(c.encode("utf-8")).hexdigest() for c in chunks]
+
+        old = self._term_counts
+        counts = {h: old[h] if h in old else Counter(tokenize(c)) for h, c in zip(hashes, chunks)}
+        added = sum(1 for h in counts if h not in old)
+        removed = sum(1 for h in old if h not in counts)
+
+        self.chunks = chunks
+        self._term_counts = counts
+        self._rebuild([counts[h] for h in hashes])
+        return {"chunks": len(chunks), "added": added, "removed": removed}
+
+    def _rebuild(self, doc_counts: List[Counter]) -> None:
+        n = len(doc_counts)
+        doc_len = np.array([sum(c.values()) for c in doc_counts], dtype=np.float64)
+        avgdl = doc_len.mean() if n else 0.0
+        # Per-document length normalisation term from the BM25 denominator.
+        self._norm = self.k1 * (1 - self.b + self.b * doc_len / avgdl) if avgdl else doc_len
+
+        postings: Dict[str, tuple] = {}
+        for doc_id, counts in enumerate(doc_counts):
+            for term, tf in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc_id)
+                postings[term][1].append(tf)
+
+        self._postings = {
+            term: (np.array(ids, dtype=np.int32), np.array(tfs, dtype=np.float64))
+            for term, (ids, tfs) in postings.items()
+        }
+        self._idf = {
+            term: float(np.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5)))
+            for term, (ids, _) in self._postings.items()
+        }
+
+    def search(self, query: str, k: int = 4) -> List[str]:
+        """Return up to ``k`` chunks ranked by BM25 score, best first."""
+        if not self.chunks:
+            return []
+        scores = np.zeros(len(self.chunks))
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs = posting
+            scores[ids] += self._idf[term] * tfs * (self.k1 + 1) / (tfs + self._norm[ids])
+
+        hits = np.flatnonzero(scores)
+        if hits.size == 0:
+            return []
+        top = hits[np.argsort(-scores[hits], kind="stable")[:k]]
+        return [self.chunks[i] for i in top]
+
+
+class FAQLimitError(Exception):
+    """Registering another corpus would exceed ``FAQRegistry.max_corpora``."""
+
+
+class FAQRegistry:
+    """Named FAQ corpora held by the server.
+
+    With ``directory`` set, each corpus's text is stored there as
+    ``{name}.txt``, so every worker sharing the directory and the next process
+    after a restart see the same corpora. Each process keeps its own index and
+    rebuilds it when the file changes. Without a directory, corpora live in
+    process memory. ``max_corpora`` (0 = no limit) caps how many may exist.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_corpora: int = 0):
+        self.directory = Path(directory) if directory else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_corpora = max_corpora
+        self._indexes: Dict[str, FAQIndex] = {}
+        # name -> (mtime_ns, size) of the file its index was built from
+        self._versions: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def valid_name(name: str) -> bool:
+        return bool(NAME_PATTERN.fullmatch(name))
+
+    def _path(self, name: str) -> Path:
+        return self.directory / f"{name}.txt"
+
+    def _version(self, name: str) -> Optional[tuple]:
+        try:
+            st = self._path(name).stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def names(self) -> List[str]:
+        if self.directory is None:
+            return sorted(self._indexes)
+        return sorted(p.stem for p in self.directory.glob("*.txt") if self.valid_name(p.stem))
+
+    def get(self, name: str) -> Optional[FAQIndex]:
+        if self.directory is None:
+            return self._indexes.get(name)
+        if not self.valid_name(name):
+            return None
+        # The stat, the lookup and any reload happen under the lock, so a
+        # concurrent remove() cannot be undone or have its index returned.
+        with self._lock:
+            version = self._version(name)
+            if version is not None and self._versions.get(name) != version:
+                # Registered or replaced by another worker since we last looked.
+                try:
+                    text = self._path(name).read_text(encoding="utf-8")
+                except FileNotFoundError:
+                    version = None
+                else:
+                    self._build(name, text, version)
+            if version is None:
+                self._indexes.pop(name, None)
+                self._versions.pop(name, None)
+                return None
+            return self._indexes[name]
+
+    def register(self, name: str, text: str) -> dict:
+        """Create or update a corpus. Unchanged chunks are not re-indexed.
+
+        Raises ``ValueError`` for an invalid name and ``FAQLimitError`` when
+        the corpus is new and ``max_corpora`` already exist.
+        """
+        if not self.valid_name(name):
+            raise ValueError(f"Invalid FAQ corpus name: {name!r}")
+        with self._lock:
+            if self.max_corpora and name not in self.names():
+                if len(self.names()) >= self.max_corpora:
+                    raise FAQLimitError(f"Too many FAQ corpora (max {self.max_corpora})")
+            version = None
+            if self.directory is not None:
+                path = self._path(name)
+                tmp = path.with_name(f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp.write_text(text, encoding="utf-8")
+                os.replace(tmp, path)
+                version = self._version(name)
+            return self._build(name, text, version)
+
+    def _build(self, name: str, text: str, version: Optional[tuple]) -> dict:
+        index = self._indexes.get(name)
+        if index is None:
+            index = FAQIndex()
+        # Build into a fresh object state, then swap, so readers never see
+        # a half-built index.
+        updated = FAQIndex(index.k1, index.b, index.max_chunk_chars)
+        updated._term_counts = index._term_counts
+        result = updated.update(text)
+        self._indexes[name] = updated
+        self._versions[name] = version
+        return result
+
+    def remove(self, name: str) -> bool:
+        with self._lock:
+            existed = self._indexes.pop(name, None) is not None
+            self._versions.pop(name, None)
+            if self.directory is not None and self.valid_name(name):
+                try:
+                    self._path(name).unlink()
+                    existed = True
+                except FileNotFoundError:
+                    pass
+            return existed
@@ -0,0 +1,51 @@
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Iterable, List, Optional
+
+# Hard cap on stored turns per session (user + assistant messages).
+MAX_HISTORY_MESSAGES = 40
+# Prompt tokens allowed for past turns sent with each request.
+CONTEXT_TOKEN_BUDGET = 2000
+
+# Rough per-message overhead the chat format adds (role, separators).
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken is optional; fall back to a character estimate
+    _encoding = None
+
+
+@lru_cache(maxsize=4096)
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of ``text`` without a network call.
+
+    Uses tiktoken when it is installed, otherwise ~4 characters per token,
+    which is close enough for English text to size a context window.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def new_history(messages: Optional[Iterable[dict]] = None) -> Deque[dict]:
+    """Return a fixed-capacity history ring, reusing ``messages`` if it already is one."""
+    if isinstance(messages, deque) and messages.maxlen == MAX_HISTORY_MESSAGES:
+        return messages
+    return deque(messages or (), maxlen=MAX_HISTORY_MESSAGES)
+
+
+def context_window(history: Iterable[dict], budget: int = CONTEXT_TOKEN_BUDGET) -> List[dict]:
+    """Return the newest messages that fit in ``budget`` tokens, oldest first."""
+    picked: List[dict] = []
+    used = 0
+    for message in reversed(history):
+        cost = estimate_tokens(message["content"]) + _MESSAGE_OVERHEAD_TOKENS
+        if used + cost > budget:
+            break
+        picked.append(message)
+        used += cost
+    picked.reverse()
+    return picked
@@ -0,0 +1,67 @@
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+_FAQ_RULES = (
+    "You are a strict FAQ bot.\n"
+    "You must answer ONLY using the provided FAQ_CONTEXT.\n"
+    "If the answer is not explicitly in FAQ_CONTEXT, reply exactly: \"I don't know.\"\n"
+    "Do not guess. Do not add extra facts.\n"
+    "If the user asks for anything unsafe/illegal, refuse.\n\n"
+    "FAQ_CONTEXT:\n"
+)
+
+# Fixed prompts, built once at import.
+_SYSTEM_PROMPTS: Dict[str, str] = {
+    "strict": (
+        "You are a strict assistant.\n"
+        "Goals: be correct, brief, and useful.\n"
+        "Output rules:\n"
+        "- Use bullet points by default.\n"
+        "- Keep answers under ~8 bullets unless the user explicitly asks for more.\n"
+        "- If you need clarification, ask exactly ONE question, then stop.\n"
+        "- Do not include filler or long preambles.\n"
+        "- If you do not know, say: \"I don't know.\"\n"
+        "- Refuse unsafe or illegal requests politely.\n"
+    ),
+    "assistant": (
+        "You are a helpful assistant.\n"
+        "If you do not know the answer, say \"I don't know.\"\n"
+        "Refuse unsafe or illegal requests politely.\n"
+    ),
+}
+
+# One shared system message per fixed prompt. Reusing the same dict keeps
+# the leading part of every request byte-identical, which is what the
+# provider's prompt caching keys on.
+_SYSTEM_MESSAGES: Dict[str, dict] = {
+    mode: {"role": "system", "content": prompt} for mode, prompt in _SYSTEM_PROMPTS.items()
+}
+
+
+@lru_cache(maxsize=256)
+def _faq_system_message(ctx: str) -> dict:
+    return {"role": "system", "content": f"{_FAQ_RULES}{ctx}\n"}
+
+
+def system_message(mode: str, faq_context: Optional[str]) -> dict:
+    """Return the cached system message for ``mode``. Do not mutate it."""
+    if mode == "faq":
+        return _faq_system_message((faq_context or "").strip())
+    return _SYSTEM_MESSAGES.get(mode, _SYSTEM_MESSAGES["assistant"])
+
+
+def build_messages(
+    mode: str,
+    faq_context: Optional[str],
+    window: Iterable[dict],
+    user_text: str,
+) -> List[dict]:
+    """System message, then the history window, then the new user turn.
+
+    History entries are the dicts already stored in the session, so the only
+    new allocation per request is the list and the user message.
+    """
+    messages = [system_message(mode, faq_context)]
+    messages.extend(window)
+    messages.append({"role": "user", "content": user_text})
+    return messages
@@ -1,22 +1,182 @@
+import asyncio
+import hmac
 import os
+import sys
 import time
 import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Dict, List, Optional, Literal
+from typing import AsyncIterator, Iterable, List, Optional, Literal
 
-from fastapi import FastAPI, HTTPException
+import anyio.to_thread
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 from pydantic import BaseModel
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from admission import AdmissionController, AdmissionRejected, RateLimiter, UpstreamSlot
+from cache import ResponseCache, prompt_fingerprint, replay_chunks
+from coalesce import SingleFlight
+from faq_index import FAQLimitError, FAQRegistry
+from history import context_window, new_history
+from metrics import RATE_BUCKETS, MetricsMiddleware, Registry, monitor_event_loop_lag
+from prompts import build_messages
+from sessions import SessionStore, create_session_store
+from snapshots import SessionSnapshotter
+from streaming import SSE_KEEPALIVE, StreamEvent, coalesce_deltas, sse_event
+from upstream import LatencyTracker, UpstreamPolicy, resilient_call, resilient_stream
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+from llm_gateway import get_gateway  # noqa: E402
+
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+CHAT_MODEL = "gpt-4o-mini"
+
+# --- Upstream client and concurrency limits ---
+# One pooled async client shared by every request, from the shared LLM
+# gateway. Keep-alive connections are reused across chats, and in-flight LLM
+# calls no longer pin a threadpool worker. LLM_BACKEND=fake answers in-process.
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "200"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "50"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+MAX_CONCURRENT_CHATS = int(os.getenv("MAX_CONCURRENT_CHATS", "500"))
+
+# --- Upstream deadlines, hedging and fallback ---
+# Retries are handled in upstream.py against these deadlines, so the SDK's
+# own retry loop is turned off.
+UPSTREAM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT_SECONDS", "5"))
+UPSTREAM_FIRST_TOKEN_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_FIRST_TOKEN_TIMEOUT_SECONDS", "20"))
+UPSTREAM_TOTAL_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_TOTAL_TIMEOUT_SECONDS", "90"))
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "1"))
+UPSTREAM_BACKOFF_SECONDS = float(os.getenv("UPSTREAM_BACKOFF_SECONDS", "0.5"))
+UPSTREAM_BACKOFF_MAX_SECONDS = float(os.getenv("UPSTREAM_BACKOFF_MAX_SECONDS", "8"))
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "0") == "1"
+HEDGE_DELAY_SECONDS = float(os.getenv("HEDGE_DELAY_SECONDS", "2"))
+FALLBACK_MODELS = [m.strip() for m in os.getenv("FALLBACK_MODELS", "").split(",") if m.strip()]
+
+UPSTREAM_MODELS = [CHAT_MODEL] * (1 + UPSTREAM_RETRIES) + FALLBACK_MODELS
+# Streams hedge on time-to-first-token; plain calls on whole-reply latency.
+STREAM_POLICY = UpstreamPolicy(
+    models=UPSTREAM_MODELS,
+    first_token_timeout=UPSTREAM_FIRST_TOKEN_TIMEOUT_SECONDS,
+    total_timeout=UPSTREAM_TOTAL_TIMEOUT_SECONDS,
+    hedge=HEDGE_REQUESTS,
+    hedge_delay=HEDGE_DELAY_SECONDS,
+    backoff_base=UPSTREAM_BACKOFF_SECONDS,
+    backoff_max=UPSTREAM_BACKOFF_MAX_SECONDS,
+    tracker=LatencyTracker(),
+)
+REPLY_POLICY = UpstreamPolicy(
+    models=UPSTREAM_MODELS,
+    first_token_timeout=UPSTREAM_TOTAL_TIMEOUT_SECONDS,
+    total_timeout=UPSTREAM_TOTAL_TIMEOUT_SECONDS,
+    hedge=HEDGE_REQUESTS,
+    hedge_delay=HEDGE_DELAY_SECONDS * 4,
+    backoff_base=UPSTREAM_BACKOFF_SECONDS,
+    backoff_max=UPSTREAM_BACKOFF_MAX_SECONDS,
+    tracker=LatencyTracker(),
+)
+
+LLM = get_gateway(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    max_connections=OPENAI_MAX_CONNECTIONS,
+    max_keepalive=OPENAI_MAX_KEEPALIVE,
+    timeout=OPENAI_TIMEOUT_SECONDS,
+    connect_timeout=UPSTREAM_CONNECT_TIMEOUT_SECONDS,
+    max_retries=0,
+)
+
+
+# --- Metrics ---
+METRICS = Registry()
+HTTP_REQUESTS = METRICS.counter(
+    "chat_http_requests_total", "HTTP requests by endpoint, mode and status",
+    ("endpoint", "mode", "status"),
+)
+HTTP_LATENCY = METRICS.histogram(
+    "chat_http_request_duration_seconds", "Request latency until the last body byte",
+    ("endpoint", "mode"),
+)
+HTTP_IN_FLIGHT = METRICS.gauge("chat_http_requests_in_flight", "HTTP requests being served")
+UPSTREAM_IN_FLIGHT = METRICS.gauge("chat_upstream_in_flight", "OpenAI calls in flight")
+UPSTREAM_LATENCY = METRICS.histogram(
+    "chat_upstream_duration_seconds", "Total OpenAI call time", ("kind",),
+)
+UPSTREAM_TTFT = METRICS.histogram(
+    "chat_upstream_time_to_first_token_seconds", "Time from request to first streamed delta",
+)
+UPSTREAM_ERRORS = METRICS.counter(
+    "chat_upstream_errors_total", "Failed OpenAI attempts by exception type", ("kind", "error"),
+)
+METRICS.counter(
+    "chat_upstream_hedges_fired_total", "Hedge requests sent for slow streams",
+    fn=lambda: STREAM_POLICY.hedges_fired + REPLY_POLICY.hedges_fired,
+)
+METRICS.counter(
+    "chat_upstream_hedges_won_total", "Hedge requests that answered first",
+    fn=lambda: STREAM_POLICY.hedges_won + REPLY_POLICY.hedges_won,
+)
+METRICS.counter(
+    "chat_upstream_fallbacks_total", "Retries on the next attempt or fallback model",
+    fn=lambda: STREAM_POLICY.fallbacks + REPLY_POLICY.fallbacks,
+)
+METRICS.counter(
+    "chat_upstream_backoffs_total", "Waits before retrying after a rate limit",
+    fn=lambda: STREAM_POLICY.backoffs + REPLY_POLICY.backoffs,
+)
+METRICS.counter(
+    "chat_llm_input_tokens_total", "Input tokens billed, from the gateway's usage ledger",
+    fn=lambda: LLM.usage.totals("chatbot").input_tokens,
+)
+METRICS.counter(
+    "chat_llm_output_tokens_total", "Output tokens billed (estimated for streams cut short)",
+    fn=lambda: LLM.usage.totals("chatbot").output_tokens,
+)
+STREAM_TOKEN_RATE = METRICS.histogram(
+    "chat_stream_tokens_per_second", "Output tokens per second after the first token",
+    buckets=RATE_BUCKETS,
+)
+EVENT_LOOP_LAG = METRICS.gauge(
+    "chat_event_loop_lag_seconds", "How late the event loop woke from a 0.5 s sleep",
+)
+METRICS.gauge(
+    "chat_threadpool_busy", "Threadpool workers in use (session I/O, FAQ builds)",
+    fn=lambda: anyio.to_thread.current_default_thread_limiter().borrowed_tokens,
+)
+METRICS.gauge(
+    "chat_threadpool_size", "Threadpool worker limit",
+    fn=lambda: anyio.to_thread.current_default_thread_limiter().total_tokens,
+)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background = [asyncio.create_task(monitor_event_loop_lag(EVENT_LOOP_LAG))]
+    if SNAPSHOTS is not None:
+        background.append(asyncio.create_task(SNAPSHOTS.run()))
+    yield
+    for task in background:
+        task.cancel()
+    # Let a periodic save already in the threadpool finish before the final one.
+    await asyncio.gather(*background, return_exceptions=True)
+    if SNAPSHOTS is not None:
+        await SNAPSHOTS.save()
+    await LLM.aclose()
+    SESSIONS.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    MetricsMiddleware,
+    requests=HTTP_REQUESTS,
+    latency=HTTP_LATENCY,
+    in_flight=HTTP_IN_FLIGHT,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,63 +190,286 @@ MAX_SESSIONS = 1000
 SESSION_TTL_SECONDS = 3600  # 1 hour
 MAX_MESSAGE_LENGTH = 2000
 
+# --- Admission control ---
+# Token buckets per session and per client IP, plus a global cap on upstream
+# calls (MAX_CONCURRENT_CHATS) with a bounded wait queue. Anything over the
+# limits gets a fast 429 with Retry-After instead of piling onto OpenAI.
+RATE_LIMIT_SESSION_PER_MINUTE = float(os.getenv("RATE_LIMIT_SESSION_PER_MINUTE", "20"))
+RATE_LIMIT_SESSION_BURST = int(os.getenv("RATE_LIMIT_SESSION_BURST", "5"))
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "60"))
+RATE_LIMIT_IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", "20"))
+MAX_QUEUED_CHATS = int(os.getenv("MAX_QUEUED_CHATS", "200"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("QUEUE_TIMEOUT_SECONDS", "10"))
+
+SESSION_LIMITER = RateLimiter(RATE_LIMIT_SESSION_PER_MINUTE, RATE_LIMIT_SESSION_BURST)
+IP_LIMITER = RateLimiter(RATE_LIMIT_IP_PER_MINUTE, RATE_LIMIT_IP_BURST)
+ADMISSION = AdmissionController(MAX_CONCURRENT_CHATS, MAX_QUEUED_CHATS, QUEUE_TIMEOUT_SECONDS)
+
+METRICS.gauge("chat_upstream_queue_waiting", "Requests waiting for an upstream slot", fn=lambda: ADMISSION.waiting)
+METRICS.counter("chat_rejected_queue_full_total", "429s because the wait queue was full", fn=lambda: ADMISSION.rejected_full)
+METRICS.counter("chat_rejected_queue_timeout_total", "429s after waiting past the deadline", fn=lambda: ADMISSION.rejected_timeout)
+METRICS.counter(
+    "chat_rejected_rate_limit_total", "429s from per-session and per-IP buckets",
+    fn=lambda: SESSION_LIMITER.rejected + IP_LIMITER.rejected,
+)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _check_rate_limits(request: Request, session_id: Optional[str]) -> None:
+    ip = request.client.host if request.client else "unknown"
+    wait = IP_LIMITER.check(ip)
+    if not wait and session_id:
+        wait = SESSION_LIMITER.check(session_id)
+    if wait:
+        raise AdmissionRejected("Rate limit exceeded", wait)
+
+# memory (default, single worker), sqlite (shared by workers on one host)
+# or redis (shared across hosts)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
 # session_id -> {"messages": [...], "last_used": float}
-SESSIONS: Dict[str, dict] = {}
-
-
-def _cleanup_sessions() -> None:
-    """Evict expired sessions. If still at capacity, evict the oldest."""
-    now = time.time()
-    expired = [
-        sid for sid, s in SESSIONS.items()
-        if now - s["last_used"] > SESSION_TTL_SECONDS
-    ]
-    for sid in expired:
-        del SESSIONS[sid]
-
-    if len(SESSIONS) >= MAX_SESSIONS:
-        oldest = min(SESSIONS, key=lambda sid: SESSIONS[sid]["last_used"])
-        del SESSIONS[oldest]
-
-
-def build_system_prompt(mode: str, faq_context: Optional[str]) -> str:
-    if mode == "faq":
-        ctx = (faq_context or "").strip()
-        return (
-            "You are a strict FAQ bot.\n"
-            "You must answer ONLY using the provided FAQ_CONTEXT.\n"
-            "If the answer is not explicitly in FAQ_CONTEXT, reply exactly: \"I don't know.\"\n"
-            "Do not guess. Do not add extra facts.\n"
-            "If the user asks for anything unsafe/illegal, refuse.\n\n"
-            f"FAQ_CONTEXT:\n{ctx}\n"
-        )
+SESSIONS = create_session_store(
+    SESSION_BACKEND,
+    MAX_SESSIONS,
+    SESSION_TTL_SECONDS,
+    sqlite_path=SESSION_DB_PATH,
+    redis_url=REDIS_URL,
+)
 
-    if mode == "strict":
-        return (
-            "You are a strict assistant.\n"
-            "Goals: be correct, brief, and useful.\n"
-            "Output rules:\n"
-            "- Use bullet points by default.\n"
-            "- Keep answers under ~8 bullets unless the user explicitly asks for more.\n"
-            "- If you need clarification, ask exactly ONE question, then stop.\n"
-            "- Do not include filler or long preambles.\n"
-            "- If you do not know, say: \"I don't know.\"\n"
-            "- Refuse unsafe or illegal requests politely.\n"
-        )
+# Warm restart for the in-memory store: snapshot every SESSION_SNAPSHOT_SECONDS
+# and reload on startup. The SQLite and Redis backends are already durable.
+SESSION_SNAPSHOT_PATH = os.getenv("SESSION_SNAPSHOT_PATH", "sessions.snapshot.jsonl.gz")
+SESSION_SNAPSHOT_SECONDS = float(os.getenv("SESSION_SNAPSHOT_SECONDS", "30"))
+
+SNAPSHOTS = (
+    SessionSnapshotter(SESSIONS, SESSION_SNAPSHOT_PATH, SESSION_SNAPSHOT_SECONDS)
+    if isinstance(SESSIONS, SessionStore) and SESSION_SNAPSHOT_PATH
+    else None
+)
 
-    # default assistant
-    return (
-        "You are a helpful assistant.\n"
-        "If you do not know the answer, say \"I don't know.\"\n"
-        "Refuse unsafe or illegal requests politely.\n"
+METRICS.gauge("chat_sessions", "Live sessions in the store", fn=lambda: len(SESSIONS))
+METRICS.counter("chat_session_evictions_total", "Sessions evicted for capacity", fn=lambda: SESSIONS.evictions)
+METRICS.counter("chat_session_expirations_total", "Sessions dropped after TTL", fn=lambda: SESSIONS.expirations)
+if SNAPSHOTS is not None:
+    METRICS.gauge(
+        "chat_session_snapshot_seconds", "Time spent writing the last snapshot",
+        fn=lambda: SNAPSHOTS.last_duration,
     )
 
 
+async def _load_session(session_id: str) -> Optional[dict]:
+    if SESSIONS.blocking:
+        return await run_in_threadpool(SESSIONS.get, session_id)
+    return SESSIONS.get(session_id)
+
+
+async def _save_session(session_id: str, messages: Iterable[dict]) -> None:
+    if SESSIONS.blocking:
+        await run_in_threadpool(SESSIONS.put, session_id, messages)
+    else:
+        SESSIONS.put(session_id, messages)
+
+
+# --- Response cache (opt-in) ---
+# Only modes whose answer is fully determined by the prompt are cached.
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "0") == "1"
+RESPONSE_CACHE_MODES = set(os.getenv("RESPONSE_CACHE_MODES", "faq,strict").split(","))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_NORMALIZE = os.getenv("RESPONSE_CACHE_NORMALIZE", "1") == "1"
+
+RESPONSE_CACHE = ResponseCache(
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL_SECONDS,
+    normalize=RESPONSE_CACHE_NORMALIZE,
+)
+
+METRICS.gauge("chat_response_cache_entries", "Entries in the response cache", fn=lambda: len(RESPONSE_CACHE))
+METRICS.counter("chat_response_cache_hits_total", "Response cache hits", fn=lambda: RESPONSE_CACHE.hits)
+METRICS.counter("chat_response_cache_misses_total", "Response cache misses", fn=lambda: RESPONSE_CACHE.misses)
+METRICS.counter("chat_response_cache_evictions_total", "Response cache evictions", fn=lambda: RESPONSE_CACHE.evictions)
+
+
+def _cache_key(mode: str, messages: List[dict]) -> Optional[str]:
+    """Return the cache key for this prompt, or None if it should not be cached."""
+    if not RESPONSE_CACHE_ENABLED or mode not in RESPONSE_CACHE_MODES:
+        return None
+    return RESPONSE_CACHE.key_for(messages, CHAT_MODEL)
+
+
+# --- Server-side FAQ corpora ---
+FAQ_TOP_K = int(os.getenv("FAQ_TOP_K", "4"))
+FAQ_MAX_CORPUS_CHARS = int(os.getenv("FAQ_MAX_CORPUS_CHARS", "500000"))
+FAQ_MAX_CORPORA = int(os.getenv("FAQ_MAX_CORPORA", "50"))
+# Corpus text is stored here so every worker (and the next process) sees the
+# same corpora; empty keeps them in process memory. Put it on shared storage
+# when workers run on more than one host.
+FAQ_DIR = os.getenv("FAQ_DIR", "faq_corpora")
+# PUT/DELETE /faq require this in the X-Admin-Key header; unset disables them.
+FAQ_ADMIN_KEY = os.getenv("FAQ_ADMIN_KEY", "")
+
+FAQS = FAQRegistry(FAQ_DIR or None, FAQ_MAX_CORPORA)
+
+
+def _require_faq_admin(request: Request) -> None:
+    if not FAQ_ADMIN_KEY:
+        raise HTTPException(status_code=403, detail="FAQ uploads are disabled (FAQ_ADMIN_KEY is not set)")
+    supplied = request.headers.get("x-admin-key", "")
+    if not hmac.compare_digest(supplied.encode(), FAQ_ADMIN_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
+
+def _search_faq(name: str, user_text: str) -> Optional[str]:
+    index = FAQS.get(name)
+    if index is None:
+        return None
+    return "\n\n".join(index.search(user_text, FAQ_TOP_K))
+
+
+async def _resolve_faq_context(req: "ChatRequest", user_text: str) -> Optional[str]:
+    """Return the FAQ context for this request.
+
+    A registered corpus contributes only its top-k chunks for the question;
+    otherwise the inline ``faq_context`` is used as before. The lookup runs in
+    the threadpool since it may rebuild an index another worker updated.
+    """
+    if req.faq_corpus:
+        context = await run_in_threadpool(_search_faq, req.faq_corpus, user_text)
+        if context is None:
+            raise HTTPException(status_code=404, detail=f"Unknown FAQ corpus: {req.faq_corpus}")
+        return context
+    return req.faq_context
+
+
+# --- In-flight request coalescing ---
+# Identical prompts already in flight share one upstream call.
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "1") == "1"
+
+INFLIGHT = SingleFlight()
+METRICS.counter("chat_coalesced_leaders_total", "Upstream calls started by the coalescer", fn=lambda: INFLIGHT.leaders)
+METRICS.counter("chat_coalesced_followers_total", "Requests that joined an in-flight call", fn=lambda: INFLIGHT.followers)
+
+
+async def _admit_upstream(fingerprint: str) -> Optional[UpstreamSlot]:
+    """Reserve upstream capacity, or None if the call will join one in flight."""
+    if COALESCE_REQUESTS and INFLIGHT.in_flight(fingerprint):
+        return None
+    return await ADMISSION.acquire()
+
+
+async def _model_reply(messages: List[dict], model: str):
+    try:
+        return await LLM.acreate("chatbot", api="responses", model=model, input=messages)
+    except Exception as e:
+        UPSTREAM_ERRORS.inc(kind="chat", error=type(e).__name__)
+        raise
+
+
+async def _upstream_reply(messages: List[dict], slot: Optional[UpstreamSlot]) -> str:
+    async with slot or await ADMISSION.acquire():
+        UPSTREAM_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            response = await resilient_call(REPLY_POLICY, lambda model: _model_reply(messages, model))
+        finally:
+            UPSTREAM_IN_FLIGHT.dec()
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, kind="chat")
+    return response.output_text or "I don't know."
+
+
+def _finish_metadata(response) -> dict:
+    """finish_reason and usage from a completed Responses API object."""
+    usage = getattr(response, "usage", None)
+    details = getattr(response, "incomplete_details", None)
+    return {
+        "finish_reason": getattr(details, "reason", None) or "stop",
+        "usage": usage.model_dump() if hasattr(usage, "model_dump") else usage,
+    }
+
+
+async def _model_events(messages: List[dict], model: str) -> AsyncIterator[StreamEvent]:
+    """One streaming attempt against ``model``, as (kind, payload) events."""
+    events = LLM.astream("chatbot", api="responses", model=model, input=messages)
+    try:
+        async for event in events:
+            kind = getattr(event, "type", None)
+            if kind == "response.output_text.delta":
+                yield "delta", event.delta
+            elif kind in ("response.completed", "response.incomplete"):
+                yield "done", _finish_metadata(event.response)
+    except Exception as e:
+        UPSTREAM_ERRORS.inc(kind="stream", error=type(e).__name__)
+        raise
+    finally:
+        # Closing the stream drops the upstream connection, which stops
+        # generation if the client went away or the attempt lost a hedge.
+        await events.aclose()
+
+
+async def _upstream_events(messages: List[dict], slot: Optional[UpstreamSlot]) -> AsyncIterator[StreamEvent]:
+    async with slot or await ADMISSION.acquire():
+        UPSTREAM_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        first_token_at: Optional[float] = None
+        output_tokens: Optional[int] = None
+        streamed_chars = 0
+        events = resilient_stream(STREAM_POLICY, lambda model: _model_events(messages, model))
+        try:
+            async for kind, payload in events:
+                if kind == "delta":
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        UPSTREAM_TTFT.observe(first_token_at - start)
+                    streamed_chars += len(payload)
+                elif kind == "done":
+                    output_tokens = (payload["usage"] or {}).get("output_tokens")
+                yield kind, payload
+        finally:
+            await events.aclose()
+            UPSTREAM_IN_FLIGHT.dec()
+
+        end = time.perf_counter()
+        UPSTREAM_LATENCY.observe(end - start, kind="stream")
+        if first_token_at is not None and end > first_token_at:
+            if output_tokens is None:
+                output_tokens = streamed_chars / 4  # same estimate as history.py
+            STREAM_TOKEN_RATE.observe(output_tokens / (end - first_token_at))
+
+
+async def _replay_events(reply: str) -> AsyncIterator[StreamEvent]:
+    for chunk in replay_chunks(reply):
+        yield "delta", chunk
+    yield "done", {"finish_reason": "stop", "usage": None, "cached": True}
+
+
+# --- Streaming ---
+# Deltas are batched into one write per STREAM_FLUSH_CHARS or
+# STREAM_FLUSH_SECONDS, whichever comes first.
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "64"))
+STREAM_FLUSH_SECONDS = float(os.getenv("STREAM_FLUSH_SECONDS", "0.05"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
     mode: Literal["assistant", "faq", "strict"] = "assistant"
     faq_context: Optional[str] = None
+    faq_corpus: Optional[str] = None
+
+
+class FAQCorpusRequest(BaseModel):
+    text: str
 
 
 class ChatResponse(BaseModel):
@@ -101,11 +484,50 @@ def index():
 
 @app.get("/health")
 def health():
+    return {"ok": True, "sessions": len(SESSIONS), "upstream_in_flight": UPSTREAM_IN_FLIGHT.get()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/faq")
+def list_faq_corpora():
+    corpora = [(n, FAQS.get(n)) for n in FAQS.names()]
+    return {"corpora": [{"name": n, "chunks": len(index)} for n, index in corpora if index is not None]}
+
+
+@app.put("/faq/{name}")
+async def register_faq_corpus(name: str, body: FAQCorpusRequest, request: Request):
+    _require_faq_admin(request)
+    if not FAQRegistry.valid_name(name):
+        raise HTTPException(status_code=400, detail="FAQ corpus names may use letters, digits, '-' and '_' (max 64)")
+    if not body.text.strip():
+        raise HTTPException(status_code=400, detail="Empty FAQ corpus")
+    if len(body.text) > FAQ_MAX_CORPUS_CHARS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"FAQ corpus too long (max {FAQ_MAX_CORPUS_CHARS} characters)",
+        )
+    try:
+        result = await run_in_threadpool(FAQS.register, name, body.text)
+    except FAQLimitError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return {"name": name, **result}
+
+
+@app.delete("/faq/{name}")
+def delete_faq_corpus(name: str, request: Request):
+    _require_faq_admin(request)
+    if not FAQS.remove(name):
+        raise HTTPException(status_code=404, detail=f"Unknown FAQ corpus: {name}")
     return {"ok": True}
 
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest, request: Request):
+    request.scope["metrics.mode"] = req.mode
     user_text = (req.message or "").strip()
     if not user_text:
         raise HTTPException(status_code=400, detail="Empty message")
@@ -114,43 +536,98 @@ def chat(req: ChatRequest):
             status_code=400,
             detail=f"Message too long (max {MAX_MESSAGE_LENGTH} characters)",
         )
+    _check_rate_limits(request, req.session_id)
+
+    faq_context = await _resolve_faq_context(req, user_text) if req.mode == "faq" else None
 
     # In FAQ mode, require some context (otherwise every answer should be "I don't know.")
-    if req.mode == "faq" and not (req.faq_context or "").strip():
+    if req.mode == "faq" and not (faq_context or "").strip():
         return ChatResponse(
             session_id=req.session_id or str(uuid.uuid4()),
             reply="I don't know."
         )
 
-    _cleanup_sessions()
-
     session_id = req.session_id or str(uuid.uuid4())
-    session = SESSIONS.get(session_id, {"messages": [], "last_used": 0})
-    history = session["messages"]
-
-    system_prompt = build_system_prompt(req.mode, req.faq_context)
-
-    messages = [{"role": "system", "content": system_prompt}]
-    messages.extend(history[-10:])
-    messages.append({"role": "user", "content": user_text})
-
-    response = client.responses.create(
-        model="gpt-4o-mini",
-        input=messages
-    )
-
-    reply = response.output_text or "I don't know."
+    session = await _load_session(session_id)
+    history = new_history(session["messages"] if session else None)
+
+    messages = build_messages(req.mode, faq_context, context_window(history), user_text)
+
+    cache_key = _cache_key(req.mode, messages)
+    reply = RESPONSE_CACHE.get(cache_key) if cache_key else None
+
+    if reply is None:
+        if COALESCE_REQUESTS:
+            # The shared call takes its own upstream slot, so requests that
+            # join it never wait for or hold one. The flight is registered
+            # before that wait, so identical requests arriving meanwhile join.
+            reply = await INFLIGHT.do(
+                prompt_fingerprint(messages, CHAT_MODEL),
+                lambda: _upstream_reply(messages, None),
+            )
+        else:
+            reply = await _upstream_reply(messages, None)
+        if cache_key:
+            RESPONSE_CACHE.put(cache_key, reply)
 
     # Save memory (per session)
     history.append({"role": "user", "content": user_text})
     history.append({"role": "assistant", "content": reply})
-    SESSIONS[session_id] = {"messages": history, "last_used": time.time()}
+    await _save_session(session_id, history)
 
     return ChatResponse(session_id=session_id, reply=reply)
 
 
+def _plain_stream(events: AsyncIterator[StreamEvent], on_complete) -> AsyncIterator[str]:
+    async def body():
+        parts: List[str] = []
+        yield ""  # kick-start streaming for some clients
+        async for kind, payload in events:
+            if kind == "delta":
+                parts.append(payload)
+                yield payload
+        await on_complete("".join(parts))
+
+    return body()
+
+
+def _sse_stream(
+    events: AsyncIterator[StreamEvent],
+    session_id: str,
+    request: Request,
+    on_complete,
+) -> AsyncIterator[str]:
+    async def body():
+        parts: List[str] = []
+        yield sse_event("session", {"session_id": session_id})
+        try:
+            async for kind, payload in events:
+                if kind == "delta":
+                    parts.append(payload)
+                    yield sse_event("delta", {"text": payload})
+                elif kind == "done":
+                    yield sse_event("done", payload)
+                elif kind == "keepalive":
+                    if await request.is_disconnected():
+                        return
+                    yield SSE_KEEPALIVE
+        except Exception as e:
+            yield sse_event("error", {"detail": type(e).__name__})
+            return
+        await on_complete("".join(parts))
+
+    return body()
+
+
 @app.post("/chat-stream")
-def chat_stream(req: ChatRequest):
+async def chat_stream(req: ChatRequest, request: Request, format: Optional[str] = None):
+    """Stream a reply as plain text, or as Server-Sent Events when the client
+    sends ``Accept: text/event-stream`` or ``?format=sse``.
+
+    SSE mode emits ``session``, ``delta``, ``done`` (finish_reason and usage)
+    and ``error`` events, plus keep-alive comments while the model is idle.
+    """
+    request.scope["metrics.mode"] = req.mode
     user_text = (req.message or "").strip()
     if not user_text:
         raise HTTPException(status_code=400, detail="Empty message")
@@ -159,55 +636,70 @@ def chat_stream(req: ChatRequest):
             status_code=400,
             detail=f"Message too long (max {MAX_MESSAGE_LENGTH} characters)",
         )
+    _check_rate_limits(request, req.session_id)
 
-    # In FAQ mode, require some context (otherwise every answer should be "I don't know.")
-    if req.mode == "faq" and not (req.faq_context or "").strip():
-        def immediate():
-            yield "I don't know."
-        return StreamingResponse(immediate(), media_type="text/plain")
+    use_sse = format == "sse" or "text/event-stream" in request.headers.get("accept", "")
+    session_id = req.session_id or str(uuid.uuid4())
+    headers = {"X-Session-ID": session_id}
 
-    _cleanup_sessions()
+    faq_context = await _resolve_faq_context(req, user_text) if req.mode == "faq" else None
 
-    session_id = req.session_id or str(uuid.uuid4())
-    session = SESSIONS.get(session_id, {"messages": [], "last_used": 0})
-    history = session["messages"]
+    # In FAQ mode, require some context (otherwise every answer should be "I don't know.")
+    if req.mode == "faq" and not (faq_context or "").strip():
+        async def nothing(reply: str) -> None:
+            pass
 
-    system_prompt = build_system_prompt(req.mode, req.faq_context)
+        events = _replay_events("I don't know.")
+        if use_sse:
+            body = _sse_stream(events, session_id, request, nothing)
+            return StreamingResponse(body, media_type="text/event-stream", headers=headers)
+        return StreamingResponse(_plain_stream(events, nothing), media_type="text/plain", headers=headers)
 
-    messages = [{"role": "system", "content": system_prompt}]
-    messages.extend(history[-10:])
-    messages.append({"role": "user", "content": user_text})
+    session = await _load_session(session_id)
+    history = new_history(session["messages"] if session else None)
 
-    def event_generator():
-        full_reply = ""
-        yield ""  # kick-start streaming for some clients
+    messages = build_messages(req.mode, faq_context, context_window(history), user_text)
 
-        response_stream = client.responses.create(
-            model="gpt-4o-mini",
-            input=messages,
-            stream=True,
-        )
+    cache_key = _cache_key(req.mode, messages)
+    cached_reply = RESPONSE_CACHE.get(cache_key) if cache_key else None
 
-        def handle_events(stream):
-            nonlocal full_reply
-            for event in stream:
-                if getattr(event, "type", None) == "response.output_text.delta":
-                    chunk = event.delta
-                    full_reply += chunk
-                    yield chunk
-
-        # Some SDK versions return a context manager (ResponseStreamManager)
-        if hasattr(response_stream, "__enter__"):
-            with response_stream as stream:
-                for chunk in handle_events(stream):
-                    yield chunk
-        else:
-            for chunk in handle_events(response_stream):
-                yield chunk
+    async def on_complete(reply: str) -> None:
+        if cache_key and reply and cached_reply is None:
+            RESPONSE_CACHE.put(cache_key, reply)
 
         # Save memory at the end
         history.append({"role": "user", "content": user_text})
-        history.append({"role": "assistant", "content": full_reply})
-        SESSIONS[session_id] = {"messages": history, "last_used": time.time()}
+        history.append({"role": "assistant", "content": reply})
+        await _save_session(session_id, history)
+
+    if cached_reply is not None:
+        events = _replay_events(cached_reply)
+    else:
+        fingerprint = prompt_fingerprint(messages, CHAT_MODEL)
+        slot = await _admit_upstream(fingerprint)
+        if COALESCE_REQUESTS:
+            events = INFLIGHT.stream(
+                fingerprint,
+                lambda: _upstream_events(messages, slot and slot.claim()),
+            )
+            # Joined someone else's stream after all; hand the slot back.
+            if slot is not None and not slot.claimed:
+                slot.release()
+        else:
+            events = _upstream_events(messages, slot)
 
-    return StreamingResponse(event_generator(), media_type="text/plain")
+    events = coalesce_deltas(
+        events,
+        STREAM_FLUSH_CHARS,
+        STREAM_FLUSH_SECONDS,
+        keepalive=SSE_KEEPALIVE_SECONDS if use_sse else None,
+    )
+
+    if use_sse:
+        body = _sse_stream(events, session_id, request, on_complete)
+        return StreamingResponse(
+            body,
+            media_type="text/event-stream",
+            headers={**headers, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    return StreamingResponse(_plain_stream(events, on_complete), media_type="text/plain", headers=headers)
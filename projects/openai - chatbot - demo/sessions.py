@@ -0,0 +1,419 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+
+class SessionBackend:
+    """Interface shared by every session store.
+
+    Sessions have the shape ``{"messages": [...], "last_used": float}``.
+    Backends own their TTL and capacity rules; callers only get, put and
+    delete. ``blocking`` tells async callers whether calls may do I/O and
+    should be pushed off the event loop.
+    """
+
+    blocking = False
+
+    def __init__(self, max_sessions: int, ttl_seconds: float):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def _expired(self, session: dict, now: float) -> bool:
+        return now - session["last_used"] > self.ttl_seconds
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """Return the session, or None if it is missing or expired."""
+        raise NotImplementedError
+
+    def put(self, session_id: str, messages: List[dict]) -> None:
+        """Store a session's messages and mark it as just used."""
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Write out any buffered changes. No-op for unbuffered stores."""
+
+    def close(self) -> None:
+        self.flush()
+
+
+class SessionStore(SessionBackend):
+    """In-memory session store with LRU capacity and TTL expiry.
+
+    Sessions are kept in an OrderedDict in least-recently-used order. Every
+    write stamps ``last_used`` and moves the entry to the end, so the front
+    of the dict is always the oldest session. That keeps get, put and evict
+    amortized O(1): expired entries are dropped lazily from the front
+    instead of scanning the whole store.
+
+    Sessions restored from a snapshot wait in a separate "warm" dict and are
+    promoted into the LRU the first time they are read, so a restart does not
+    have to rebuild the LRU order up front. Warm entries count towards
+    ``max_sessions`` and, being older than anything used since the restart,
+    are evicted first, oldest first.
+    """
+
+    def __init__(self, max_sessions: int, ttl_seconds: float):
+        super().__init__(max_sessions, ttl_seconds)
+        self.version = 0  # bumped on every write; lets snapshots skip idle periods
+        self._data: "OrderedDict[str, dict]" = OrderedDict()
+        self._warm: "OrderedDict[str, dict]" = OrderedDict()  # oldest first
+        self._warm_until = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data) + len(self._warm)
+
+    def _prune(self, now: float) -> None:
+        # Oldest entries sit at the front; stop at the first live one.
+        while self._data:
+            sid, session = next(iter(self._data.items()))
+            if not self._expired(session, now):
+                break
+            del self._data[sid]
+            self.expirations += 1
+        if self._warm and now > self._warm_until:
+            self.expirations += len(self._warm)
+            self._warm.clear()
+
+    def _insert(self, session_id: str, messages, now: float) -> None:
+        self._prune(now)
+        self._warm.pop(session_id, None)
+        if session_id in self._data:
+            self._data.move_to_end(session_id)
+        else:
+            while self._data or self._warm:
+                if len(self._data) + len(self._warm) < self.max_sessions:
+                    break
+                (self._warm or self._data).popitem(last=False)
+                self.evictions += 1
+        self._data[session_id] = {"messages": messages, "last_used": now}
+        self.version += 1
+
+    def get(self, session_id: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            session = self._data.get(session_id)
+            if session is None:
+                warm = self._warm.pop(session_id, None)
+                if warm is None or self._expired(warm, now):
+                    return None
+                # First use since restart counts as a write.
+                self._insert(session_id, warm["messages"], now)
+                return self._data[session_id]
+            if self._expired(session, now):
+                del self._data[session_id]
+                self.expirations += 1
+                return None
+            return session
+
+    def put(self, session_id: str, messages: List[dict]) -> None:
+        now = time.time()
+        with self._lock:
+            self._insert(session_id, messages, now)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._data.pop(session_id, None)
+            self._warm.pop(session_id, None)
+            self.version += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._warm.clear()
+            self.version += 1
+
+    def snapshot(self) -> List[tuple]:
+        """Copy of every live session as ``(id, last_used, messages)`` tuples.
+
+        Only the copy happens under the lock; callers serialize it afterwards.
+        """
+        now = time.time()
+        with self._lock:
+            entries = [
+                (sid, s["last_used"], list(s["messages"]))
+                for sid, s in self._warm.items()
+                if not self._expired(s, now)
+            ]
+            entries.extend(
+                (sid, s["last_used"], list(s["messages"])) for sid, s in self._data.items()
+            )
+        return entries
+
+    def load_warm(self, entries: Iterable[tuple]) -> int:
+        """Stage snapshot entries for lazy promotion. Returns how many were kept."""
+        now = time.time()
+        warm = {
+            sid: {"messages": messages, "last_used": last_used}
+            for sid, last_used, messages in entries
+            if now - last_used <= self.ttl_seconds
+        }
+        ordered = sorted(warm.items(), key=lambda kv: kv[1]["last_used"])
+        with self._lock:
+            ordered = [kv for kv in ordered if kv[0] not in self._data]
+            room = max(self.max_sessions - len(self._data), 0)
+            self._warm = OrderedDict(ordered[max(len(ordered) - room, 0):] if room else [])
+            self._warm_until = max((s["last_used"] for s in self._warm.values()), default=0.0) + self.ttl_seconds
+            return len(self._warm)
+
+
+class _BatchedSessionBackend(SessionBackend):
+    """Base for shared stores that buffer writes and flush them in batches.
+
+    Puts land in a pending dict (later writes to the same session replace
+    earlier ones) and are written out when the batch fills up or when the
+    background flusher wakes, whichever comes first. Reads check the pending
+    buffer before the shared store so a worker always sees its own writes.
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        max_sessions: int,
+        ttl_seconds: float,
+        batch_size: int = 64,
+        flush_interval: float = 0.2,
+    ):
+        super().__init__(max_sessions, ttl_seconds)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, dict] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name=f"{type(self).__name__}-flusher", daemon=True
+        )
+        self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:  # keep flushing on transient store errors
+                pass
+
+    def get(self, session_id: str) -> Optional[dict]:
+        now = time.time()
+        with self._pending_lock:
+            session = self._pending.get(session_id)
+        if session is None:
+            session = self._read(session_id)
+        if session is None or self._expired(session, now):
+            return None
+        return session
+
+    def put(self, session_id: str, messages: List[dict]) -> None:
+        with self._pending_lock:
+            self._pending[session_id] = {"messages": messages, "last_used": time.time()}
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def delete(self, session_id: str) -> None:
+        with self._pending_lock:
+            self._pending.pop(session_id, None)
+        self._delete(session_id)
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, {}
+            if batch:
+                self._write_batch(batch)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._flusher.join(timeout=self.flush_interval * 2)
+        self.flush()
+
+    # Storage hooks implemented by each backend
+    def _read(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def _write_batch(self, batch: Dict[str, dict]) -> None:
+        raise NotImplementedError
+
+    def _delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+
+class SQLiteSessionStore(_BatchedSessionBackend):
+    """Session store in a SQLite file in WAL mode.
+
+    Every uvicorn worker on the same host can open the same file, so a
+    follow-up message lands on the same history whichever worker serves it.
+    Expired rows and rows over capacity are swept after each batch write.
+    """
+
+    def __init__(self, path: str, max_sessions: int, ttl_seconds: float, **kwargs):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db_lock = threading.Lock()
+        with self._db_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY,"
+                " messages TEXT NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions(last_used)"
+            )
+        super().__init__(max_sessions, ttl_seconds, **kwargs)
+
+    def __len__(self) -> int:
+        with self._db_lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        return count
+
+    def _read(self, session_id: str) -> Optional[dict]:
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT messages, last_used FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"messages": json.loads(row[0]), "last_used": row[1]}
+
+    def _write_batch(self, batch: Dict[str, dict]) -> None:
+        rows = [
+            (sid, json.dumps(list(s["messages"])), s["last_used"])
+            for sid, s in batch.items()
+        ]
+        cutoff = time.time() - self.ttl_seconds
+        with self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO sessions (id, messages, last_used) VALUES (?, ?, ?)"
+                    " ON CONFLICT(id) DO UPDATE SET"
+                    " messages = excluded.messages, last_used = excluded.last_used",
+                    rows,
+                )
+                cur = self._conn.execute("DELETE FROM sessions WHERE last_used < ?", (cutoff,))
+                self.expirations += max(cur.rowcount, 0)
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+                over = count - self.max_sessions
+                if over > 0:
+                    self._conn.execute(
+                        "DELETE FROM sessions WHERE id IN"
+                        " (SELECT id FROM sessions ORDER BY last_used LIMIT ?)",
+                        (over,),
+                    )
+                    self.evictions += over
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _delete(self, session_id: str) -> None:
+        with self._db_lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def close(self) -> None:
+        super().close()
+        with self._db_lock:
+            self._conn.close()
+
+
+class RedisSessionStore(_BatchedSessionBackend):
+    """Session store on any server speaking the Redis protocol.
+
+    Each session is a JSON string with a native expiry, so TTL is enforced by
+    the server. A sorted set keyed by ``last_used`` tracks recency for the
+    capacity limit. Batches go out as a single pipelined round trip.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_sessions: int,
+        ttl_seconds: float,
+        prefix: str = "chat:session:",
+        **kwargs,
+    ):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "SESSION_BACKEND=redis needs the 'redis' package (pip install redis)"
+            ) from e
+        self.prefix = prefix
+        self._index = f"{prefix}lru"
+        self._redis = redis.Redis.from_url(url)
+        super().__init__(max_sessions, ttl_seconds, **kwargs)
+
+    def __len__(self) -> int:
+        return int(self._redis.zcard(self._index))
+
+    def _read(self, session_id: str) -> Optional[dict]:
+        raw = self._redis.get(self.prefix + session_id)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    def _write_batch(self, batch: Dict[str, dict]) -> None:
+        ttl = max(int(self.ttl_seconds), 1)
+        pipe = self._redis.pipeline(transaction=False)
+        for sid, s in batch.items():
+            payload = {"messages": list(s["messages"]), "last_used": s["last_used"]}
+            pipe.set(self.prefix + sid, json.dumps(payload), ex=ttl)
+        pipe.zadd(self._index, {sid: s["last_used"] for sid, s in batch.items()})
+        pipe.zremrangebyscore(self._index, "-inf", time.time() - self.ttl_seconds)
+        pipe.zcard(self._index)
+        *_, expired, count = pipe.execute()
+        self.expirations += int(expired)
+
+        over = int(count) - self.max_sessions
+        if over > 0:
+            oldest = self._redis.zpopmin(self._index, over)
+            if oldest:
+                self._redis.delete(*[self.prefix + sid.decode() for sid, _ in oldest])
+                self.evictions += len(oldest)
+
+    def _delete(self, session_id: str) -> None:
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.delete(self.prefix + session_id)
+        pipe.zrem(self._index, session_id)
+        pipe.execute()
+
+    def close(self) -> None:
+        super().close()
+        self._redis.close()
+
+
+def create_session_store(
+    backend: str,
+    max_sessions: int,
+    ttl_seconds: float,
+    sqlite_path: str = "sessions.db",
+    redis_url: str = "redis://localhost:6379/0",
+) -> SessionBackend:
+    """Build the session store named by ``backend`` (memory, sqlite or redis)."""
+    backend = (backend or "memory").lower()
+    if backend == "memory":
+        return SessionStore(max_sessions, ttl_seconds)
+    if backend == "sqlite":
+        return SQLiteSessionStore(sqlite_path, max_sessions, ttl_seconds)
+    if backend == "redis":
+        return RedisSessionStore(redis_url, max_sessions, ttl_seconds)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend!r}")
@@ -0,0 +1,92 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+def write_snapshot(path: Path, entries: Iterable[tuple]) -> int:
+    """Write sessions as gzip-compressed JSON lines, replacing ``path`` atomically.
+
+    Each line is ``{"id": ..., "t": last_used, "m": messages}``. The file is
+    written next to the target and renamed into place, so a crash mid-write
+    leaves the previous snapshot intact.
+    """
+    tmp = path.with_name(path.name + ".tmp")
+    count = 0
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=5) as f:
+        for sid, last_used, messages in entries:
+            f.write(json.dumps({"id": sid, "t": last_used, "m": messages}, separators=(",", ":")))
+            f.write("\n")
+            count += 1
+    os.replace(tmp, path)
+    return count
+
+
+def read_snapshot(path: Path) -> Iterator[tuple]:
+    """Yield ``(id, last_used, messages)`` from a snapshot, skipping bad lines."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+                yield row["id"], float(row["t"]), row["m"]
+            except (ValueError, KeyError, TypeError):
+                continue
+
+
+class SessionSnapshotter:
+    """Periodically snapshots an in-memory SessionStore and restores it on start.
+
+    Restoring and writing both run in the threadpool: the event loop only
+    pays for the brief in-memory copy taken by ``store.snapshot()``. Startup
+    does not wait for the restore; restored sessions are staged in the
+    store's warm set and promoted on first use, and expired ones are skipped.
+    """
+
+    def __init__(self, store, path: str, interval: float):
+        self.store = store
+        self.path = Path(path)
+        self.interval = interval
+        self.last_written_version = -1
+        self.last_duration = 0.0
+        self.restored = 0
+        self._save_lock = asyncio.Lock()  # saves share one .tmp file
+
+    async def restore(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            self.restored = await run_in_threadpool(
+                lambda: self.store.load_warm(read_snapshot(self.path))
+            )
+            logger.info("Restored %d sessions from %s", self.restored, self.path)
+        except (OSError, EOFError) as e:
+            logger.warning("Could not restore session snapshot %s: %s", self.path, e)
+
+    async def save(self) -> None:
+        async with self._save_lock:
+            version = self.store.version
+            if version == self.last_written_version:
+                return
+            entries = self.store.snapshot()
+            start = time.perf_counter()
+            try:
+                await run_in_threadpool(write_snapshot, self.path, entries)
+            except OSError as e:
+                logger.warning("Could not write session snapshot %s: %s", self.path, e)
+                return
+            self.last_duration = time.perf_counter() - start
+            self.last_written_version = version
+
+    async def run(self) -> None:
+        await self.restore()
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save()
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Optional, Tuple
+
+# Upstream streams are normalised to (kind, payload) events:
+#   ("delta", str)   a piece of reply text
+#   ("done", dict)   finish_reason and usage once the reply is complete
+StreamEvent = Tuple[str, object]
+
+
+def sse_event(event: str, data) -> str:
+    """Frame one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+SSE_KEEPALIVE = ": keep-alive\n\n"
+
+
+async def coalesce_deltas(
+    events: AsyncIterator[StreamEvent],
+    max_chars: int,
+    max_delay: float,
+    keepalive: Optional[float] = None,
+) -> AsyncIterator[StreamEvent]:
+    """Merge consecutive deltas into size- or time-bounded flushes.
+
+    Pending text is flushed once it reaches ``max_chars`` or has waited
+    ``max_delay`` seconds, and always before any non-delta event. When
+    ``keepalive`` is set, a ``("keepalive", None)`` event is emitted after
+    that many idle seconds. Closing this generator (for example because the
+    client went away) cancels the upstream read and closes ``events``.
+    """
+    parts = []
+    size = 0
+    first_pending = 0.0
+    last_sent = time.monotonic()
+    next_item: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if next_item is None:
+                next_item = asyncio.ensure_future(events.__anext__())
+
+            now = time.monotonic()
+            timeouts = []
+            if parts:
+                timeouts.append(first_pending + max_delay - now)
+            if keepalive:
+                timeouts.append(last_sent + keepalive - now)
+            timeout = max(min(timeouts), 0) if timeouts else None
+
+            done, _ = await asyncio.wait({next_item}, timeout=timeout)
+            if not done:
+                if parts:
+                    yield "delta", "".join(parts)
+                    parts, size = [], 0
+                else:
+                    yield "keepalive", None
+                last_sent = time.monotonic()
+                continue
+
+            try:
+                kind, payload = next_item.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                next_item = None
+
+            if kind == "delta":
+                if not parts:
+                    first_pending = time.monotonic()
+                parts.append(payload)
+                size += len(payload)
+                if size < max_chars:
+                    continue
+                yield "delta", "".join(parts)
+                parts, size = [], 0
+            else:
+                if parts:
+                    yield "delta", "".join(parts)
+                    parts, size = [], 0
+                yield kind, payload
+            last_sent = time.monotonic()
+
+        if parts:
+            yield "delta", "".join(parts)
+    finally:
+        if next_item is not None and not next_item.done():
+            next_item.cancel()
+            await asyncio.gather(next_item, return_exceptions=True)
+        await events.aclose()
@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# Import the app modules from the project root, and never call the real API.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+# Keep FAQ corpora in memory; tests that need the directory pass their own.
+os.environ.setdefault("FAQ_DIR", "")
@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+
+import cache
+import server
+from admission import RateLimiter
+from cache import ResponseCache, normalize_text, replay_chunks
+
+MESSAGES = [{"role": "system", "content": "FAQ"}]
+
+
+def ask(text):
+    return MESSAGES + [{"role": "user", "content": text}]
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    c = ResponseCache(max_entries=10, ttl_seconds=60)
+    c.put("k", "reply")
+
+    now[0] += 59
+    assert c.get("k") == "reply"
+    now[0] += 2
+    assert c.get("k") is None
+    assert len(c) == 0
+    assert (c.hits, c.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    c = ResponseCache(max_entries=2, ttl_seconds=60)
+    c.put("a", "1")
+    c.put("b", "2")
+    assert c.get("a") == "1"  # "b" is now the oldest
+    c.put("c", "3")
+
+    assert c.get("b") is None
+    assert (c.get("a"), c.get("c")) == ("1", "3")
+    assert c.evictions == 1
+
+
+def test_normalization_folds_case_punctuation_and_spacing():
+    c = ResponseCache(max_entries=10, ttl_seconds=60)
+    assert normalize_text("  What are   your HOURS?! ") == "what are your hours"
+    assert c.key_for(ask("What are your hours?"), "m") == c.key_for(ask("what are  your hours"), "m")
+    assert c.key_for(ask("What are your hours?"), "m") != c.key_for(ask("What are your prices?"), "m")
+    assert c.key_for(ask("hours"), "m") != c.key_for(ask("hours"), "other-model")
+
+    exact = ResponseCache(max_entries=10, ttl_seconds=60, normalize=False)
+    assert exact.key_for(ask("What are your hours?"), "m") != exact.key_for(ask("what are your hours"), "m")
+
+
+def test_only_the_final_user_message_is_normalized():
+    c = ResponseCache(max_entries=10, ttl_seconds=60)
+    upper = [{"role": "system", "content": "Context: OPEN 9-5."}] + ask("hours?")
+    lower = [{"role": "system", "content": "context: open 95"}] + ask("hours?")
+    assert c.key_for(upper, "m") != c.key_for(lower, "m")
+
+
+def test_replay_chunks_are_words_that_rebuild_the_reply():
+    reply = "We open at 9am.\n\nClosed on  Sundays."
+    chunks = list(replay_chunks(reply))
+    assert "".join(chunks) == reply
+    assert chunks[:3] == ["We ", "open ", "at "]
+
+
+def test_repeated_faq_question_is_answered_from_the_cache(monkeypatch):
+    calls = []
+
+    async def reply(messages, model):
+        calls.append(messages[-1]["content"])
+        return SimpleNamespace(output_text="We open at 9am.")
+
+    monkeypatch.setattr(server, "_model_reply", reply)
+    monkeypatch.setattr(server, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(server, "RESPONSE_CACHE", ResponseCache(100, 3600))
+    monkeypatch.setattr(server, "COALESCE_REQUESTS", False)
+    monkeypatch.setattr(server, "IP_LIMITER", RateLimiter(0, 0))
+    monkeypatch.setattr(server, "SESSION_LIMITER", RateLimiter(0, 0))
+    body = {"mode": "faq", "faq_context": "We open at 9am on weekdays."}
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.post("/chat", json={**body, "message": "When do you open?"})
+            second = await client.post("/chat", json={**body, "message": "when do you open"})
+            streamed = await client.post("/chat-stream", json={**body, "message": "When do you open"})
+            return first, second, streamed
+
+    first, second, streamed = asyncio.run(run())
+
+    assert first.json()["reply"] == second.json()["reply"] == "We open at 9am."
+    assert streamed.text == "We open at 9am."
+    assert len(calls) == 1
+    assert server.RESPONSE_CACHE.hits == 2
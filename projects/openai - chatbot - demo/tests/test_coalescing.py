@@ -0,0 +1,39 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+
+import server
+from admission import AdmissionController, RateLimiter
+from coalesce import SingleFlight
+
+
+def test_identical_chats_share_one_upstream_call_without_429s(monkeypatch):
+    calls = []
+
+    async def slow_reply(messages, model):
+        calls.append(model)
+        await asyncio.sleep(0.2)
+        return SimpleNamespace(output_text="shared answer")
+
+    monkeypatch.setattr(server, "_model_reply", slow_reply)
+    monkeypatch.setattr(server, "COALESCE_REQUESTS", True)
+    monkeypatch.setattr(server, "INFLIGHT", SingleFlight())
+    monkeypatch.setattr(server, "IP_LIMITER", RateLimiter(0, 0))
+    monkeypatch.setattr(server, "SESSION_LIMITER", RateLimiter(0, 0))
+
+    async def run():
+        # Fewer slots and queue places than requests: followers must not need one.
+        monkeypatch.setattr(server, "ADMISSION", AdmissionController(2, 1, 5))
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *(client.post("/chat", json={"message": "What are your opening hours?"}) for _ in range(10))
+            )
+
+    responses = asyncio.run(run())
+
+    assert [r.status_code for r in responses] == [200] * 10
+    assert {r.json()["reply"] for r in responses} == {"shared answer"}
+    assert len(calls) == 1
+    assert server.ADMISSION.active == 0
@@ -0,0 +1,133 @@
+import asyncio
+import os
+import threading
+
+import httpx
+import pytest
+
+import server
+from faq_index import FAQLimitError, FAQRegistry
+
+HOURS = "When are you open?\n\nWe are open from 9am to 5pm on weekdays."
+REFUNDS = "How do refunds work?\n\nRefunds are issued within 14 days of purchase."
+
+
+def test_corpus_is_visible_to_other_workers_and_after_restart(tmp_path):
+    writer = FAQRegistry(tmp_path)
+    other = FAQRegistry(tmp_path)
+    writer.register("shop", HOURS)
+
+    assert other.names() == ["shop"]
+    assert "9am to 5pm" in other.get("shop").search("opening hours weekdays")[0]
+    assert FAQRegistry(tmp_path).get("shop") is not None
+
+
+def test_other_workers_pick_up_updates_and_removals(tmp_path):
+    writer = FAQRegistry(tmp_path)
+    other = FAQRegistry(tmp_path)
+    writer.register("shop", HOURS)
+    assert other.get("shop").search("refunds") == []
+
+    writer.register("shop", HOURS + "\n\n" + REFUNDS)
+    path = tmp_path / "shop.txt"
+    # Make sure the rewrite is visible even on coarse mtime filesystems.
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1))
+    assert "14 days" in other.get("shop").search("refunds")[0]
+
+    assert writer.remove("shop")
+    assert other.get("shop") is None
+    assert not other.remove("shop")
+
+
+def test_remove_during_get_is_not_undone(tmp_path, monkeypatch):
+    registry = FAQRegistry(tmp_path)
+    registry.register("shop", HOURS)
+    remover = threading.Thread(target=registry.remove, args=("shop",))
+    stat = registry._version
+    waited = []
+
+    def stat_then_race(name):
+        # remove() starts right after get() has looked at the file and must
+        # wait until get() is done with it.
+        version = stat(name)
+        if remover.ident is None:
+            remover.start()
+            remover.join(0.1)
+            waited.append(remover.is_alive())
+        return version
+
+    monkeypatch.setattr(registry, "_version", stat_then_race)
+    registry.get("shop")
+    remover.join()
+
+    assert waited == [True]
+    assert registry.get("shop") is None
+    assert registry.names() == []
+
+
+def test_corpus_count_is_capped(tmp_path):
+    registry = FAQRegistry(tmp_path, max_corpora=2)
+    registry.register("one", HOURS)
+    registry.register("two", REFUNDS)
+    with pytest.raises(FAQLimitError):
+        registry.register("three", HOURS)
+    # Updating an existing corpus is still allowed at the cap.
+    registry.register("two", HOURS)
+    assert registry.names() == ["one", "two"]
+
+
+def test_invalid_names_are_rejected(tmp_path):
+    registry = FAQRegistry(tmp_path)
+    with pytest.raises(ValueError):
+        registry.register("../escape", HOURS)
+    assert registry.get("../escape") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def _request(method, path, **kwargs):
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def faq_server(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "FAQS", FAQRegistry(tmp_path, max_corpora=1))
+    monkeypatch.setattr(server, "FAQ_ADMIN_KEY", "secret")
+    return tmp_path
+
+
+def test_writes_require_the_admin_key(faq_server, monkeypatch):
+    body = {"text": HOURS}
+    assert _request("PUT", "/faq/shop", json=body).status_code == 401
+    assert _request("PUT", "/faq/shop", json=body, headers={"X-Admin-Key": "wrong"}).status_code == 401
+    assert _request("PUT", "/faq/shop", json=body, headers={"X-Admin-Key": "secret"}).status_code == 200
+    assert _request("DELETE", "/faq/shop").status_code == 401
+    assert _request("GET", "/faq").json() == {"corpora": [{"name": "shop", "chunks": 1}]}
+
+    monkeypatch.setattr(server, "FAQ_ADMIN_KEY", "")
+    assert _request("DELETE", "/faq/shop", headers={"X-Admin-Key": ""}).status_code == 403
+
+
+def test_endpoint_enforces_cap_and_name(faq_server):
+    headers = {"X-Admin-Key": "secret"}
+    assert _request("PUT", "/faq/shop", json={"text": HOURS}, headers=headers).status_code == 200
+    assert _request("PUT", "/faq/other", json={"text": REFUNDS}, headers=headers).status_code == 409
+    assert _request("PUT", "/faq/bad.name", json={"text": REFUNDS}, headers=headers).status_code == 400
+    assert _request("DELETE", "/faq/shop", headers=headers).status_code == 200
+    assert _request("DELETE", "/faq/shop", headers=headers).status_code == 404
+
+
+def test_chat_uses_a_corpus_registered_by_another_worker(faq_server, monkeypatch):
+    FAQRegistry(faq_server).register("shop", HOURS)
+    monkeypatch.setattr(server, "IP_LIMITER", server.RateLimiter(0, 0))
+    monkeypatch.setattr(server, "SESSION_LIMITER", server.RateLimiter(0, 0))
+
+    ok = _request("POST", "/chat", json={"message": "When are you open?", "mode": "faq", "faq_corpus": "shop"})
+    missing = _request("POST", "/chat", json={"message": "Hi", "mode": "faq", "faq_corpus": "nope"})
+
+    assert ok.status_code == 200
+    assert missing.status_code == 404
@@ -0,0 +1,65 @@
+import asyncio
+
+import httpx
+
+import server
+from metrics import Registry
+
+
+def test_counter_and_gauge_text_format():
+    registry = Registry()
+    requests = registry.counter("app_requests_total", "Requests", ("path",))
+    registry.counter("app_hits_total", "Hits", fn=lambda: 3)
+    depth = registry.gauge("app_queue_depth", "Queue depth")
+    requests.inc(path="/a")
+    requests.inc(2, path='/b"x\n')
+    depth.set(1.5)
+
+    assert registry.render().splitlines() == [
+        "# HELP app_requests_total Requests",
+        "# TYPE app_requests_total counter",
+        'app_requests_total{path="/a"} 1',
+        'app_requests_total{path="/b\\"x\\n"} 2',
+        "# HELP app_hits_total Hits",
+        "# TYPE app_hits_total counter",
+        "app_hits_total 3",
+        "# HELP app_queue_depth Queue depth",
+        "# TYPE app_queue_depth gauge",
+        "app_queue_depth 1.5",
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("app_seconds", "Latency", ("kind",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 3):
+        latency.observe(value, kind="x")
+
+    lines = registry.render().splitlines()
+    assert lines[1] == "# TYPE app_seconds histogram"
+    assert lines[2:] == [
+        'app_seconds_bucket{kind="x",le="0.1"} 1',
+        'app_seconds_bucket{kind="x",le="1"} 3',
+        'app_seconds_bucket{kind="x",le="+Inf"} 4',
+        'app_seconds_sum{kind="x"} 4.05',
+        'app_seconds_count{kind="x"} 4',
+    ]
+
+
+def test_metrics_endpoint_counts_requests_per_route():
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.get("/health")
+            await client.get("/no-such-page")
+            return await client.get("/metrics")
+
+    response = asyncio.run(run())
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'chat_http_requests_total{endpoint="/health",mode="",status="200"}' in body
+    assert 'chat_http_requests_total{endpoint="unmatched",mode="",status="404"}' in body
+    assert 'chat_http_request_duration_seconds_count{endpoint="/health",mode=""}' in body
+    for line in body.splitlines():
+        assert line.startswith("#") or len(line.rsplit(" ", 1)) == 2
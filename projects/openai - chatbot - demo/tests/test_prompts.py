@@ -0,0 +1,28 @@
+from prompts import build_messages, system_message
+
+
+def test_messages_are_system_then_history_then_user():
+    window = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    messages = build_messages("strict", None, window, "next question")
+
+    assert messages[0]["role"] == "system"
+    assert "strict assistant" in messages[0]["content"]
+    assert messages[1] is window[0] and messages[2] is window[1]
+    assert messages[3] == {"role": "user", "content": "next question"}
+
+
+def test_fixed_system_messages_are_shared_between_requests():
+    first = build_messages("assistant", None, [], "a")
+    second = build_messages("assistant", "ignored outside faq mode", [], "b")
+    assert first[0] is second[0]
+    assert system_message("unknown", None) is system_message("assistant", None)
+    assert system_message("strict", None) is not system_message("assistant", None)
+
+
+def test_faq_system_message_embeds_the_context_and_is_memoized():
+    message = system_message("faq", "  We open at 9am.\n")
+    assert message["content"].startswith("You are a strict FAQ bot.")
+    assert message["content"].endswith("FAQ_CONTEXT:\nWe open at 9am.\n")
+    assert system_message("faq", "We open at 9am.") is message
+    assert system_message("faq", "We open at 10am.") is not message
+    assert system_message("faq", None)["content"].endswith("FAQ_CONTEXT:\n\n")
@@ -0,0 +1,146 @@
+import time
+
+import pytest
+
+from sessions import RedisSessionStore, SQLiteSessionStore, SessionStore, create_session_store
+
+
+def _msgs(text):
+    return [{"role": "user", "content": text}]
+
+
+@pytest.fixture
+def sqlite_pair(tmp_path):
+    """Two stores on one file, like two uvicorn workers on one host."""
+    path = str(tmp_path / "sessions.db")
+    stores = [SQLiteSessionStore(path, max_sessions=3, ttl_seconds=60, flush_interval=0.05) for _ in range(2)]
+    yield stores
+    for store in stores:
+        store.close()
+
+
+@pytest.fixture
+def redis_pair(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    import redis
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, url: fakeredis.FakeRedis(server=server)))
+    stores = [RedisSessionStore("redis://stand-in", max_sessions=3, ttl_seconds=60, flush_interval=0.05) for _ in range(2)]
+    yield stores
+    for store in stores:
+        store.close()
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def pair(request):
+    return request.getfixturevalue(f"{request.param}_pair")
+
+
+def test_worker_sees_its_own_writes_before_flush(pair):
+    a, _ = pair
+    a.put("s1", _msgs("hello"))
+    assert a.get("s1")["messages"] == _msgs("hello")
+
+
+def test_flushed_write_is_visible_to_other_worker(pair):
+    a, b = pair
+    a.put("s1", _msgs("hello"))
+    a.flush()
+    assert b.get("s1")["messages"] == _msgs("hello")
+    b.put("s1", _msgs("follow-up"))
+    b.flush()
+    assert a.get("s1")["messages"] == _msgs("follow-up")
+
+
+def test_background_flusher_writes_without_explicit_flush(pair):
+    a, b = pair
+    a.put("s1", _msgs("hello"))
+    deadline = time.time() + 2
+    while b.get("s1") is None and time.time() < deadline:
+        time.sleep(0.02)
+    assert b.get("s1") is not None
+
+
+def test_full_batch_is_written_immediately(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    a = SQLiteSessionStore(path, max_sessions=10, ttl_seconds=60, batch_size=2, flush_interval=60)
+    b = SQLiteSessionStore(path, max_sessions=10, ttl_seconds=60, flush_interval=60)
+    try:
+        a.put("s1", _msgs("one"))
+        assert b.get("s1") is None
+        a.put("s2", _msgs("two"))
+        assert b.get("s1") is not None and b.get("s2") is not None
+    finally:
+        a.close()
+        b.close()
+
+
+def test_least_recently_used_sessions_are_evicted(pair):
+    a, b = pair
+    for i in range(5):
+        a.put(f"s{i}", _msgs(str(i)))
+        a.flush()
+        time.sleep(0.01)
+    assert len(b) == 3
+    assert a.evictions == 2
+    assert b.get("s0") is None and b.get("s1") is None
+    assert b.get("s4") is not None
+
+
+def test_expired_sessions_are_not_returned_and_are_swept(pair, monkeypatch):
+    a, b = pair
+    a.put("old", _msgs("old"))
+    a.flush()
+    for store in pair:
+        monkeypatch.setattr(store, "ttl_seconds", 0.2)
+    time.sleep(0.3)
+    assert b.get("old") is None
+    a.put("new", _msgs("new"))
+    a.flush()
+    assert a.expirations == 1
+    assert len(b) == 1
+
+
+def test_delete_removes_pending_and_stored(pair):
+    a, b = pair
+    a.put("s1", _msgs("x"))
+    a.flush()
+    a.put("s1", _msgs("y"))
+    a.delete("s1")
+    a.flush()
+    assert a.get("s1") is None and b.get("s1") is None
+
+
+def test_close_flushes_pending_writes(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    a = SQLiteSessionStore(path, max_sessions=10, ttl_seconds=60, flush_interval=60)
+    a.put("s1", _msgs("bye"))
+    a.close()
+    b = SQLiteSessionStore(path, max_sessions=10, ttl_seconds=60)
+    try:
+        assert b.get("s1")["messages"] == _msgs("bye")
+    finally:
+        b.close()
+
+
+def test_memory_store_lru_and_ttl(monkeypatch):
+    store = SessionStore(max_sessions=2, ttl_seconds=60)
+    store.put("a", _msgs("a"))
+    store.put("b", _msgs("b"))
+    store.get("a")
+    store.put("a", _msgs("a2"))
+    store.put("c", _msgs("c"))
+    assert store.get("b") is None and store.evictions == 1
+    monkeypatch.setattr(store, "ttl_seconds", 0)
+    time.sleep(0.01)
+    assert store.get("a") is None
+
+
+def test_create_session_store(tmp_path):
+    assert isinstance(create_session_store("memory", 10, 60), SessionStore)
+    store = create_session_store("sqlite", 10, 60, sqlite_path=str(tmp_path / "s.db"))
+    assert isinstance(store, SQLiteSessionStore)
+    store.close()
+    with pytest.raises(ValueError):
+        create_session_store("nope", 10, 60)
@@ -0,0 +1,68 @@
+import asyncio
+import gzip
+import time
+
+from sessions import SessionStore
+from snapshots import SessionSnapshotter, read_snapshot, write_snapshot
+
+
+def _entries(n, start=0, age=0.0):
+    now = time.time() - age
+    return [(f"s{i}", now + i, [{"role": "user", "content": f"hi {i}"}]) for i in range(start, start + n)]
+
+
+def test_warm_entries_count_towards_capacity():
+    store = SessionStore(max_sessions=2, ttl_seconds=3600)
+    assert store.load_warm(_entries(3)) == 2  # newest two kept
+    store.put("live", [])
+    assert len(store) == 2
+    store.put("live2", [])
+    assert len(store) == 2
+    assert store.evictions == 2
+    assert store.get("live") is not None and store.get("live2") is not None
+
+
+def test_oldest_warm_entry_is_evicted_first():
+    store = SessionStore(max_sessions=3, ttl_seconds=3600)
+    store.load_warm(_entries(3))
+    store.put("live", [])
+    assert store.get("s0") is None  # oldest warm entry made room
+    assert store.get("s1") is not None and store.get("s2") is not None
+    assert len(store) == 3
+
+
+def test_load_warm_leaves_room_only_for_free_slots():
+    store = SessionStore(max_sessions=3, ttl_seconds=3600)
+    store.put("a", [])
+    store.put("b", [])
+    assert store.load_warm(_entries(5)) == 1
+    assert len(store) == 3
+
+
+def test_concurrent_saves_do_not_corrupt_the_snapshot(tmp_path):
+    store = SessionStore(max_sessions=100, ttl_seconds=3600)
+    for sid, _, messages in _entries(50):
+        store.put(sid, messages)
+    path = tmp_path / "sessions.jsonl.gz"
+    snapshotter = SessionSnapshotter(store, str(path), interval=60)
+
+    async def run():
+        # A periodic save and the shutdown save racing on the same .tmp file.
+        store.version += 1
+        first = asyncio.ensure_future(snapshotter.save())
+        await asyncio.sleep(0)
+        store.version += 1
+        await asyncio.gather(first, snapshotter.save())
+
+    asyncio.run(run())
+    assert len(list(read_snapshot(path))) == 50
+    with gzip.open(path, "rt") as f:
+        f.read()  # whole file decompresses
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = tmp_path / "s.jsonl.gz"
+    write_snapshot(path, _entries(3))
+    store = SessionStore(max_sessions=10, ttl_seconds=3600)
+    assert store.load_warm(read_snapshot(path)) == 3
+    assert store.get("s1")["messages"] == [{"role": "user", "content": "hi 1"}]
@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+import httpx
+
+import server
+from admission import RateLimiter
+from streaming import SSE_KEEPALIVE, coalesce_deltas, sse_event
+
+
+class Events:
+    """Scripted upstream: (delay, kind, payload) steps; records closing."""
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.steps:
+            raise StopAsyncIteration
+        delay, kind, payload = self.steps.pop(0)
+        await asyncio.sleep(delay)
+        return kind, payload
+
+    async def aclose(self):
+        self.closed = True
+
+
+async def collect(events, **kwargs):
+    kwargs.setdefault("max_chars", 10)
+    kwargs.setdefault("max_delay", 1.0)
+    return [e async for e in coalesce_deltas(events, **kwargs)]
+
+
+def test_sse_event_framing():
+    assert sse_event("delta", {"text": "héllo\n"}) == 'event: delta\ndata: {"text": "héllo\\n"}\n\n'
+    assert SSE_KEEPALIVE.startswith(":") and SSE_KEEPALIVE.endswith("\n\n")
+
+
+def test_deltas_are_merged_up_to_max_chars():
+    events = Events(*[(0, "delta", "abcd")] * 5, (0, "done", {"finish_reason": "stop"}))
+    out = asyncio.run(collect(events))
+    assert out == [("delta", "abcdabcdabcd"), ("delta", "abcdabcd"), ("done", {"finish_reason": "stop"})]
+    assert events.closed
+
+
+def test_pending_text_is_flushed_after_max_delay():
+    events = Events((0, "delta", "a"), (0, "delta", "b"), (0.3, "delta", "c"))
+    out = asyncio.run(collect(events, max_delay=0.05))
+    assert out == [("delta", "ab"), ("delta", "c")]
+
+
+def test_keepalive_is_sent_while_upstream_is_idle():
+    events = Events((0.25, "delta", "late"))  # idle for more than two keepalive periods
+    out = asyncio.run(collect(events, keepalive=0.1))
+    assert out[-1] == ("delta", "late")
+    assert out.count(("keepalive", None)) >= 1
+
+
+def test_closing_the_consumer_cancels_the_upstream_read():
+    events = Events((0, "delta", "x" * 20), (5, "delta", "never"))
+
+    async def run():
+        stream = coalesce_deltas(events, max_chars=10, max_delay=1.0)
+        first = await stream.__anext__()
+        await asyncio.wait_for(stream.aclose(), 1)
+        return first
+
+    assert asyncio.run(run()) == ("delta", "x" * 20)
+    assert events.closed
+
+
+def stream_chat(monkeypatch, events, **request_kwargs):
+    async def upstream(messages, slot):
+        if slot is not None:
+            slot.release()
+        async for event in events:
+            yield event
+
+    monkeypatch.setattr(server, "_upstream_events", upstream)
+    monkeypatch.setattr(server, "COALESCE_REQUESTS", False)
+    monkeypatch.setattr(server, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(server, "IP_LIMITER", RateLimiter(0, 0))
+    monkeypatch.setattr(server, "SESSION_LIMITER", RateLimiter(0, 0))
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/chat-stream", json={"message": "hi"}, **request_kwargs)
+
+    return asyncio.run(run())
+
+
+def parse_sse(text):
+    frames = []
+    for block in text.split("\n\n"):
+        if not block:
+            continue
+        if block.startswith(":"):
+            frames.append(("comment", None))
+            continue
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        frames.append((lines["event"], json.loads(lines["data"])))
+    return frames
+
+
+def test_chat_stream_sse_frames(monkeypatch):
+    events = Events((0, "delta", "Hel"), (0, "delta", "lo"), (0, "done", {"finish_reason": "stop", "usage": None}))
+    response = stream_chat(monkeypatch, events, params={"format": "sse"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    frames = parse_sse(response.text)
+    assert frames[0] == ("session", {"session_id": response.headers["x-session-id"]})
+    assert "".join(p["text"] for kind, p in frames if kind == "delta") == "Hello"
+    assert frames[-1] == ("done", {"finish_reason": "stop", "usage": None})
+
+
+def test_chat_stream_sse_keepalive_and_error(monkeypatch):
+    monkeypatch.setattr(server, "SSE_KEEPALIVE_SECONDS", 0.05)
+    events = Events((0.2, "delta", "slow"), (0, "error", None))
+
+    async def failing():
+        async for kind, payload in events:
+            if kind == "error":
+                raise RuntimeError("upstream broke")
+            yield kind, payload
+
+    response = stream_chat(monkeypatch, failing(), headers={"Accept": "text/event-stream"})
+    frames = parse_sse(response.text)
+    assert ("comment", None) in frames
+    assert frames[-1] == ("error", {"detail": "RuntimeError"})
+
+
+def test_chat_stream_plain_text(monkeypatch):
+    events = Events((0, "delta", "plain "), (0, "delta", "reply"), (0, "done", {"finish_reason": "stop", "usage": None}))
+    response = stream_chat(monkeypatch, events)
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.text == "plain reply"
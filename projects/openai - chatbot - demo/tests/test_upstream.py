@@ -0,0 +1,214 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from upstream import UpstreamPolicy, UpstreamTimeout, resilient_call, resilient_stream
+
+
+class FakeStream:
+    """Async iterator standing in for one upstream attempt."""
+
+    def __init__(self, model, items=("a", "b"), first_delay=0.0, gap=0.0, error=None):
+        self.model = model
+        self.items = list(items)
+        self.first_delay = first_delay
+        self.gap = gap
+        self.error = error
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(self.first_delay if self.sent == 0 else self.gap)
+        if self.error is not None:
+            raise self.error
+        if self.sent >= len(self.items):
+            raise StopAsyncIteration
+        self.sent += 1
+        return self.items[self.sent - 1]
+
+    async def aclose(self):
+        self.closed = True
+
+
+class Upstream:
+    """Hands out a scripted FakeStream per attempt and records them."""
+
+    def __init__(self, *scripts):
+        self.scripts = list(scripts)
+        self.opened = []
+
+    def __call__(self, model):
+        stream = FakeStream(model, **self.scripts[len(self.opened)])
+        self.opened.append(stream)
+        return stream
+
+
+def policy(models, **kwargs):
+    kwargs.setdefault("first_token_timeout", 1.0)
+    kwargs.setdefault("total_timeout", 5.0)
+    return UpstreamPolicy(models=models, **kwargs)
+
+
+async def collect(p, upstream):
+    return [item async for item in resilient_stream(p, upstream)]
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://upstream/v1/responses"))
+
+
+def rate_limit_error(headers=None):
+    request = httpx.Request("POST", "http://upstream/v1/responses")
+    response = httpx.Response(429, headers=headers or {}, request=request)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_first_token_timeout_retries_the_next_attempt():
+    p = policy(["m", "m"], first_token_timeout=0.1)
+    upstream = Upstream({"first_delay": 5}, {})
+    assert asyncio.run(collect(p, upstream)) == ["a", "b"]
+    assert len(upstream.opened) == 2
+    assert upstream.opened[0].closed
+    assert p.fallbacks == 1
+
+
+def test_hedge_wins_and_the_slow_attempt_is_closed():
+    p = policy(["m"], hedge=True, hedge_delay=0.05)
+    upstream = Upstream({"first_delay": 5, "items": ["slow"]}, {"items": ["fast"]})
+    start = time.monotonic()
+    assert asyncio.run(collect(p, upstream)) == ["fast"]
+    assert time.monotonic() - start < 1
+    assert p.hedges_fired == 1 and p.hedges_won == 1
+    assert upstream.opened[0].closed and upstream.opened[1].closed
+
+
+def test_no_hedge_when_the_first_attempt_is_fast():
+    p = policy(["m"], hedge=True, hedge_delay=0.5)
+    upstream = Upstream({})
+    assert asyncio.run(collect(p, upstream)) == ["a", "b"]
+    assert p.hedges_fired == 0 and len(upstream.opened) == 1
+
+
+def test_retryable_error_falls_back_to_next_model():
+    p = policy(["primary", "backup"])
+    upstream = Upstream({"error": connection_error()}, {"items": ["from backup"]})
+    assert asyncio.run(collect(p, upstream)) == ["from backup"]
+    assert [s.model for s in upstream.opened] == ["primary", "backup"]
+    assert p.fallbacks == 1
+
+
+def test_last_error_is_raised_when_every_model_fails():
+    p = policy(["primary", "backup"])
+    upstream = Upstream({"error": connection_error()}, {"error": connection_error()})
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(collect(p, upstream))
+    assert len(upstream.opened) == 2
+
+
+def test_non_retryable_error_raises_without_fallback():
+    p = policy(["primary", "backup"])
+    upstream = Upstream({"error": ValueError("bad request")}, {})
+    with pytest.raises(ValueError):
+        asyncio.run(collect(p, upstream))
+    assert len(upstream.opened) == 1
+    assert p.fallbacks == 0
+
+
+def test_total_deadline_cuts_off_a_committed_stream():
+    p = policy(["m", "m"], total_timeout=0.3)
+    upstream = Upstream({"items": ["a", "b", "c"], "gap": 5})
+    received = []
+
+    async def run():
+        async for item in resilient_stream(p, upstream):
+            received.append(item)
+
+    start = time.monotonic()
+    with pytest.raises(UpstreamTimeout):
+        asyncio.run(run())
+    assert time.monotonic() - start < 1
+    assert received == ["a"]
+    assert len(upstream.opened) == 1  # no retry once output reached the caller
+    assert upstream.opened[0].closed
+
+
+def test_total_deadline_bounds_retries():
+    p = policy(["m", "m", "m"], first_token_timeout=0.2, total_timeout=0.3)
+    upstream = Upstream({"first_delay": 5}, {"first_delay": 5}, {"first_delay": 5})
+    start = time.monotonic()
+    with pytest.raises(UpstreamTimeout):
+        asyncio.run(collect(p, upstream))
+    assert time.monotonic() - start < 1
+    assert len(upstream.opened) == 2
+
+
+def test_resilient_call_retries_and_returns_the_result():
+    p = policy(["primary", "backup"])
+    calls = []
+
+    async def call(model):
+        calls.append(model)
+        if model == "primary":
+            raise connection_error()
+        return f"reply from {model}"
+
+    assert asyncio.run(resilient_call(p, call)) == "reply from backup"
+    assert calls == ["primary", "backup"]
+
+
+def test_resilient_call_times_out_each_attempt():
+    p = policy(["m", "m"], first_token_timeout=0.1)
+    calls = []
+
+    async def call(model):
+        calls.append(model)
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+        return "ok"
+
+    assert asyncio.run(resilient_call(p, call)) == "ok"
+    assert len(calls) == 2
+
+
+def test_rate_limit_waits_for_retry_after_before_retrying():
+    p = policy(["m", "m"])
+    upstream = Upstream({"error": rate_limit_error({"retry-after": "0.3"})}, {})
+    start = time.monotonic()
+    assert asyncio.run(collect(p, upstream)) == ["a", "b"]
+    assert time.monotonic() - start >= 0.3
+    assert p.backoffs == 1
+
+
+def test_rate_limit_backoff_is_jittered_and_capped():
+    p = policy(["m"], backoff_base=1.0, backoff_max=3.0)
+    error = rate_limit_error()
+    delays = [p.backoff_delay(error, retry) for retry in range(6) for _ in range(20)]
+    assert all(0 <= d <= 3.0 for d in delays)
+    assert len(set(delays)) > 1
+    assert p.backoff_delay(rate_limit_error({"retry-after-ms": "250"}), 0) == 0.25
+    assert p.backoff_delay(rate_limit_error({"retry-after": "60"}), 0) == 3.0
+
+
+def test_rate_limit_gives_up_when_the_wait_passes_the_deadline():
+    p = policy(["m", "m"], total_timeout=0.5)
+    upstream = Upstream({"error": rate_limit_error({"retry-after": "2"})}, {})
+    start = time.monotonic()
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(collect(p, upstream))
+    assert time.monotonic() - start < 0.3
+    assert len(upstream.opened) == 1
+
+
+def test_other_retryable_errors_do_not_back_off():
+    p = policy(["m", "m"], backoff_base=5.0)
+    upstream = Upstream({"error": connection_error()}, {})
+    start = time.monotonic()
+    assert asyncio.run(collect(p, upstream)) == ["a", "b"]
+    assert time.monotonic() - start < 1
+    assert p.backoffs == 0
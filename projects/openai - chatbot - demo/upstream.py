@@ -0,0 +1,247 @@
+import asyncio
+import email.utils
+import math
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+import openai
+
+# Errors worth retrying on another attempt or model. Anything else (bad
+# request, auth) fails the same way everywhere and is raised straight away.
+RETRYABLE_ERRORS: Tuple[type, ...] = (
+    asyncio.TimeoutError,
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+# Errors that mean "slow down": the next attempt waits with backoff first.
+BACKOFF_ERRORS: Tuple[type, ...] = (openai.RateLimitError,)
+
+
+class UpstreamTimeout(asyncio.TimeoutError):
+    """An upstream call missed its first-token or total deadline."""
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies for deriving the hedge delay."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+@dataclass
+class UpstreamPolicy:
+    """Deadlines, hedging and fallback for one kind of upstream call.
+
+    ``models`` is the attempt order: the primary model first, then fallbacks.
+    Hedging fires a second request for the same model when the first has not
+    produced anything by the tracker's p95 (or ``hedge_delay`` until there
+    are enough samples). After a rate limit the next attempt waits for the
+    server's Retry-After, or else capped exponential backoff with full jitter
+    from ``backoff_base`` up to ``backoff_max``.
+    """
+
+    models: List[str]
+    first_token_timeout: float
+    total_timeout: float
+    hedge: bool = False
+    hedge_delay: float = 2.0
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    tracker: Optional[LatencyTracker] = None
+    hedges_fired: int = 0
+    hedges_won: int = 0
+    fallbacks: int = 0
+    backoffs: int = 0
+
+    def current_hedge_delay(self) -> float:
+        p95 = self.tracker.quantile(0.95) if self.tracker else None
+        delay = p95 if p95 is not None else self.hedge_delay
+        return min(delay, self.first_token_timeout)
+
+    def backoff_delay(self, error: BaseException, retry: int) -> float:
+        """Seconds to wait before re-issuing after ``error`` (``retry`` from 0)."""
+        hinted = retry_after(error)
+        if hinted is not None:
+            return min(hinted, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """The Retry-After hint of an API error in seconds, if it sent one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+async def _abandon(iterator: AsyncIterator, pending: Optional[asyncio.Future]) -> None:
+    """Cancel an in-progress read and close the stream (drops the connection)."""
+    if pending is not None and not pending.done():
+        pending.cancel()
+        await asyncio.gather(pending, return_exceptions=True)
+    await iterator.aclose()
+
+
+async def _first_item(
+    policy: UpstreamPolicy,
+    open_stream: Callable[[str], AsyncIterator],
+    model: str,
+    loop_deadline: float,
+) -> Tuple[object, AsyncIterator]:
+    """Open a stream for ``model`` and wait for its first item, hedging if slow.
+
+    Returns the first item and the winning iterator; losers are closed.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    first_deadline = min(start + policy.first_token_timeout, loop_deadline)
+    hedge_at = start + policy.current_hedge_delay() if policy.hedge else None
+
+    attempts = {}  # pending __anext__ future -> (iterator, launch number)
+
+    def launch() -> None:
+        iterator = open_stream(model)
+        attempts[asyncio.ensure_future(iterator.__anext__())] = (iterator, len(attempts))
+
+    launch()
+    last_error: Optional[BaseException] = None
+    try:
+        while attempts:
+            now = loop.time()
+            wake = first_deadline if hedge_at is None else min(first_deadline, hedge_at)
+            done, _ = await asyncio.wait(
+                set(attempts), timeout=max(wake - now, 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                iterator, number = attempts.pop(future)
+                try:
+                    item = future.result()
+                except StopAsyncIteration:
+                    last_error = RuntimeError("upstream stream ended without output")
+                    continue
+                except RETRYABLE_ERRORS as e:
+                    last_error = e
+                    continue
+                if policy.tracker is not None:
+                    policy.tracker.record(loop.time() - start)
+                if number > 0:
+                    policy.hedges_won += 1
+                return item, iterator
+            if done:
+                continue
+
+            now = loop.time()
+            if hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                policy.hedges_fired += 1
+                launch()
+            elif now >= first_deadline:
+                raise UpstreamTimeout(f"no first token from {model} in {policy.first_token_timeout:.1f}s")
+        raise last_error or UpstreamTimeout(f"no output from {model}")
+    finally:
+        for future, (iterator, _) in attempts.items():
+            await _abandon(iterator, future)
+
+
+async def resilient_stream(
+    policy: UpstreamPolicy,
+    open_stream: Callable[[str], AsyncIterator],
+) -> AsyncIterator:
+    """Stream from the first model that produces output in time.
+
+    Until the first item arrives nothing has reached the client, so slow or
+    failing attempts can be hedged, retried or moved to a fallback model.
+    After that the stream is committed and only the total deadline applies.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + policy.total_timeout
+    last_error: Optional[BaseException] = None
+    throttled = 0  # consecutive rate-limited attempts
+
+    for i, model in enumerate(policy.models):
+        if i:
+            policy.fallbacks += 1
+        try:
+            item, iterator = await _first_item(policy, open_stream, model, deadline)
+        except RETRYABLE_ERRORS as e:
+            last_error = e
+            if loop.time() >= deadline:
+                break
+            if isinstance(e, BACKOFF_ERRORS) and i + 1 < len(policy.models):
+                delay = policy.backoff_delay(e, throttled)
+                throttled += 1
+                if loop.time() + delay >= deadline:
+                    break  # the next attempt could not finish in time anyway
+                policy.backoffs += 1
+                await asyncio.sleep(delay)
+            continue
+
+        pending: Optional[asyncio.Future] = None
+        try:
+            yield item
+            while True:
+                pending = asyncio.ensure_future(iterator.__anext__())
+                remaining = deadline - loop.time()
+                done, _ = await asyncio.wait({pending}, timeout=max(remaining, 0))
+                if not done:
+                    raise UpstreamTimeout(f"reply exceeded {policy.total_timeout:.0f}s")
+                try:
+                    item = pending.result()
+                except StopAsyncIteration:
+                    pending = None
+                    return
+                pending = None
+                yield item
+        finally:
+            await _abandon(iterator, pending)
+
+    raise last_error or UpstreamTimeout("no upstream model answered")
+
+
+async def resilient_call(
+    policy: UpstreamPolicy,
+    call: Callable[[str], Awaitable],
+):
+    """Non-streaming version: the whole result counts as the first item, so
+    ``policy.first_token_timeout`` bounds each attempt."""
+
+    async def as_stream(model: str) -> AsyncIterator:
+        yield await call(model)
+
+    stream = resilient_stream(policy, as_stream)
+    try:
+        return await stream.__anext__()
+    finally:
+        await stream.aclose()
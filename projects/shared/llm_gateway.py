@@ -0,0 +1,466 @@
+"""One LLM client layer for every app in this repo.
+
+- Pooled clients: one sync ``OpenAI`` and one ``AsyncOpenAI`` per gateway
+  (``get_gateway`` keeps one gateway per config in the process), each on
+  its own keep-alive httpx pool, created on first use. Calls after
+  the first skip connection setup and the TLS handshake.
+- Accounting: every call through ``create``/``stream`` (and the async
+  versions) is counted in ``gateway.usage`` per app and model: requests,
+  errors, cache hits, input/output tokens and time spent.
+- Caching: pass any object with ``get(key)`` and ``set(key, value)`` as
+  ``cache``; calls made with ``cache=True`` are looked up there first.
+  ``MemoryCache`` is a small in-process LRU.
+- Fake backend: ``LLM_BACKEND=fake`` (or ``backend="fake"``) answers
+  Chat Completions and Responses calls in-process through an httpx mock
+  transport, streaming or not, so apps and tests run without a key. Replies
+  follow the requested JSON schema when there is one.
+
+Apps import it by putting this directory on ``sys.path``:
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "shared"))
+    from llm_gateway import get_gateway
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+_FAKE_BASE_URL = "http://fake-llm.local/v1"
+
+
+# ---------- accounting ----------
+
+@dataclass
+class UsageStats:
+    requests: int = 0
+    errors: int = 0
+    incomplete: int = 0  # streams closed before the usage report arrived
+    cache_hits: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    tokens_saved: int = 0
+    seconds: float = 0.0
+
+    def add(self, other: "UsageStats") -> None:
+        for name, value in asdict(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+
+def token_counts(usage) -> Tuple[int, int]:
+    """``(input, output)`` tokens from a Chat Completions or Responses usage
+    object, or the same as a dict; ``(0, 0)`` if there is none."""
+    if usage is None:
+        return 0, 0
+    if not isinstance(usage, dict):
+        usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+    input_tokens = usage.get("input_tokens", usage.get("prompt_tokens")) or 0
+    output_tokens = usage.get("output_tokens", usage.get("completion_tokens")) or 0
+    return int(input_tokens), int(output_tokens)
+
+
+class UsageLedger:
+    """Thread-safe request and token totals per (app, model)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], UsageStats] = {}
+
+    def record(
+        self,
+        app: str,
+        model: Optional[str],
+        usage=None,
+        seconds: float = 0.0,
+        error: Optional[BaseException] = None,
+        cached: bool = False,
+        estimated_output: int = 0,
+    ) -> None:
+        input_tokens, output_tokens = token_counts(usage)
+        entry = UsageStats()
+        if cached:
+            entry.cache_hits = 1
+            entry.tokens_saved = input_tokens + output_tokens
+        else:
+            entry.requests = 1
+            entry.errors = int(error is not None)
+            entry.incomplete = int(error is None and usage is None)
+            entry.input_tokens = input_tokens
+            entry.output_tokens = output_tokens or estimated_output
+            entry.seconds = seconds
+        with self._lock:
+            self._stats.setdefault((app, model or "unknown"), UsageStats()).add(entry)
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            return [{"app": app, "model": model, **asdict(s)} for (app, model), s in sorted(self._stats.items())]
+
+    def totals(self, app: Optional[str] = None) -> UsageStats:
+        total = UsageStats()
+        with self._lock:
+            for (name, _), stats in self._stats.items():
+                if app is None or name == app:
+                    total.add(stats)
+        return total
+
+
+# ---------- caching ----------
+
+def request_key(api: str, request: dict) -> str:
+    """Cache key for a call: the API plus its canonical JSON arguments."""
+    blob = json.dumps([api, request], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class MemoryCache:
+    """In-process LRU of responses, for the ``cache`` hook."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, object]" = OrderedDict()
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+# ---------- fake backend ----------
+
+def example_for_schema(schema: dict):
+    """A minimal instance of a JSON schema. Arrays get 7 items, enough for
+    the list minimums the apps check."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = kind[0]
+    if kind == "object":
+        return {k: example_for_schema(v) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [example_for_schema(schema.get("items", {})) for _ in range(max(7, schema.get("minItems", 0)))]
+    return {"string": "example", "number": 1, "integer": 1, "boolean": True, "null": None}.get(kind, "example")
+
+
+def _fake_reply(body: dict) -> str:
+    fmt = body.get("response_format") or (body.get("text") or {}).get("format") or {}
+    schema = (fmt.get("json_schema") or {}).get("schema") or fmt.get("schema")
+    if fmt.get("type") == "json_schema" and schema:
+        return json.dumps(example_for_schema(schema))
+    if fmt.get("type") == "json_object":
+        return "{}"
+    return "This is a reply from the fake LLM backend."
+
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+
+def _pieces(text: str, size: int = 16) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def _fake_chat(body: dict, text: str, input_tokens: int, output_tokens: int) -> httpx.Response:
+    model = body.get("model", "fake-model")
+    usage = {"prompt_tokens": input_tokens, "completion_tokens": output_tokens,
+             "total_tokens": input_tokens + output_tokens}
+    base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": model}
+    if not body.get("stream"):
+        return httpx.Response(200, json={
+            **base, "object": "chat.completion", "usage": usage,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": text}}],
+        })
+    chunk = {**base, "object": "chat.completion.chunk"}
+    events = [_sse({**chunk, "choices": [{"index": 0, "delta": {"content": p}, "finish_reason": None}]})
+              for p in _pieces(text)]
+    events.append(_sse({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+    if (body.get("stream_options") or {}).get("include_usage"):
+        events.append(_sse({**chunk, "choices": [], "usage": usage}))
+    events.append("data: [DONE]\n\n")
+    return httpx.Response(200, content="".join(events).encode(), headers={"content-type": "text/event-stream"})
+
+
+def _fake_responses(body: dict, text: str, input_tokens: int, output_tokens: int) -> httpx.Response:
+    final = {
+        "id": "resp_fake", "object": "response", "created_at": int(time.time()),
+        "model": body.get("model", "fake-model"), "status": "completed",
+        "output": [{"type": "message", "id": "msg_fake", "status": "completed", "role": "assistant",
+                    "content": [{"type": "output_text", "text": text, "annotations": []}]}],
+        "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                  "total_tokens": input_tokens + output_tokens},
+    }
+    if not body.get("stream"):
+        return httpx.Response(200, json=final)
+    events = [_sse({"type": "response.created", "sequence_number": 0, "response": {**final, "status": "in_progress"}},
+                   "response.created")]
+    for i, piece in enumerate(_pieces(text), 1):
+        events.append(_sse({"type": "response.output_text.delta", "sequence_number": i, "item_id": "msg_fake",
+                            "output_index": 0, "content_index": 0, "delta": piece}, "response.output_text.delta"))
+    events.append(_sse({"type": "response.completed", "sequence_number": len(events), "response": final},
+                       "response.completed"))
+    return httpx.Response(200, content="".join(events).encode(), headers={"content-type": "text/event-stream"})
+
+
+def fake_transport(responder: Optional[Callable[[dict], str]] = None) -> httpx.MockTransport:
+    """httpx transport that answers ``/chat/completions`` and ``/responses``.
+
+    ``responder(body)`` returns the reply text for a request body; by default
+    a JSON schema example, ``{}`` for JSON mode, or a fixed sentence.
+    """
+    def handle(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content or b"{}")
+        text = (responder or _fake_reply)(body)
+        input_tokens = len(json.dumps(body.get("messages", body.get("input", "")))) // 4
+        output_tokens = len(text) // 4 + 1
+        if request.url.path.endswith("/chat/completions"):
+            return _fake_chat(body, text, input_tokens, output_tokens)
+        if request.url.path.endswith("/responses"):
+            return _fake_responses(body, text, input_tokens, output_tokens)
+        return httpx.Response(404, json={"error": {"message": f"fake backend has no {request.url.path}"}})
+
+    return httpx.MockTransport(handle)
+
+
+# ---------- gateway ----------
+
+def _stream_usage(api: str, event):
+    if api == "chat":
+        return getattr(event, "usage", None)
+    if getattr(event, "type", None) in ("response.completed", "response.incomplete"):
+        return getattr(event.response, "usage", None)
+    return None
+
+
+def _stream_chars(api: str, event) -> int:
+    if api == "chat":
+        choices = getattr(event, "choices", None)
+        return len(choices[0].delta.content or "") if choices else 0
+    if getattr(event, "type", None) == "response.output_text.delta":
+        return len(event.delta)
+    return 0
+
+
+class LLMGateway:
+    """Pooled OpenAI clients plus accounting, caching and a fake backend.
+
+    ``api`` selects the endpoint: ``"chat"`` for Chat Completions or
+    ``"responses"`` for the Responses API. Keyword arguments are passed to
+    the SDK's ``create`` unchanged. ``app`` labels the call in ``usage``.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        backend: Optional[str] = None,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 60.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 2,
+        cache=None,
+        responder: Optional[Callable[[dict], str]] = None,
+    ):
+        self.backend = backend or os.getenv("LLM_BACKEND", "openai")
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.cache = cache
+        self.responder = responder
+        self.usage = UsageLedger()
+        self._lock = threading.Lock()
+        self._client: Optional[OpenAI] = None
+        self._async_client: Optional[AsyncOpenAI] = None
+
+    @property
+    def fake(self) -> bool:
+        return self.backend == "fake"
+
+    def _client_kwargs(self) -> dict:
+        if self.fake:
+            return {"api_key": "fake", "base_url": _FAKE_BASE_URL, "max_retries": 0}
+        return {"api_key": self.api_key, "base_url": self.base_url, "max_retries": self.max_retries}
+
+    @property
+    def client(self) -> OpenAI:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    http = httpx.Client(
+                        limits=self.limits, timeout=self.timeout,
+                        transport=fake_transport(self.responder) if self.fake else None,
+                    )
+                    self._client = OpenAI(http_client=http, **self._client_kwargs())
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    http = httpx.AsyncClient(
+                        limits=self.limits, timeout=self.timeout,
+                        transport=fake_transport(self.responder) if self.fake else None,
+                    )
+                    self._async_client = AsyncOpenAI(http_client=http, **self._client_kwargs())
+        return self._async_client
+
+    @staticmethod
+    def _endpoint(client, api: str):
+        return client.chat.completions if api == "chat" else client.responses
+
+    def _cached(self, app: str, api: str, request: dict, cache: bool) -> Tuple[Optional[str], object]:
+        if not cache or self.cache is None:
+            return None, None
+        key = request_key(api, request)
+        hit = self.cache.get(key)
+        if hit is not None:
+            self.usage.record(app, request.get("model"), getattr(hit, "usage", None), cached=True)
+        return key, hit
+
+    def create(self, app: str, api: str = "chat", cache: bool = False, **request):
+        """One non-streaming call. With ``cache=True`` and a cache configured,
+        an identical earlier request is answered from the cache."""
+        key, hit = self._cached(app, api, request, cache)
+        if hit is not None:
+            return hit
+        start = time.perf_counter()
+        try:
+            response = self._endpoint(self.client, api).create(**request)
+        except Exception as e:
+            self.usage.record(app, request.get("model"), seconds=time.perf_counter() - start, error=e)
+            raise
+        self.usage.record(app, request.get("model"), response.usage, time.perf_counter() - start)
+        if key is not None:
+            self.cache.set(key, response)
+        return response
+
+    def stream(self, app: str, api: str = "chat", **request) -> Iterator:
+        """Stream a call, yielding the SDK's chunks or events. Closing the
+        iterator early closes the connection, which stops generation."""
+        if api == "chat":
+            request.setdefault("stream_options", {"include_usage": True})
+        start = time.perf_counter()
+        try:
+            response = self._endpoint(self.client, api).create(stream=True, **request)
+        except Exception as e:
+            self.usage.record(app, request.get("model"), seconds=time.perf_counter() - start, error=e)
+            raise
+        usage, chars, error = None, 0, None
+        try:
+            for event in response:
+                usage = _stream_usage(api, event) or usage
+                chars += _stream_chars(api, event)
+                yield event
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            response.close()
+            self.usage.record(app, request.get("model"), usage, time.perf_counter() - start, error,
+                              estimated_output=chars // 4)
+
+    async def acreate(self, app: str, api: str = "chat", cache: bool = False, **request):
+        """Async ``create``."""
+        key, hit = self._cached(app, api, request, cache)
+        if hit is not None:
+            return hit
+        start = time.perf_counter()
+        try:
+            response = await self._endpoint(self.async_client, api).create(**request)
+        except Exception as e:
+            self.usage.record(app, request.get("model"), seconds=time.perf_counter() - start, error=e)
+            raise
+        self.usage.record(app, request.get("model"), response.usage, time.perf_counter() - start)
+        if key is not None:
+            self.cache.set(key, response)
+        return response
+
+    async def astream(self, app: str, api: str = "chat", **request) -> AsyncIterator:
+        """Async ``stream``. Callers that stop early should ``aclose()`` it."""
+        if api == "chat":
+            request.setdefault("stream_options", {"include_usage": True})
+        start = time.perf_counter()
+        try:
+            response = await self._endpoint(self.async_client, api).create(stream=True, **request)
+        except Exception as e:
+            self.usage.record(app, request.get("model"), seconds=time.perf_counter() - start, error=e)
+            raise
+        usage, chars, error = None, 0, None
+        try:
+            async for event in response:
+                usage = _stream_usage(api, event) or usage
+                chars += _stream_chars(api, event)
+                yield event
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            await response.close()
+            self.usage.record(app, request.get("model"), usage, time.perf_counter() - start, error,
+                              estimated_output=chars // 4)
+
+    def close(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            client, self._async_client = self._async_client, None
+        if client is not None:
+            await client.close()
+
+
+_gateways: Dict[tuple, LLMGateway] = {}
+_gateway_lock = threading.Lock()
+
+
+def _config_key(config: dict) -> tuple:
+    # Objects such as a cache or responder are matched by identity.
+    return tuple(sorted(
+        (k, v if isinstance(v, (str, int, float, bool, type(None))) else id(v)) for k, v in config.items()
+    ))
+
+
+def get_gateway(**config) -> LLMGateway:
+    """The process-wide gateway for ``config`` (see ``LLMGateway``).
+
+    Calls with the same config share one instance, its pools and its usage
+    ledger; a different config, such as an API key set after the first call,
+    gets its own gateway instead of silently reusing the first one.
+    """
+    key = _config_key(config)
+    gateway = _gateways.get(key)
+    if gateway is None:
+        with _gateway_lock:
+            gateway = _gateways.get(key)
+            if gateway is None:
+                gateway = _gateways[key] = LLMGateway(**config)
+    return gateway